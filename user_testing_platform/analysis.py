@@ -0,0 +1,242 @@
+"""
+Offline analysis of the session logs written by logger.Logger.
+
+    python analysis.py [logs_dir] [--workers 4] [--target-width 256] [--out results.csv] [--no-cache]
+
+Every event CSV (<participant>_<timestamp>.csv) and Fitts CSV (fitts_<participant>_FITTS_
+<timestamp>.csv) in the directory is recognized by its header, so latency, capture and
+profile files next to them are skipped. Files are parsed in a process pool into one row
+per trial; the parsed table of each file is cached in <logs_dir>/.analysis_cache under the
+hash of the file's contents, so a re-run only parses new (or still growing) sessions.
+
+Per participant, method and game mode the result has:
+- trials, errors and error_rate of the completed tasks (rows re-appended with useLess=True
+  replace the original row of that index and are left out, see Logger.change_log; so are
+  their Fitts samples, also in logs written before change_log re-appended those)
+- mean task time and mean / median highlight-to-select time
+- Fitts' law: movement time regressed on the index of difficulty log2(D / W + 1), with
+  intercept a, slope b and r2, and throughput as the mean of ID / MT over the trials.
+  D is start_dist_to_target and W the target width in pixels (--target-width).
+"""
+import argparse
+import csv
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from logger import EVENT_FIELDS, FITTS_FIELDS, FITTS_TARGET_WIDTH
+
+# Bumped whenever parse_log's output changes, so old cache entries are not used
+CACHE_VERSION = 2
+GROUP = ["participant", "method", "game_mode"]
+
+
+# === files ===
+def log_kind(path):
+    """"events" or "fitts" for a log CSV, None for any other file."""
+    if not path.endswith(".csv"):
+        return None
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+    if header == EVENT_FIELDS:
+        return "events"
+    if header == FITTS_FIELDS:
+        return "fitts"
+    return None
+
+
+def find_logs(directory):
+    """(path, kind) of every event and Fitts CSV in `directory`, sorted by name."""
+    logs = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        kind = log_kind(path) if os.path.isfile(path) else None
+        if kind is not None:
+            logs.append((path, kind))
+    return logs
+
+
+def file_hash(path):
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# === parsing (runs in the worker processes) ===
+def _bool(column):
+    return column.astype(str).str.lower().eq("true")
+
+
+def parse_log(path, kind):
+    """One row per trial of a log file: completed tasks for "events", Fitts samples for "fitts"."""
+    frame = pd.read_csv(path)
+    session = os.path.splitext(os.path.basename(path))[0]
+    if kind == "events":
+        tasks = frame[frame["event_type"] == "TaskCompleted"]
+        # the last row per index wins, a task marked useless afterwards is dropped
+        tasks = tasks.drop_duplicates("index", keep="last")
+        tasks = tasks[~_bool(tasks["useLess"])]
+        return pd.DataFrame({
+            "session": session,
+            "participant": tasks["participant"].astype(str),
+            "method": tasks["method"],
+            "game_mode": tasks["game_mode"],
+            "task_index": tasks["task_index"],
+            "correct": _bool(tasks["correct_res"]),
+            "task_time": pd.to_numeric(tasks["elapsed_task_time"], errors="coerce"),
+            "highlight_to_select": pd.to_numeric(tasks["from_highlighted_to_selected"], errors="coerce"),
+        }).reset_index(drop=True)
+
+    # the last row per task wins, a sample marked useless afterwards is dropped
+    samples = frame.drop_duplicates("task_index", keep="last")
+    samples = samples[~_bool(samples["useLess"])]
+    # fitts_<participant>_FITTS_<timestamp> belongs to the session <participant>_<timestamp>
+    participant, timestamp = session[len("fitts_"):].rsplit("_FITTS_", 1)
+    return pd.DataFrame({
+        "session": f"{participant}_{timestamp}",
+        "participant": samples["participant"].astype(str),
+        "method": samples["method"],
+        "game_mode": samples["game_mode"],
+        "task_index": samples["task_index"],
+        "distance": pd.to_numeric(samples["start_dist_to_target"], errors="coerce"),
+        "movement_time": pd.to_numeric(samples["elapsed_task_time"], errors="coerce"),
+    }).reset_index(drop=True)
+
+
+# === loading with the cache ===
+def load_logs(directory, workers=None, use_cache=True):
+    """
+    Parses every log in `directory`, cached files from the cache and the rest in a pool of
+    `workers` processes. Returns (tasks, fitts, parsed), parsed being the number of files
+    that were not cached.
+    """
+    logs = find_logs(directory)
+    cache_dir = os.path.join(directory, ".analysis_cache")
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    frames = {}
+    todo = []
+    for path, kind in logs:
+        cached = os.path.join(cache_dir, file_hash(path) + ".pkl") if use_cache else None
+        if cached is not None and os.path.exists(cached):
+            frames[path] = pd.read_pickle(cached)
+        else:
+            todo.append((path, kind, cached))
+
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_log, [p for p, _, _ in todo], [k for _, k, _ in todo]))
+    else:
+        parsed = [parse_log(path, kind) for path, kind, _ in todo]
+    for (path, _, cached), frame in zip(todo, parsed):
+        frames[path] = frame
+        if cached is not None:
+            frame.to_pickle(cached)
+
+    tasks = [frames[path] for path, kind in logs if kind == "events"]
+    fitts = [frames[path] for path, kind in logs if kind == "fitts"]
+    tasks = pd.concat(tasks, ignore_index=True) if tasks else _empty("events")
+    fitts = pd.concat(fitts, ignore_index=True) if fitts else _empty("fitts")
+    return tasks, drop_useless_fitts(tasks, fitts), len(todo)
+
+
+def drop_useless_fitts(tasks, fitts):
+    """
+    Drops the Fitts samples of tasks left out of their session's events, i.e. marked
+    useless, which older logs only marked in the event CSV. A sample is logged right after
+    its TaskCompleted row, with the task_index already one higher. Sessions without an
+    event CSV keep all their samples.
+    """
+    kept = pd.MultiIndex.from_arrays([tasks["session"], tasks["task_index"].astype("int64") + 1])
+    sample = pd.MultiIndex.from_arrays([fitts["session"], fitts["task_index"].astype("int64")])
+    keep = sample.isin(kept) | ~fitts["session"].isin(tasks["session"]).to_numpy()
+    return fitts[keep].reset_index(drop=True)
+
+
+def _empty(kind):
+    """An empty frame with the columns parse_log returns for `kind`."""
+    if kind == "events":
+        columns = ["session", *GROUP, "task_index", "correct", "task_time", "highlight_to_select"]
+    else:
+        columns = ["session", *GROUP, "task_index", "distance", "movement_time"]
+    return pd.DataFrame(columns=columns)
+
+
+# === statistics ===
+def task_summary(tasks):
+    """Trials, errors, error rate, mean task time and highlight-to-select time per group."""
+    tasks = tasks.assign(error=~tasks["correct"].astype(bool))
+    summary = tasks.groupby(GROUP).agg(
+        trials=("error", "size"),
+        errors=("error", "sum"),
+        task_time=("task_time", "mean"),
+        highlight_to_select=("highlight_to_select", "mean"),
+        highlight_to_select_median=("highlight_to_select", "median"),
+    )
+    summary["error_rate"] = summary["errors"] / summary["trials"]
+    return summary
+
+
+def fitts_summary(fitts, target_width=FITTS_TARGET_WIDTH):
+    """
+    Least-squares fit MT = a + b * ID per group, from per-group sums, and throughput
+    mean(ID / MT) in bits per second.
+    """
+    fitts = fitts.dropna(subset=["distance", "movement_time"])
+    fitts = fitts[fitts["movement_time"] > 0]
+    index = np.log2(fitts["distance"].to_numpy(dtype=np.float64) / target_width + 1)
+    movement = fitts["movement_time"].to_numpy(dtype=np.float64)
+    terms = pd.DataFrame({"n": 1.0, "x": index, "y": movement, "xx": index * index, "xy": index * movement,
+                          "yy": movement * movement, "throughput": index / movement}, index=fitts.index)
+    sums = terms.groupby([fitts[c] for c in GROUP]).sum()
+
+    n = sums["n"]
+    sxx = sums["xx"] - sums["x"] ** 2 / n
+    sxy = sums["xy"] - sums["x"] * sums["y"] / n
+    syy = sums["yy"] - sums["y"] ** 2 / n
+    slope = (sxy / sxx).where(sxx > 0)
+    return pd.DataFrame({
+        "fitts_n": n.astype(int),
+        "fitts_a": sums["y"] / n - slope * sums["x"] / n,
+        "fitts_b": slope,
+        "fitts_r2": (sxy * sxy / (sxx * syy)).where((sxx > 0) & (syy > 0)),
+        "throughput": sums["throughput"] / n,
+    })
+
+
+def analyze(tasks, fitts, target_width=FITTS_TARGET_WIDTH):
+    """Task and Fitts statistics per participant, method and game mode in one table."""
+    return task_summary(tasks).join(fitts_summary(fitts, target_width), how="outer").sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the session logs")
+    parser.add_argument("logs", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"),
+                        help="directory with the event and Fitts CSVs")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes, default one per CPU")
+    parser.add_argument("--target-width", type=float, default=FITTS_TARGET_WIDTH, help="target width W in pixels")
+    parser.add_argument("--out", default=None, help="also write the table to this CSV file")
+    parser.add_argument("--no-cache", action="store_true", help="parse every file again and do not write the cache")
+    args = parser.parse_args()
+
+    tasks, fitts, parsed = load_logs(args.logs, args.workers, use_cache=not args.no_cache)
+    print(f"{tasks['session'].nunique()} sessions, {len(tasks)} completed tasks, {len(fitts)} Fitts samples "
+          f"({parsed} files parsed, the rest from the cache)")
+    if tasks.empty and fitts.empty:
+        return
+    result = analyze(tasks, fitts, args.target_width)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.3f}".format):
+        print(result)
+    if args.out:
+        result.to_csv(args.out)
+        print(f"written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Pre-scaled image cache for fast startup.
+
+Decoding the full-size ocean PNGs and AprilTag JPEGs and scaling them down takes most of
+the startup time. The first run stores every scaled image as a raw pixel blob under
+.asset_cache/<WIDTH>x<HEIGHT>/, keyed by the source file's hash and the target size, so
+later runs only read the bytes back. Loads run on a thread pool and can be started with
+prefetch() before the window exists; get() converts each image to the display format
+once, after set_mode, so blits no longer convert pixels every frame.
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from config import WIDTH, HEIGHT
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+ASSET_DIR = os.path.join(PROJECT_ROOT, "assets")
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".asset_cache")
+
+
+def asset_path(*parts):
+    return os.path.join(ASSET_DIR, *parts)
+
+
+class AssetCache:
+    def __init__(self, cache_dir=CACHE_DIR, workers=4):
+        self.cache_dir = os.path.join(cache_dir, f"{WIDTH}x{HEIGHT}")
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+        self.surfaces = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def prefetch(self, requests):
+        """Starts loading (path, (width, height)) pairs in the background."""
+        for path, size in requests:
+            key = (path, tuple(size))
+            if key not in self.pending and key not in self.surfaces:
+                self.pending[key] = self.executor.submit(self._load_blob, path, key[1])
+
+    def get(self, path, size):
+        """
+        Returns the image at `path` scaled to `size`, waiting for a prefetch if one is running.
+        The surface is converted to the display format when a display mode is set.
+        """
+        key = (path, tuple(size))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            return surface
+
+        future = self.pending.pop(key, None)
+        data, fmt, cached, seconds = future.result() if future is not None else self._load_blob(path, key[1])
+        # counted here rather than in the workers, which run concurrently
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.load_time += seconds
+        surface = pygame.image.frombytes(data, key[1], fmt)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha() if fmt == "RGBA" else surface.convert()
+        self.surfaces[key] = surface
+        return surface
+
+    def _load_blob(self, path, size):
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+
+        for fmt in ("RGB", "RGBA"):
+            blob_path = os.path.join(self.cache_dir, f"{digest}_{size[0]}x{size[1]}.{fmt.lower()}")
+            if os.path.exists(blob_path):
+                with open(blob_path, "rb") as f:
+                    data = f.read()
+                return data, fmt, True, time.perf_counter() - start
+
+        image = pygame.image.load(path)
+        fmt = "RGBA" if image.get_flags() & pygame.SRCALPHA else "RGB"
+        data = pygame.image.tobytes(pygame.transform.scale(image, size), fmt)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        blob_path = os.path.join(self.cache_dir, f"{digest}_{size[0]}x{size[1]}.{fmt.lower()}")
+        # write then rename, so an interrupted run never leaves a truncated blob behind
+        tmp_path = f"{blob_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path)
+        return data, fmt, False, time.perf_counter() - start
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def summary(self):
+        return (f"asset cache: {self.hits} cached, {self.misses} decoded, "
+                f"{self.load_time * 1000:.0f} ms load time across workers")
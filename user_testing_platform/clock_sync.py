@@ -0,0 +1,140 @@
+"""
+Mapping between Pupil time and local time.perf_counter() time.
+
+Samples carry Pupil timestamps, the frame loop runs on the local clock. ClockSync asks
+Pupil Remote for its clock ("t") over a REQ socket of its own and matches each reply
+to the midpoint of the local send and receive times. Only the replies with the shortest
+round trips (least queueing) are kept, and a line pupil = slope * local + intercept is
+fitted through everything kept so far, so repeated syncs also follow drift between
+the clocks. Until the first sync succeeds the offset is estimated from the samples
+themselves with observe().
+"""
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from config import PUPIL_HOST, PUPIL_REMOTE_PORT
+
+# Fit drift only once the kept replies span this many seconds
+MIN_DRIFT_SPAN = 30.0
+
+
+class ClockSync:
+    def __init__(self, host=PUPIL_HOST, port=PUPIL_REMOTE_PORT, rounds=20, keep=0.25,
+                 timeout_ms=500, clock=time.perf_counter):
+        """
+        rounds: "t" requests per sync.
+        keep: share of each sync's replies, shortest round trips first, used for the fit.
+        """
+        self.address = f"tcp://{host}:{port}"
+        self.rounds = rounds
+        self.keep = keep
+        self.timeout_ms = timeout_ms
+        self.clock = clock
+        self.points = []  # (local midpoint, pupil time) of the kept replies
+        self.fit = (1.0, None)  # slope, intercept; replaced as a whole so readers never see half an update
+        self.synced = False
+        self.best_rtt = None
+        self.syncs = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === estimation ===
+    def sync(self):
+        """Runs one round of "t" requests, returns False if Pupil Remote did not answer."""
+        context = zmq.Context.instance()
+        req = context.socket(zmq.REQ)
+        req.setsockopt(zmq.LINGER, 0)
+        req.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+        req.connect(self.address)
+        replies = []
+        try:
+            for _ in range(self.rounds):
+                sent = self.clock()
+                req.send_string("t")
+                pupil_time = float(req.recv_string())
+                received = self.clock()
+                replies.append((received - sent, (sent + received) / 2, pupil_time))
+        except zmq.Again:
+            return False
+        finally:
+            req.close()
+
+        replies.sort()
+        kept = replies[:max(1, int(len(replies) * self.keep))]
+        self.points += [(local, pupil) for _, local, pupil in kept]
+        self.best_rtt = kept[0][0] if self.best_rtt is None else min(self.best_rtt, kept[0][0])
+        self._refit()
+        self.synced = True
+        self.syncs += 1
+        return True
+
+    def _refit(self):
+        local, pupil = np.array(self.points).T
+        if local.max() - local.min() >= MIN_DRIFT_SPAN:
+            slope, intercept = np.polyfit(local - local[0], pupil, 1)
+            intercept -= slope * local[0]
+        else:
+            slope, intercept = 1.0, float(np.median(pupil - local))
+        self.fit = (float(slope), float(intercept))
+
+    def observe(self, pupil_timestamps, received):
+        """
+        Updates the offset from samples (Pupil timestamps and local receive times) while
+        there is no sync. A sample cannot arrive before it was taken, so the largest
+        pupil - received seen is the closest bound on the offset.
+        """
+        if self.synced or not len(pupil_timestamps):
+            return
+        offset = float(np.max(np.asarray(pupil_timestamps) - np.asarray(received)))
+        slope, intercept = self.fit
+        if intercept is None or offset > intercept:
+            self.fit = (1.0, offset)
+
+    # === background syncing ===
+    def start(self, interval=10.0, retry=1.0):
+        """Syncs now and every `interval` seconds on a background thread, `retry` seconds after a failed sync."""
+        def run():
+            while True:
+                ok = self.sync()
+                if self._stop.wait(interval if ok else retry):
+                    return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout_ms / 1000 * 2)
+
+    # === conversions ===
+    @property
+    def ready(self):
+        return self.fit[1] is not None
+
+    def to_local(self, pupil_time):
+        """Local perf_counter() time of a Pupil timestamp (scalars or arrays)."""
+        slope, intercept = self.fit
+        return (pupil_time - intercept) / slope
+
+    def to_pupil(self, local_time):
+        slope, intercept = self.fit
+        return slope * local_time + intercept
+
+    def pupil_now(self):
+        """Current Pupil time, or None before the first sync or sample."""
+        return self.to_pupil(self.clock()) if self.ready else None
+
+    def summary(self):
+        if not self.ready:
+            return "clock sync: no sync and no samples"
+        slope, intercept = self.fit
+        if not self.synced:
+            return f"clock sync: not synced, offset {intercept:.4f}s estimated from samples"
+        return (f"clock sync: {self.syncs} syncs, offset {intercept:.4f}s, drift {(slope - 1) * 1e6:.1f} ppm, "
+                f"best round trip {self.best_rtt * 1000:.2f} ms")
@@ -1,5 +1,3 @@
-import pygame
-
 WIDTH = 2560
 HEIGHT = 1440
 # WIDTH = 1920
@@ -12,3 +10,9 @@ GAME_MODES = ["memory","chase",'memory' ,"chase","memory","chase"]
 NUMBER_OF_SELECTIONS_PR_METHOD = 36
 NUMBER_OF_METHODS_PR_TASK = 1
 
+# Selection logic steps per second of tracker time (Pupil Core records gaze at up to 200 Hz)
+LOGIC_RATE = 200
+
+# Pupil Remote (Pupil Capture, or pupil_replay.py serve)
+PUPIL_HOST = "localhost"
+PUPIL_REMOTE_PORT = 50020
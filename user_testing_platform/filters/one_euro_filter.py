@@ -1,3 +1,6 @@
+import math
+
+import numpy as np
 from OneEuroFilter import OneEuroFilter
 
 class GazeOneEuroFilter:
@@ -17,4 +20,141 @@ class GazeOneEuroFilter:
         """Apply One Euro filtering."""
         euro_filtered_x = self.one_euro_x(x, timestamp)
         euro_filtered_y = self.one_euro_y(y, timestamp)
-        return int(euro_filtered_x), int(euro_filtered_y)
\ No newline at end of file
+        return int(euro_filtered_x), int(euro_filtered_y)
+
+class BatchOneEuroFilter:
+    def __init__(self, freq=120, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        """
+        NumPy One Euro filter over (N, 2) arrays of positions, same parameters as GazeOneEuroFilter.
+
+        Gives the same output as GazeOneEuroFilter before its int() truncation. State is
+        carried between calls to filter(), so it can be fed one batch per frame; call
+        reset() before filtering an unrelated recording.
+
+        min_cutoff, beta and d_cutoff may also be 1-D arrays of P parameter sets, in which
+        case every set is run over the same samples at once and filter() returns (P, N, 2).
+        """
+        self.freq = float(freq)
+        params = np.broadcast_arrays(np.atleast_1d(np.asarray(min_cutoff, dtype=np.float64)),
+                                     np.atleast_1d(np.asarray(beta, dtype=np.float64)),
+                                     np.atleast_1d(np.asarray(d_cutoff, dtype=np.float64)))
+        # (P, 1) so they broadcast against the two axes
+        self.min_cutoff, self.beta, self.d_cutoff = (p.reshape(-1, 1) for p in params)
+        self.sets = self.min_cutoff.shape[0]
+        self.single = all(np.ndim(p) == 0 for p in (min_cutoff, beta, d_cutoff))
+        self.reset()
+
+    def reset(self):
+        self.current_freq = self.freq
+        self.last_time = None
+        self.x_hat = None   # last filtered position per parameter set, (P, 2)
+        self.dx_hat = None  # last filtered speed per parameter set, (P, 2)
+
+    def _frequencies(self, timestamps):
+        """Per-sample sampling frequency, updated exactly like OneEuroFilter does."""
+        prev = np.empty_like(timestamps)
+        prev[0] = self.last_time or 0.0
+        prev[1:] = timestamps[:-1]
+        valid = (prev != 0) & (timestamps != 0) & (timestamps > prev)
+
+        # carry the last valid frequency forward over samples that do not update it
+        freqs = np.where(valid, 1.0 / np.where(valid, timestamps - prev, 1.0), self.current_freq)
+        source = np.where(valid, np.arange(len(timestamps)), -1)
+        np.maximum.accumulate(source, out=source)
+        freqs = np.where(source >= 0, freqs[np.maximum(source, 0)], self.current_freq)
+        return freqs
+
+    def filter(self, positions, timestamps):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(timestamps)
+        out = np.empty((self.sets, n, 2))
+        if n == 0:
+            return out[0] if self.single else out
+
+        freqs = self._frequencies(timestamps)
+        # alpha = 1 / (1 + tau / te) with te = 1 / freq and tau = 1 / (2 pi cutoff)
+        d_alphas = 1.0 / (1.0 + freqs[:, None, None] / (2 * np.pi * self.d_cutoff))
+
+        start = 0
+        if self.x_hat is None:
+            # the first sample passes through unfiltered with zero speed
+            self.x_hat = np.repeat(positions[:1], self.sets, axis=0)
+            self.dx_hat = np.zeros((self.sets, 2))
+            out[:, 0] = self.x_hat
+            start = 1
+
+        if self.sets == 1:
+            x_hat, dx_hat = self._run_single(positions, freqs, d_alphas[:, 0, 0], out[0], start)
+        else:
+            x_hat, dx_hat = self._run_sets(positions, freqs, d_alphas, out, start)
+
+        self.x_hat, self.dx_hat = x_hat, dx_hat
+        self.current_freq = freqs[-1]
+        self.last_time = timestamps[-1]
+        return out[0] if self.single else out
+
+    def step(self, x, y, timestamp):
+        """
+        Filters a single sample with plain floats and returns (x, y), for callers that get
+        samples one at a time. Same result and shared state as filter(); one parameter set only.
+        """
+        if self.sets != 1:
+            raise ValueError("step() needs a single parameter set")
+        if self.x_hat is None:
+            self.x_hat = np.array([[x, y]], dtype=np.float64)
+            self.dx_hat = np.zeros((1, 2))
+            self.last_time = timestamp
+            return x, y
+
+        if self.last_time and timestamp and timestamp > self.last_time:
+            self.current_freq = 1.0 / (timestamp - self.last_time)
+        self.last_time = timestamp
+        freq = self.current_freq
+        two_pi = 2 * math.pi
+        d_alpha = 1.0 / (1.0 + freq / (two_pi * float(self.d_cutoff[0, 0])))
+        min_cutoff, beta = float(self.min_cutoff[0, 0]), float(self.beta[0, 0])
+        x_hat, dx_hat = self.x_hat[0], self.dx_hat[0]
+        hx, hy = float(x_hat[0]), float(x_hat[1])
+
+        dhx = d_alpha * (x - hx) * freq + (1.0 - d_alpha) * float(dx_hat[0])
+        dhy = d_alpha * (y - hy) * freq + (1.0 - d_alpha) * float(dx_hat[1])
+        ax = 1.0 / (1.0 + freq / (two_pi * (min_cutoff + beta * abs(dhx))))
+        ay = 1.0 / (1.0 + freq / (two_pi * (min_cutoff + beta * abs(dhy))))
+        hx = ax * x + (1.0 - ax) * hx
+        hy = ay * y + (1.0 - ay) * hy
+        x_hat[0], x_hat[1] = hx, hy
+        dx_hat[0], dx_hat[1] = dhx, dhy
+        return hx, hy
+
+    def _run_sets(self, positions, freqs, d_alphas, out, start):
+        x_hat, dx_hat = self.x_hat, self.dx_hat
+        # The recursion is sequential in time, so only the P x 2 columns are vectorized
+        for i in range(start, len(freqs)):
+            x = positions[i]
+            dx = (x - x_hat) * freqs[i]
+            dx_hat = d_alphas[i] * dx + (1.0 - d_alphas[i]) * dx_hat
+            cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+            alpha = 1.0 / (1.0 + freqs[i] / (2 * np.pi * cutoff))
+            x_hat = alpha * x + (1.0 - alpha) * x_hat
+            out[:, i] = x_hat
+        return x_hat, dx_hat
+
+    def _run_single(self, positions, freqs, d_alphas, out, start):
+        # With one parameter set, plain floats are cheaper than NumPy calls on 2-element arrays
+        min_cutoff, beta = float(self.min_cutoff[0, 0]), float(self.beta[0, 0])
+        two_pi = 2 * math.pi
+        (hx, hy), (dhx, dhy) = self.x_hat[0].tolist(), self.dx_hat[0].tolist()
+        xs, ys = positions[:, 0].tolist(), positions[:, 1].tolist()
+        freqs, d_alphas = freqs.tolist(), d_alphas.tolist()
+        for i in range(start, len(freqs)):
+            freq, d_alpha = freqs[i], d_alphas[i]
+            dhx = d_alpha * (xs[i] - hx) * freq + (1.0 - d_alpha) * dhx
+            dhy = d_alpha * (ys[i] - hy) * freq + (1.0 - d_alpha) * dhy
+            ax = 1.0 / (1.0 + freq / (two_pi * (min_cutoff + beta * abs(dhx))))
+            ay = 1.0 / (1.0 + freq / (two_pi * (min_cutoff + beta * abs(dhy))))
+            hx = ax * xs[i] + (1.0 - ax) * hx
+            hy = ay * ys[i] + (1.0 - ay) * hy
+            out[i, 0] = hx
+            out[i, 1] = hy
+        return np.array([[hx, hy]]), np.array([[dhx, dhy]])
@@ -0,0 +1,138 @@
+"""
+Cross-checks the streaming fixation detectors against Pupil's own fixations.
+
+    python fixation_check.py [capture.gazecap] [--fixation velocity dispersion] [--max-gap 0.1] [--fps 60]
+
+With a raw capture (main.py --capture) the gaze is run through the same confidence
+threshold and One Euro filter as in main.py, and the detected fixations are matched
+against the ones Pupil sent in fixations_on_surfaces. Without a file a synthetic
+participant looks around the grid and its scripted fixations are the reference.
+
+Every detector is checked twice: fed the samples directly, and inside the DwellEngine of
+a SelectionLogic that drains them one simulated frame at a time and advances in logic
+steps, as main.py does. The second is what the thresholds are calibrated on.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from config import WIDTH, HEIGHT, LOGIC_RATE
+from filters.one_euro_filter import BatchOneEuroFilter
+from layout import LabelMap, add_task_grid
+from selection.blink_selection import BlinkSelection
+from selection.fixation import DwellEngine, compare_fixations, fixation_detector
+from selection.head_turn_selection import Head_Turn_Selector
+from selection.hot_corners import HotCornerSelector
+from selection_logic import SelectionLogic
+
+ROWS, COLS = 5, 10
+CELLS = [(r, c) for r in range(ROWS) for c in range(COLS)]
+
+
+def capture_streams(filename):
+    """(gaze timestamps, gaze in pixels, reference fixations) from a raw capture."""
+    from gaze_listener import GAZE_CONFIDENCE_THRESHOLD
+    from raw_capture import load_capture
+
+    streams = load_capture(filename)
+    gaze = streams["gaze"]
+    gaze = gaze[(gaze["confidence"] > GAZE_CONFIDENCE_THRESHOLD) & (gaze["flag"] == 1)]
+    gaze = gaze[np.argsort(gaze["timestamp"], kind="stable")]
+    positions = np.column_stack((gaze["x"] * WIDTH, (1 - gaze["y"]) * HEIGHT)).astype(np.float64)
+
+    # Pupil resends a fixation with a growing duration while it lasts, keep the longest per start
+    longest = {}
+    for fixation in streams["fixation"]:
+        if not fixation["flag"]:
+            continue
+        start = float(fixation["timestamp"])
+        if start not in longest or fixation["value"] > longest[start]["value"]:
+            longest[start] = fixation
+    reference = [(start, start + float(f["value"]) / 1000, float(f["x"]) * WIDTH, (1 - float(f["y"])) * HEIGHT)
+                 for start, f in sorted(longest.items())]
+    return gaze["timestamp"].astype(np.float64), positions, reference
+
+
+def synthetic_streams(seconds, seed):
+    from synthetic import SyntheticGazeSource
+
+    source = SyntheticGazeSource(seed=seed)
+    source.add_idle(seconds, CELLS)
+    timestamps = np.array([t for t, _ in source.gaze], dtype=np.float64)
+    positions = np.array([(x * source.width, (1 - y) * source.height) for _, (x, y, _) in source.gaze])
+    return timestamps, positions, source.fixations
+
+
+def detect(mode, timestamps, positions):
+    """Runs a fresh detector over the samples, returns its fixations and microseconds per sample."""
+    detector = fixation_detector(mode)
+    update = detector.update
+    started = time.perf_counter()
+    for t, (x, y) in zip(timestamps.tolist(), positions.tolist()):
+        update(t, x, y)
+    elapsed = time.perf_counter() - started
+    detector.flush()
+    return detector.fixations, elapsed / max(1, len(timestamps)) * 1e6
+
+
+def detect_in_logic(mode, timestamps, positions, fps):
+    """
+    Runs a fresh detector inside the selection logic, the samples drained per frame at
+    `fps` and the logic advanced to the frame's time. Returns its fixations and
+    microseconds per sample for the whole logic.
+    """
+    layout = LabelMap(WIDTH, HEIGHT)
+    add_task_grid(layout, CELLS, WIDTH // COLS, HEIGHT // ROWS)
+    hotcorner_selector = HotCornerSelector(WIDTH, HEIGHT)
+    hotcorner_selector.add_zones(layout)
+    detector = fixation_detector(mode)
+    logic = SelectionLogic(DwellEngine(layout, detector=detector, targets=CELLS), hotcorner_selector,
+                           BlinkSelection(blink_duration_selection="long"), Head_Turn_Selector(), rate=LOGIC_RATE)
+    # no blinks in the stream, so nothing is ever confirmed and the trial never resets
+    logic.set_method("blink")
+
+    frame_times = np.arange(timestamps[0], timestamps[-1] + 1.0 / fps, 1.0 / fps)
+    ends = np.searchsorted(timestamps, frame_times, side="right")
+    started = time.perf_counter()
+    start = 0
+    for now, end in zip(frame_times.tolist(), ends.tolist()):
+        logic.feed(timestamps[start:end], positions[start:end])
+        logic.advance(now)
+        start = end
+    elapsed = time.perf_counter() - started
+    detector.flush()
+    return detector.fixations, elapsed / max(1, len(timestamps)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fixation detectors with Pupil's fixations")
+    parser.add_argument("capture", nargs="?", default=None, help=".gazecap file, a synthetic participant if left out")
+    parser.add_argument("--fixation", nargs="+", choices=["velocity", "dispersion"], default=["velocity", "dispersion"])
+    parser.add_argument("--max-gap", type=float, default=0.1, help="seconds fixations may be apart and still match")
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of the synthetic session")
+    parser.add_argument("--fps", type=int, default=60, help="simulated frame rate of the selection logic run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.capture is None:
+        timestamps, positions, reference = synthetic_streams(args.seconds, args.seed)
+    else:
+        timestamps, positions, reference = capture_streams(args.capture)
+    if not len(timestamps):
+        print("no gaze on the surface")
+        return
+    smooth = BatchOneEuroFilter().filter(positions, timestamps)
+
+    print(f"{len(timestamps)} gaze samples, {len(reference)} reference fixations")
+    for mode in args.fixation:
+        for path, (detected, per_sample) in (("detector", detect(mode, timestamps, smooth)),
+                                              ("selection logic", detect_in_logic(mode, timestamps, smooth, args.fps))):
+            result = compare_fixations(detected, reference, args.max_gap)
+            print(f"[{mode}, {path}] {result['detected']} fixations, recall {result['recall']:.2f}, "
+                  f"precision {result['precision']:.2f}, onset difference {result['onset_diff'] * 1000:.0f} ms, "
+                  f"centre distance {result['centre_distance']:.1f} px, {per_sample:.2f} us/sample")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,13 @@ import zmq
 import threading
 from msgpack import loads
 import sys
+import time
+
+from config import PUPIL_HOST, PUPIL_REMOTE_PORT
+from ring_buffer import SampleRingBuffer
+
+# How long a poll may block before the loop wakes up on its own
+POLL_TIMEOUT_MS = 100
 
 # Shared data accessible from outside
 latest_gaze_data = None  
@@ -10,7 +17,42 @@ latest_blink_data = None
 latest_fixation_data = None
 latest_pupil_data = None
 
-def start_gaze_listener(start_script):
+# Gaze samples below this confidence are dropped
+GAZE_CONFIDENCE_THRESHOLD = 0.89
+
+# Every sample of each stream, timestamped with Pupil time. Read them with
+# gaze_buffer.reader().drain() to get all samples since the last call.
+# Gaze "received" is the time.perf_counter() at which its surface message arrived.
+gaze_buffer = SampleRingBuffer(("x", "y", "confidence", "received"))
+blink_buffer = SampleRingBuffer(("onset", "confidence"))
+pupil_buffer = SampleRingBuffer(("x", "y", "confidence", "diameter"))
+
+# Set by stop_gaze_listener to end the listener loop
+_stop_event = threading.Event()
+_listener_thread = None
+
+# CPU time spent inside the listener thread (seconds) and number of poll wakeups.
+# connected_at is the time.perf_counter() at which the Pupil Remote handshake finished,
+# frames counts the ZMQ frames received, counted once their samples are in the buffers.
+listener_stats = {"cpu_time": 0.0, "wakeups": 0, "connected_at": None, "frames": 0}
+
+
+def _drain(socket):
+    """Yield every (topic, payload) frame currently queued on a SUB socket."""
+    while True:
+        try:
+            topic = socket.recv_string(zmq.NOBLOCK)
+            msg = socket.recv(zmq.NOBLOCK)
+        except zmq.Again:
+            return
+        yield topic, msg
+
+def start_gaze_listener(start_script, capture=None, host=PUPIL_HOST, port=PUPIL_REMOTE_PORT):
+    """
+    Starts the listener thread against the Pupil Remote at host:port. If `capture` is a
+    raw_capture.RawCaptureWriter every received sample is also recorded to it,
+    including low-confidence gaze.
+    """
     def listener():
         global latest_gaze_data, latest_blink_data, latest_fixation_data, latest_pupil_data
 
@@ -18,7 +60,7 @@ def start_gaze_listener(start_script):
 
         # Request SUB port from Pupil
         req = context.socket(zmq.REQ)
-        req.connect("tcp://localhost:50020")
+        req.connect(f"tcp://{host}:{port}")
         req.send_string("SUB_PORT")
         sub_port = req.recv_string()
 
@@ -27,68 +69,100 @@ def start_gaze_listener(start_script):
             req.send_string('R')
             _ = req.recv_string()
 
-        # SUB socket for gaze surface
-        sub_surface = context.socket(zmq.SUB)
-        sub_surface.connect(f"tcp://localhost:{sub_port}")
-        sub_surface.setsockopt_string(zmq.SUBSCRIBE, "surface")
-
-        # SUB socket for blinks
-        sub_blink = context.socket(zmq.SUB)
-        sub_blink.connect(f"tcp://localhost:{sub_port}")
-        sub_blink.setsockopt_string(zmq.SUBSCRIBE, "blinks")
-
-        #sub on pupil data
-        sub_pupil = context.socket(zmq.SUB)
-        sub_pupil.connect(f"tcp://localhost:{sub_port}")
-        sub_pupil.setsockopt_string(zmq.SUBSCRIBE, "pupil.0.2d")
+        # One SUB socket for gaze surfaces, blinks and pupil data, so the frames of all
+        # three come out in the order Pupil sent them and no stream gets ahead of another
+        sub = context.socket(zmq.SUB)
+        sub.connect(f"tcp://{host}:{sub_port}")
+        for topic in ("surface", "blinks", "pupil.0.2d"):
+            sub.setsockopt_string(zmq.SUBSCRIBE, topic)
 
         surface_name = "monitor_overlay"
 
+        listener_stats["connected_at"] = time.perf_counter()
         print("[gaze_listener] Listening for gaze, blink, and fixation data...")
 
-        while True:
+        # Block on the socket instead of spinning on NOBLOCK reads,
+        # so the thread sleeps (and releases the GIL) while the tracker is quiet.
+        poller = zmq.Poller()
+        poller.register(sub, zmq.POLLIN)
+
+        cpu_start = time.thread_time()
+        while not _stop_event.is_set():
             try:
-                # Receive gaze surface data (non-blocking style)
-                try:
-                    topic = sub_surface.recv_string(zmq.NOBLOCK)
-                    msg = sub_surface.recv(zmq.NOBLOCK)
-                    surfaces = loads(msg)
-
-                    if surfaces.get("name") == surface_name:
-                        gaze_positions = surfaces.get("gaze_on_surfaces", [])
-                        if gaze_positions:
-                            latest = gaze_positions[-1]
-                            if latest.get("confidence", 0) > 0.89:
-                                norm_x, norm_y = latest["norm_pos"]
-                                timestamp = latest["timestamp"]
-                                latest_gaze_data = ((norm_x, norm_y), timestamp)
-
-                        fixations = surfaces.get("fixations_on_surfaces", [])
-                        if fixations:
-                            latest_fixation_data = fixations
-                except zmq.Again:
-                    pass  # No gaze data right now
-
-                # Receive blink data
-                try:
-                    topic_blink = sub_blink.recv_string(zmq.NOBLOCK)
-                    msg_blink = sub_blink.recv(zmq.NOBLOCK)
-                    latest_blink_data = loads(msg_blink)
-                except zmq.Again:
-                    pass  # No blink data right now
-                
-                try:
-                    topic_pupil = sub_pupil.recv_string(zmq.NOBLOCK)
-                    msg_pupil = sub_pupil.recv(zmq.NOBLOCK)
-                    latest_pupil_data = loads(msg_pupil)
-                except zmq.Again:
-                    pass
+                ready = dict(poller.poll(POLL_TIMEOUT_MS))
+                if not ready:
+                    continue
+
+                # Drain the socket completely in one pass
+                for topic, msg in _drain(sub):
+                    if topic.startswith("surface"):
+                        received = time.perf_counter()
+                        surfaces = loads(msg)
+                        if capture is not None:
+                            capture.add_surface(surfaces)
+
+                        if surfaces.get("name") == surface_name:
+                            gaze_positions = surfaces.get("gaze_on_surfaces", [])
+                            for gaze in gaze_positions:
+                                confidence = gaze.get("confidence", 0)
+                                if confidence > GAZE_CONFIDENCE_THRESHOLD:
+                                    norm_x, norm_y = gaze["norm_pos"]
+                                    timestamp = gaze["timestamp"]
+                                    gaze_buffer.append(timestamp, norm_x, norm_y, confidence, received)
+                                    latest_gaze_data = ((norm_x, norm_y), timestamp)
+
+                            fixations = surfaces.get("fixations_on_surfaces", [])
+                            if fixations:
+                                latest_fixation_data = fixations
+
+                    elif topic.startswith("blinks"):
+                        latest_blink_data = loads(msg)
+                        if capture is not None:
+                            capture.add_blink(latest_blink_data)
+                        blink_buffer.append(latest_blink_data["timestamp"],
+                                            1.0 if latest_blink_data.get("type") == "onset" else 0.0,
+                                            latest_blink_data.get("confidence", 0))
+
+                    else:
+                        latest_pupil_data = loads(msg)
+                        if capture is not None:
+                            capture.add_pupil(latest_pupil_data)
+                        pupil_x, pupil_y = latest_pupil_data["norm_pos"]
+                        pupil_buffer.append(latest_pupil_data["timestamp"], pupil_x, pupil_y,
+                                            latest_pupil_data.get("confidence", 0),
+                                            latest_pupil_data.get("diameter", 0))
+                    listener_stats["frames"] += 1
 
             except Exception as e:
                 print("[gaze_listener] Error:", e)
+            finally:
+                listener_stats["cpu_time"] = time.thread_time() - cpu_start
+                listener_stats["wakeups"] += 1
+
+        context.destroy(linger=0)
 
-    thread = threading.Thread(target=listener, daemon=True)
-    thread.start()
+    global _listener_thread
+    _stop_event.clear()
+    listener_stats["connected_at"] = None
+    listener_stats["frames"] = 0
+    _listener_thread = threading.Thread(target=listener, daemon=True)
+    _listener_thread.start()
+
+
+def use_buffers(gaze, blink, pupil):
+    """
+    Makes the listener write into other buffers, anything with append(timestamp, *values),
+    e.g. the shared memory buffers of an ingest process. Call before start_gaze_listener.
+    """
+    global gaze_buffer, blink_buffer, pupil_buffer
+    gaze_buffer, blink_buffer, pupil_buffer = gaze, blink, pupil
+
+
+def stop_gaze_listener(timeout=1.0):
+    """Ends the listener loop and waits for the thread, so captures can be closed safely."""
+    _stop_event.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout)
 
 
 # === Interface ===
@@ -103,3 +177,9 @@ def get_latest_fixation():
 
 def get_latest_pupil():
     return latest_pupil_data
+
+def get_listener_cpu_time():
+    return listener_stats["cpu_time"]
+
+def get_listener_frames():
+    return listener_stats["frames"]
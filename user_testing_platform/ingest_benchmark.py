@@ -0,0 +1,133 @@
+"""
+Frame time jitter of the main loop with gaze ingest in a thread vs. in a child process.
+
+    python ingest_benchmark.py [--seconds 15] [--speed 4] [--fps 60] [--work-ms 6]
+
+A synthetic session is written as a pupil_replay recording and served, looped, by a
+ReplayServer at --speed times real time. For each ingest mode a stand-in for main.py's
+loop drains the buffers, One Euro filters the gaze itself in thread mode, runs a fixed
+amount of pure-Python work in place of rendering (calibrated to --work-ms without any
+ingest running) and sleeps until the next frame. The spread of the frame intervals shows
+how much the ingest disturbs the frame pacing.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import gaze_listener
+from config import WIDTH, HEIGHT, PUPIL_HOST
+from filters.one_euro_filter import BatchOneEuroFilter
+from ingest_process import IngestProcess
+from pupil_replay import ReplayServer
+from synthetic import SyntheticGazeSource
+
+WARMUP = 1.0  # seconds before frames are measured, for the subscription to settle
+
+
+def _work(iterations):
+    total = 0
+    for i in range(iterations):
+        total += i * i % 7
+    return total
+
+
+def calibrate(work_ms):
+    """Iterations of _work that take `work_ms` milliseconds on an idle interpreter."""
+    iterations = 10000
+    while True:
+        start = time.perf_counter()
+        _work(iterations)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0.05:
+            return max(1, int(iterations * work_ms / 1000 / elapsed))
+        iterations *= 2
+
+
+def run_mode(mode, recording, speed, seconds, fps, iterations):
+    server = ReplayServer(recording, port=0, speed=speed, loop=True).start()
+    one_euro_filter = BatchOneEuroFilter()
+    if mode == "process":
+        ingest = IngestProcess(port=server.port).start()
+        buffers = ingest.gaze_buffer, ingest.blink_buffer, ingest.pupil_buffer
+    else:
+        gaze_listener.start_gaze_listener(None, None, PUPIL_HOST, server.port)
+        buffers = gaze_listener.gaze_buffer, gaze_listener.blink_buffer, gaze_listener.pupil_buffer
+    gaze_reader, blink_reader, pupil_reader = (buffer.reader() for buffer in buffers)
+
+    budget = 1.0 / fps
+    intervals = []
+    samples = 0
+    last = None
+    measure_from = time.perf_counter() + WARMUP
+    end = measure_from + seconds
+    next_frame = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        if now >= measure_from:
+            if last is not None:
+                intervals.append(now - last)
+            last = now
+
+        gaze_ts, gaze = gaze_reader.drain()
+        blink_reader.drain()
+        pupil_reader.drain()
+        if now >= measure_from:
+            samples += len(gaze_ts)
+        if mode == "thread" and len(gaze_ts):
+            raw = np.empty((len(gaze_ts), 2))
+            raw[:, 0] = gaze[:, 0] * WIDTH
+            raw[:, 1] = (1 - gaze[:, 1]) * HEIGHT
+            one_euro_filter.filter(raw, gaze_ts)
+
+        _work(iterations)
+
+        next_frame += budget
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_frame = time.perf_counter()
+
+    if mode == "process":
+        cpu_time = ingest.cpu_time
+        ingest.stop()
+    else:
+        gaze_listener.stop_gaze_listener()
+        cpu_time = gaze_listener.get_listener_cpu_time()
+    server.stop()
+    return np.array(intervals), samples, cpu_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare frame pacing with gaze ingest in a thread and in a process")
+    parser.add_argument("--seconds", type=float, default=15.0, help="measured seconds per mode")
+    parser.add_argument("--speed", type=float, default=4.0, help="replay speed, raises the sample rate")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--work-ms", type=float, default=6.0, help="CPU work per frame standing in for rendering")
+    parser.add_argument("--modes", nargs="+", choices=["thread", "process"], default=["thread", "process"])
+    args = parser.parse_args()
+
+    source = SyntheticGazeSource(seed=0)
+    source.add_idle(30, [(r, c) for r in range(1, 4) for c in range(3, 6)])
+    handle, recording = tempfile.mkstemp(suffix=".pupilrec")
+    os.close(handle)
+    try:
+        source.to_recording(recording)
+        iterations = calibrate(args.work_ms)
+        for mode in args.modes:
+            intervals, samples, cpu_time = run_mode(mode, recording, args.speed, args.seconds, args.fps, iterations)
+            ms = intervals * 1000
+            print(f"[{mode}] {len(ms)} frames, interval mean {ms.mean():.2f} ms, std {ms.std():.2f} ms, "
+                  f"p99 {np.percentile(ms, 99):.2f} ms, max {ms.max():.2f} ms; "
+                  f"{samples / args.seconds:,.0f} gaze samples/s, ingest CPU {cpu_time:.2f}s")
+    finally:
+        os.remove(recording)
+
+
+if __name__ == "__main__":
+    main()
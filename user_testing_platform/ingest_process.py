@@ -0,0 +1,116 @@
+"""
+Gaze ingest in a child process.
+
+In thread mode the gaze listener decodes msgpack, filters by confidence and main.py runs
+the One Euro filter, all in the interpreter that renders, so all of it competes with
+pygame for the GIL. IngestProcess moves the listener and the One Euro filter into a child
+process. The child writes filtered gaze (screen pixels), blinks and pupil positions into
+SharedSampleRingBuffers that the main loop drains with ordinary readers, without locks
+and without a copy beyond the reader's own.
+"""
+import multiprocessing
+import signal
+
+from config import WIDTH, HEIGHT, PUPIL_HOST, PUPIL_REMOTE_PORT
+from ring_buffer import SharedSampleRingBuffer
+
+FILTERED_GAZE_FIELDS = ("x", "y", "received")
+BLINK_FIELDS = ("onset", "confidence")
+PUPIL_FIELDS = ("x", "y", "confidence", "diameter")
+
+# How often the child checks that the main process is still alive (seconds)
+PARENT_CHECK_INTERVAL = 0.2
+
+
+class _FilteringGazeSink:
+    """Takes the listener's gaze samples, One Euro filters them and stores screen positions."""
+    def __init__(self, buffer):
+        from filters.one_euro_filter import BatchOneEuroFilter
+
+        self.buffer = buffer
+        self.filter = BatchOneEuroFilter()
+
+    def append(self, timestamp, x, y, confidence, received):
+        fx, fy = self.filter.step(x * WIDTH, (1 - y) * HEIGHT, timestamp)
+        self.buffer.append(timestamp, fx, fy, received)
+
+
+def _ingest_main(specs, start_script, capture_filename, host, port, stop_event, stats):
+    # Ctrl+C goes to the whole process group; the main process handles it and stops us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import gaze_listener
+    from raw_capture import RawCaptureWriter
+
+    gaze, blink, pupil = (SharedSampleRingBuffer.attach(spec) for spec in specs)
+    gaze_listener.use_buffers(_FilteringGazeSink(gaze), blink, pupil)
+    capture = RawCaptureWriter(capture_filename) if capture_filename else None
+    gaze_listener.start_gaze_listener(start_script, capture, host, port)
+
+    parent = multiprocessing.parent_process()
+    try:
+        while not stop_event.wait(PARENT_CHECK_INTERVAL):
+            stats[1] = gaze_listener.get_listener_cpu_time()
+            stats[2] = gaze_listener.get_listener_frames()
+            if gaze_listener.listener_stats["connected_at"] is not None:
+                stats[0] = gaze_listener.listener_stats["connected_at"]
+            if parent is not None and not parent.is_alive():
+                break
+    finally:
+        gaze_listener.stop_gaze_listener()
+        if capture is not None:
+            capture.close()
+        stats[1] = gaze_listener.get_listener_cpu_time()
+        stats[2] = gaze_listener.get_listener_frames()
+        for buffer in (gaze, blink, pupil):
+            buffer.close()
+
+
+class IngestProcess:
+    """
+    Runs the gaze listener and the One Euro filter in a child process.
+
+    gaze_buffer holds filtered screen positions (x, y, received), blink_buffer and pupil_buffer the
+    same fields as in gaze_listener. stop() ends the child, waits for it (killing it after
+    `timeout`) and frees the shared memory; the child also ends on its own when the main
+    process dies.
+    """
+    def __init__(self, start_script=None, capture_filename=None, host=PUPIL_HOST, port=PUPIL_REMOTE_PORT, capacity=4096):
+        self.gaze_buffer = SharedSampleRingBuffer(FILTERED_GAZE_FIELDS, capacity)
+        self.blink_buffer = SharedSampleRingBuffer(BLINK_FIELDS, capacity)
+        self.pupil_buffer = SharedSampleRingBuffer(PUPIL_FIELDS, capacity)
+        self.stop_event = multiprocessing.Event()
+        # time.perf_counter() when the handshake finished (0 until then), listener CPU seconds,
+        # frames received (as of the child's last check of the parent)
+        self.stats = multiprocessing.RawArray("d", 3)
+        specs = [buffer.spec() for buffer in (self.gaze_buffer, self.blink_buffer, self.pupil_buffer)]
+        self.process = multiprocessing.Process(
+            target=_ingest_main, name="gaze-ingest", daemon=True,
+            args=(specs, start_script, capture_filename, host, port, self.stop_event, self.stats))
+
+    def start(self):
+        self.process.start()
+        return self
+
+    @property
+    def connected_at(self):
+        """time.perf_counter() at which the child finished the Pupil Remote handshake, or None.
+        perf_counter uses the system-wide monotonic clock, so it compares across processes."""
+        return self.stats[0] or None
+
+    @property
+    def cpu_time(self):
+        return self.stats[1]
+
+    @property
+    def frames(self):
+        return int(self.stats[2])
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        for buffer in (self.gaze_buffer, self.blink_buffer, self.pupil_buffer):
+            buffer.close()
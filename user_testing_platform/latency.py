@@ -0,0 +1,144 @@
+"""
+Latency of every gaze sample through the main loop.
+
+The listener stamps each gaze sample with time.perf_counter() when it was received. The
+main loop marks when each stage of the frame that consumed the sample finished: frame
+start (drained), One Euro filter, selection logic (dwell and selectors) and display (flip or
+dirty-rect update; frames that leave the screen unchanged mark no display stage). For
+every sample and stage the tracer records stage time minus receive time into a histogram
+per selection method. With a clock that maps Pupil timestamps to perf_counter, the time
+from the tracker's own timestamp to receive is recorded as well.
+"""
+import csv
+import math
+import time
+
+import numpy as np
+
+STAGES = ("frame", "filter", "logic", "display")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Histogram with constant relative precision, like HdrHistogram: bucket edges grow by
+    a factor (1 + precision) from `lowest` to `highest` seconds, so any percentile is
+    reported to within `precision` of the true value across the whole range.
+    """
+    def __init__(self, lowest=1e-6, highest=10.0, precision=0.01):
+        self.lowest = lowest
+        self.log_growth = math.log1p(precision)
+        self.counts = np.zeros(int(math.ceil(math.log(highest / lowest) / self.log_growth)) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, values):
+        """Records one latency or an array of them, in seconds."""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if not len(values):
+            return
+        index = np.floor(np.log(np.maximum(values, self.lowest) / self.lowest) / self.log_growth)
+        np.add.at(self.counts, np.minimum(index.astype(np.intp), len(self.counts) - 1), 1)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile, in seconds."""
+        if self.count == 0:
+            return float("nan")
+        rank = max(1, math.ceil(p / 100 * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self.lowest * math.exp((index + 1) * self.log_growth), self.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float("nan")
+
+
+class LatencyTracer:
+    """
+    Collects per-sample stage latencies. Per frame: begin() with the receive times of the
+    samples drained, mark() each stage as it finishes, end() to record them.
+    `pupil_to_local` maps Pupil timestamps to perf_counter time (None while it cannot);
+    when it is set begin() also takes the samples' Pupil timestamps and records the
+    "tracker" stage.
+    """
+    def __init__(self, pupil_to_local=None, clock=time.perf_counter):
+        self.pupil_to_local = pupil_to_local
+        self.clock = clock
+        self.histograms = {}  # (method, stage) -> LatencyHistogram
+        self.received = None
+        self.method = None
+        self.marks = []
+
+    def begin(self, received, method, pupil_timestamps=None):
+        self.received = np.array(received, dtype=np.float64)
+        self.method = method
+        self.marks = []
+        if self.pupil_to_local is not None and pupil_timestamps is not None and len(self.received):
+            local = self.pupil_to_local(np.asarray(pupil_timestamps))
+            if local is not None:
+                self._record("tracker", self.received - local)
+
+    def mark(self, stage):
+        self.marks.append((stage, self.clock()))
+
+    def end(self):
+        if self.received is not None and len(self.received):
+            for stage, at in self.marks:
+                self._record(stage, at - self.received)
+        self.received = None
+
+    def _record(self, stage, latencies):
+        key = (self.method, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(latencies)
+
+    def _ordered_stages(self):
+        return [s for s in ("tracker",) + STAGES if any(k[1] == s for k in self.histograms)]
+
+    def by_stage(self, method=None):
+        """{stage: histogram} for one method, or merged over all methods."""
+        merged = {}
+        for (m, stage), histogram in self.histograms.items():
+            if method is not None and m != method:
+                continue
+            if stage not in merged:
+                merged[stage] = LatencyHistogram()
+            merged[stage].merge(histogram)
+        return {stage: merged[stage] for stage in self._ordered_stages() if stage in merged}
+
+    def overlay_lines(self, method):
+        """Short text lines with p50 / p99 per stage for the live overlay."""
+        lines = [f"latency {method} (p50 / p99 ms):"]
+        for stage, histogram in self.by_stage(method).items():
+            lines.append(f"  {stage}: {histogram.percentile(50) * 1000:.1f} / {histogram.percentile(99) * 1000:.1f}")
+        return lines
+
+    def export(self, filename):
+        """Writes one row per method and stage (plus "all" methods) with count, mean, percentiles and max in ms."""
+        fields = ["method", "stage", "count", "mean_ms"] + [f"p{p:g}_ms" for p in PERCENTILES] + ["max_ms"]
+        methods = sorted({m for m, _ in self.histograms}) + [None]
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for method in methods:
+                for stage, histogram in self.by_stage(method).items():
+                    writer.writerow([method or "all", stage, histogram.count, f"{histogram.mean * 1000:.3f}"]
+                                    + [f"{histogram.percentile(p) * 1000:.3f}" for p in PERCENTILES]
+                                    + [f"{histogram.max * 1000:.3f}"])
+
+    def summary(self):
+        parts = [f"{stage} p50 {h.percentile(50) * 1000:.1f} / p99 {h.percentile(99) * 1000:.1f} ms"
+                 for stage, h in self.by_stage().items()]
+        return "latency from receive: " + (", ".join(parts) if parts else "no samples")
@@ -0,0 +1,166 @@
+"""
+Hit-testing of gaze points against the targets and zones on screen.
+
+LabelMap rasterizes every target (rectangles, discs) into a downsampled integer array
+once, so mapping a gaze point to the target under it is a single array index and a
+whole batch of points is one vectorized lookup, whatever the shapes are. Targets are
+painted in the order they were added, later ones on top. Adding, moving or removing a
+target only repaints the label pixels inside its old and new bounding boxes.
+"""
+import math
+from contextlib import contextmanager
+
+import numpy as np
+
+NO_TARGET = -1
+
+
+class LabelMap:
+    def __init__(self, width, height, scale=4):
+        """
+        scale: screen pixels per label pixel along each axis. A label pixel takes the
+            target under its centre, so edges that do not fall on multiples of `scale`
+            are resolved to within scale / 2 screen pixels.
+        """
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.labels = np.full((math.ceil(height / scale), math.ceil(width / scale)), NO_TARGET, dtype=np.int32)
+        self.keys = []     # label -> key, None once removed
+        self.ids = {}      # key -> label
+        self.shapes = {}   # label -> shape, in paint order
+        self.boxes = {}    # label -> label pixel bounding box of its shape
+        self.version = 0
+        self.repainted = 0  # label pixels rewritten so far
+        self.pending = None  # boxes to repaint when the changes() block ends
+
+    @contextmanager
+    def changes(self):
+        """Groups layout changes so the area they touch is repainted once, at the end."""
+        outer = self.pending is None
+        if outer:
+            self.pending = []
+        try:
+            yield self
+        finally:
+            if outer:
+                boxes, self.pending = self.pending, None
+                if boxes:
+                    self._repaint((min(b[0] for b in boxes), max(b[1] for b in boxes),
+                                   min(b[2] for b in boxes), max(b[3] for b in boxes)))
+
+    # === layout changes ===
+    def add_rect(self, key, x, y, w, h):
+        """Adds (or moves) the target `key` covering the rectangle x <= px < x + w, y <= py < y + h."""
+        self._set(key, ("rect", (x, y, w, h)))
+
+    def add_circle(self, key, center, radius):
+        """Adds (or moves) the target `key` covering the points closer than `radius` to `center`."""
+        self._set(key, ("circle", (center[0], center[1], radius)))
+
+    def remove(self, key):
+        label = self.ids.pop(key, None)
+        if label is None:
+            return
+        del self.shapes[label]
+        self.keys[label] = None
+        self._invalidate(self.boxes.pop(label))
+        self.version += 1
+
+    def _set(self, key, shape):
+        label = self.ids.get(key)
+        if label is None:
+            label = len(self.keys)
+            self.keys.append(key)
+            self.ids[key] = label
+        old = self.boxes.get(label)
+        self.shapes[label] = shape
+        self.boxes[label] = self._bbox(shape)
+        if old is not None:
+            self._invalidate(old)
+        self._invalidate(self.boxes[label])
+        self.version += 1
+
+    def _invalidate(self, box):
+        if self.pending is not None:
+            self.pending.append(box)
+        else:
+            self._repaint(box)
+
+    def _bbox(self, shape):
+        """Label pixel rows and columns (r0, r1, c0, c1) whose centres the shape can cover."""
+        kind, params = shape
+        if kind == "rect":
+            x, y, w, h = params
+            x0, y0, x1, y1 = x, y, x + w, y + h
+        else:
+            cx, cy, r = params
+            x0, y0, x1, y1 = cx - r, cy - r, cx + r, cy + r
+        rows, cols = self.labels.shape
+        s = self.scale
+        return (max(0, math.floor(y0 / s - 0.5)), min(rows, math.ceil(y1 / s + 0.5)),
+                max(0, math.floor(x0 / s - 0.5)), min(cols, math.ceil(x1 / s + 0.5)))
+
+    def _repaint(self, box):
+        r0, r1, c0, c1 = box
+        if r0 >= r1 or c0 >= c1:
+            return
+        self.labels[r0:r1, c0:c1] = NO_TARGET
+        for label, shape in self.shapes.items():
+            sr0, sr1, sc0, sc1 = self.boxes[label]
+            sr0, sr1, sc0, sc1 = max(r0, sr0), min(r1, sr1), max(c0, sc0), min(c1, sc1)
+            if sr0 >= sr1 or sc0 >= sc1:
+                continue
+            # screen coordinates of the label pixel centres
+            ys = (np.arange(sr0, sr1) + 0.5) * self.scale
+            xs = (np.arange(sc0, sc1) + 0.5) * self.scale
+            kind, params = shape
+            if kind == "rect":
+                x, y, w, h = params
+                mask = ((ys >= y) & (ys < y + h))[:, None] & ((xs >= x) & (xs < x + w))[None, :]
+            else:
+                cx, cy, r = params
+                mask = ((ys - cy) ** 2)[:, None] + ((xs - cx) ** 2)[None, :] < r * r
+            self.labels[sr0:sr1, sc0:sc1][mask] = label
+        self.repainted += (r1 - r0) * (c1 - c0)
+
+    # === lookups ===
+    def label_at(self, x, y):
+        row = int(y // self.scale)
+        col = int(x // self.scale)
+        rows, cols = self.labels.shape
+        if 0 <= row < rows and 0 <= col < cols:
+            return int(self.labels[row, col])
+        return NO_TARGET
+
+    def lookup(self, x, y):
+        """Key of the target under the screen point (x, y), or None."""
+        return self.key(self.label_at(x, y))
+
+    def lookup_batch(self, points):
+        """Labels of the targets under an (N, 2) array of screen points, NO_TARGET where there is none."""
+        points = np.asarray(points, dtype=np.float64)
+        rows = np.floor(points[:, 1] / self.scale).astype(np.intp)
+        cols = np.floor(points[:, 0] / self.scale).astype(np.intp)
+        n_rows, n_cols = self.labels.shape
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        labels = np.full(len(points), NO_TARGET, dtype=np.int32)
+        labels[inside] = self.labels[rows[inside], cols[inside]]
+        return labels
+
+    def key(self, label):
+        return None if label == NO_TARGET else self.keys[label]
+
+
+def add_task_grid(label_map, cells, cell_width, cell_height, target_radius=None):
+    """
+    Adds a target keyed (row, col) for every grid cell in `cells`: the whole cell, or a
+    disc of `target_radius` pixels at its centre for sparser layouts.
+    """
+    cw, ch = cell_width, cell_height
+    with label_map.changes():
+        for row, col in cells:
+            if target_radius is None:
+                label_map.add_rect((row, col), col * cw, row * ch, cw, ch)
+            else:
+                label_map.add_circle((row, col), ((col + 0.5) * cw, (row + 0.5) * ch), target_radius)
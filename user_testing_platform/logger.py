@@ -1,27 +1,250 @@
 import os
 import csv
+import math
 import time
+import queue
+import threading
 from datetime import datetime
 
+from config import WIDTH
+
+# Fixed column order of the two CSV files. The header is written once when the
+# file is opened, every entry afterwards is appended as a single row.
+EVENT_FIELDS = ["correct_res", "elapsed_task_time", "event_type", "from_highlighted_to_selected",
+                "game_mode", "gaze_movement_pr_task", "highlighted_cell", "index", "method",
+                "participant", "result", "target", "task_index", "timestamp", "useLess"]
+FITTS_FIELDS = ["elapsed_task_time", "game_mode", "method", "participant", "start_dist_to_target",
+                "task_index", "timestamp", "useLess"]
+# Target width W of the Fitts' law index of difficulty: a cell of main.py's 10 column task grid
+FITTS_TARGET_WIDTH = WIDTH // 10
+
+
+class _CsvWriterThread:
+    """
+    Background thread that appends queued rows to CSV files.
+    Rows are written in batches whenever `flush_interval` seconds have passed since the
+    last write or `batch_size` rows are waiting, whichever comes first, also while rows
+    keep arriving.
+    """
+    def __init__(self, flush_interval=1.0, batch_size=64):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.files = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def open(self, filename, fieldnames):
+        f = open(filename, "w", newline="")
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        f.flush()
+        self.files[filename] = (f, writer)
+
+    def put(self, filename, entry):
+        self.queue.put((filename, entry))
+
+    def flush(self, timeout=5.0):
+        """Blocks until every row queued so far is on disk."""
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join(timeout=5.0)
+
+    def _run(self):
+        pending = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, tuple):
+                pending.append(item)
+                if len(pending) < self.batch_size and time.monotonic() - last_flush < self.flush_interval:
+                    continue
+
+            self._write(pending)
+            pending = []
+            last_flush = time.monotonic()
+
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+
+        for f, _ in self.files.values():
+            f.close()
+
+    def _write(self, rows):
+        touched = set()
+        for filename, entry in rows:
+            f, writer = self.files[filename]
+            writer.writerow(entry)
+            touched.add(filename)
+        for filename in touched:
+            self.files[filename][0].flush()
+
+
+class RunningStats:
+    """Welford's running mean and variance. remove() takes back a value added earlier."""
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.0
+        self.m2 = 0.0
+
+    @staticmethod
+    def _valid(value):
+        return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+    def add(self, value):
+        if not self._valid(value):
+            return
+        self.n += 1
+        delta = value - self._mean
+        self._mean += delta / self.n
+        self.m2 += delta * (value - self._mean)
+
+    def remove(self, value):
+        if not self._valid(value) or self.n == 0:
+            return
+        if self.n == 1:
+            self.n, self._mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = (self.n * self._mean - value) / (self.n - 1)
+        self.m2 -= (value - self._mean) * (value - mean)
+        self._mean = mean
+        self.n -= 1
+
+    @property
+    def mean(self):
+        return self._mean if self.n else float("nan")
+
+    @property
+    def std(self):
+        return math.sqrt(max(0.0, self.m2) / (self.n - 1)) if self.n > 1 else float("nan")
+
+
+class RunningFitts:
+    """
+    Running least-squares fit MT = a + b * ID with ID = log2(D / W + 1), from sums, and
+    throughput as the mean of ID / MT, the same statistics as analysis.py. remove() takes
+    back a sample added earlier.
+    """
+    def __init__(self, target_width):
+        self.target_width = target_width
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = self.syy = self.throughput_sum = 0.0
+
+    def add(self, distance, movement_time, sign=1):
+        if distance is None or movement_time is None or not movement_time > 0:
+            return
+        x = math.log2(distance / self.target_width + 1)
+        y = movement_time
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.sxy += sign * x * y
+        self.syy += sign * y * y
+        self.throughput_sum += sign * x / y
+
+    def remove(self, distance, movement_time):
+        self.add(distance, movement_time, sign=-1)
+
+    def fit(self):
+        """(a, b, r2), NaN where there are too few or identical IDs."""
+        nan = float("nan")
+        if self.n < 2:
+            return nan, nan, nan
+        sxx = self.sxx - self.sx * self.sx / self.n
+        sxy = self.sxy - self.sx * self.sy / self.n
+        syy = self.syy - self.sy * self.sy / self.n
+        if sxx <= 0:
+            return nan, nan, nan
+        b = sxy / sxx
+        a = (self.sy - b * self.sx) / self.n
+        return a, b, (sxy * sxy / (sxx * syy) if syy > 0 else nan)
+
+    @property
+    def throughput(self):
+        return self.throughput_sum / self.n if self.n else float("nan")
+
+
+class MethodStats:
+    """Running statistics of the completed tasks and Fitts samples of one method and game mode."""
+    def __init__(self, target_width):
+        self.trials = 0
+        self.hits = 0
+        self.task_time = RunningStats()
+        self.highlight_to_select = RunningStats()
+        self.fitts = RunningFitts(target_width)
+
+    def add_task(self, entry, sign=1):
+        """Adds a TaskCompleted entry, or with sign=-1 takes it back."""
+        self.trials += sign
+        self.hits += sign * bool(entry["correct_res"])
+        update = RunningStats.add if sign > 0 else RunningStats.remove
+        update(self.task_time, entry["elapsed_task_time"])
+        update(self.highlight_to_select, entry["from_highlighted_to_selected"])
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.trials if self.trials else float("nan")
+
+
+STATS_FIELDS = ["method", "game_mode", "trials", "hits", "hit_rate",
+                "task_time_mean", "task_time_std", "highlight_to_select_mean", "highlight_to_select_std",
+                "fitts_n", "fitts_a", "fitts_b", "fitts_r2", "throughput"]
+
+
 class Logger:
-    def __init__(self, participant_name="anonymous", base_dir="user_testing_platform/logs"):
+    """
+    Session logger for task events and Fitts' law samples.
+
+    log_event/log_fitts only build a dict and queue it, the rows are appended to the
+    CSV files by a background writer. Rows are never rewritten: when change_log marks
+    the last completed task as useless, that task's row is appended again with
+    useLess=True and the same index, so readers keep the last row per index. Its Fitts
+    sample, if it had one, is appended again the same way with the same task_index.
+
+    Alongside, `stats` keeps running statistics per (method, game_mode), updated in O(1)
+    per logged row: hit rate, mean and spread of the task and highlight-to-select times,
+    and a Fitts' law fit with `target_width` as W. A task marked useless is taken back out.
+    """
+    def __init__(self, participant_name="anonymous", base_dir="user_testing_platform/logs",
+                 flush_interval=1.0, batch_size=64, target_width=FITTS_TARGET_WIDTH):
         timestamp = int(time.time())
         self.start_time = time.time()
         self.participant = participant_name
         self.task_index = 0
-        self.events = []
-        self.fitts_events = []
+        self.event_count = 0
+        self.last_task_completed = None
+        self.last_fitts = None  # Fitts sample of the last completed task
+        self.target_width = target_width
+        self.stats = {}  # (method, game_mode) -> MethodStats
+        self.stats_version = 0  # bumped on every change to stats
 
         better_timestamop = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filename = f"{participant_name}_{better_timestamop}.csv"
         self.filename = os.path.join(base_dir, filename)
-        
+
         fitts_filename = f"{participant_name}_FITTS_{better_timestamop}.csv"
         self.fitts_filename = os.path.join(base_dir, f"fitts_{fitts_filename}")
 
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.filename), exist_ok=True)
 
+        self.writer = _CsvWriterThread(flush_interval, batch_size)
+        self.writer.open(self.filename, EVENT_FIELDS)
+        self.writer.open(self.fitts_filename, FITTS_FIELDS)
+
     def log_event(self, event_type, result,target,highlighted_cell, elapsed_task_time,f_h_t_s,gaze_movement, method,game_mode):
         now = time.time()
         entry = {
@@ -29,7 +252,7 @@ class Logger:
             "timestamp": datetime.fromtimestamp(now),
             "participant": self.participant,
             "task_index": self.task_index,
-            "index": len(self.events),
+            "index": self.event_count,
             "result": result,
             "target": target,
             "highlighted_cell": highlighted_cell,
@@ -43,14 +266,18 @@ class Logger:
         }
         if event_type == "TaskCompleted":
             self.task_index += 1
-        
+            self.last_task_completed = entry
+            self.last_fitts = None
+            self._method_stats(method, game_mode).add_task(entry)
+
         if event_type == "highlighted_cell":
             entry['correct_res'] = None
-        
+
         if event_type == "dist_to_center_target":
             entry['correct_res'] = None
         # Logs the entry
-        self.events.append(entry)
+        self.event_count += 1
+        self.writer.put(self.filename, entry)
 
     def log_fitts(self,start_dist_to_target, elapsed_task_time, method, game_mode):
         now = time.time()
@@ -64,28 +291,66 @@ class Logger:
             "game_mode": game_mode,
             "useLess": False
         }
-        self.fitts_events.append(entry)
+        self.last_fitts = entry
+        self._method_stats(method, game_mode).fitts.add(start_dist_to_target, elapsed_task_time)
+        self.writer.put(self.fitts_filename, entry)
 
     def change_log(self):
-        # Find the last event with event_type == "TaskCompleted"
-        for event in reversed(self.events):
-            if event.get('event_type') == "TaskCompleted":
-                event['useLess'] = True
-                break
+        # Re-append the last event with event_type == "TaskCompleted", now marked useless
+        if self.last_task_completed is not None and not self.last_task_completed["useLess"]:
+            entry = dict(self.last_task_completed, useLess=True)
+            self.last_task_completed = entry
+            self._method_stats(entry["method"], entry["game_mode"]).add_task(entry, sign=-1)
+            self.writer.put(self.filename, entry)
+            # and its Fitts sample, logged right after it
+            if self.last_fitts is not None:
+                fitts = dict(self.last_fitts, useLess=True)
+                self.last_fitts = None
+                self._method_stats(fitts["method"], fitts["game_mode"]).fitts.remove(
+                    fitts["start_dist_to_target"], fitts["elapsed_task_time"])
+                self.writer.put(self.fitts_filename, fitts)
+
+    # === running statistics ===
+    def _method_stats(self, method, game_mode):
+        self.stats_version += 1
+        stats = self.stats.get((method, game_mode))
+        if stats is None:
+            stats = self.stats[(method, game_mode)] = MethodStats(self.target_width)
+        return stats
 
+    def overlay_lines(self, method, game_mode):
+        """Short text lines with the running statistics of one method and game mode."""
+        stats = self.stats.get((method, game_mode))
+        if stats is None or not stats.trials:
+            return [f"stats {method} / {game_mode}: no tasks yet"]
+        a, b, r2 = stats.fitts.fit()
+        return [
+            f"stats {method} / {game_mode}: {stats.hits}/{stats.trials} hits ({stats.hit_rate:.0%})",
+            f"  task time: {stats.task_time.mean:.2f} +- {stats.task_time.std:.2f} s",
+            f"  highlight to select: {stats.highlight_to_select.mean:.2f} +- {stats.highlight_to_select.std:.2f} s",
+            f"  Fitts: MT = {a:.2f} + {b:.2f} ID (r2 {r2:.2f}), {stats.fitts.throughput:.2f} bit/s, n {stats.fitts.n}",
+        ]
+
+    def export_stats(self, filename):
+        """Writes one row per method and game mode with the running statistics."""
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(STATS_FIELDS)
+            for (method, game_mode), stats in sorted(self.stats.items()):
+                a, b, r2 = stats.fitts.fit()
+                writer.writerow([method, game_mode, stats.trials, stats.hits, f"{stats.hit_rate:.4f}",
+                                 f"{stats.task_time.mean:.4f}", f"{stats.task_time.std:.4f}",
+                                 f"{stats.highlight_to_select.mean:.4f}", f"{stats.highlight_to_select.std:.4f}",
+                                 stats.fitts.n, f"{a:.4f}", f"{b:.4f}", f"{r2:.4f}", f"{stats.fitts.throughput:.4f}"])
+
+    def stats_summary(self):
+        """One line per method and game mode for the console at the end of a session."""
+        return [f"{method} / {game_mode}: {stats.hits}/{stats.trials} hits, task time {stats.task_time.mean:.2f} s, "
+                f"{stats.fitts.throughput:.2f} bit/s" for (method, game_mode), stats in sorted(self.stats.items())]
 
     def save(self):
-        if not self.events:
-            return
+        """Writes everything logged so far to disk before returning."""
+        self.writer.flush()
 
-        keys = sorted(set().union(*(e.keys() for e in self.events)))
-        with open(self.filename, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()
-            writer.writerows(self.events)
-
-        keys2 = sorted(set().union(*(e.keys() for e in self.fitts_events)))
-        with open(self.fitts_filename, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=keys2)
-            writer.writeheader()
-            writer.writerows(self.fitts_events)
+    def close(self):
+        self.writer.close()
@@ -1,375 +1,579 @@
-
-import os
-import sys
+import math
 import time
-import pygame
-import numpy as np
-
-from config import WIDTH, HEIGHT, BG_COLOR, METHODS, GAME_MODES, NUMBER_OF_SELECTIONS_PR_METHOD, NUMBER_OF_METHODS_PR_TASK
-from task_manager import TaskManager
-from logger import Logger
-from gaze_listener import start_gaze_listener, get_latest_gaze, get_latest_blink, get_latest_pupil
-from selection.hot_corners import HotCornerSelector
-from selection.blink_selection import BlinkSelection
-from selection.head_turn_selection import Head_Turn_Selector
-from filters.one_euro_filter import GazeOneEuroFilter
-
-pygame.init()
-# === Get participant ID from command line ===
-if len(sys.argv) < 2:
-    print("Usage: python3 main.py <participant_id>")
-    sys.exit(1)
-participant = sys.argv[1] if len(sys.argv) > 1 else "anonymous"
-logger = Logger(participant_name=participant)
-start_script = None if len(sys.argv) < 3 else sys.argv[2]
-
-
-# === Init Pygame ===
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Gaze Selection Method Evaluation")
-font = pygame.font.SysFont("Arial", 24)
-big_font = pygame.font.SysFont("Arial", 48)
-clock = pygame.time.Clock()
-
-# === Load AprilTags ===
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECT_ROOT = os.path.dirname(BASE_DIR)
-
-apriltag_size = int(min(WIDTH, HEIGHT) * 0.2)
-apriltags = [
-    pygame.transform.scale(pygame.image.load(os.path.join(PROJECT_ROOT ,"assets", f"tag_{i}.jpg")),
-                           (apriltag_size, apriltag_size))
-    for i in range(1, 5)
-]
-
-# === Init Modules ===
-one_euro_filter = GazeOneEuroFilter()
-
-# check her efter merge
-hotcorner_selector = HotCornerSelector(WIDTH, HEIGHT)
-blink_selector = BlinkSelection(blink_duration_selection='long')
-head_turn_selector = Head_Turn_Selector()
-
-
-# === App State ===
-selection_method = METHODS[0]
-method_index = 0
-game_mode = GAME_MODES[0]
-game_mode_index = 0
-candidate_cell = None
-confirmed_cell = None
-last_candidate = None
-dwell_start = None
-selection_time = None
-dwell_time = 0.2
-
-# === Task State ===
-timer_started = None
-highlight_start_time = None
-selection_counter = 0
-f_h_t_s = None
-higligted_cell = None
-time_for_new_task = 0
-acc_gaze_movement = 0
-prev_gaze_pos = None
-dist_to_target = None
-dwell_off_start = None
-
-# blink stuff
-waiting_for_blink_offset = False
-blink_initial_ts = None
-
-# === Init Task Manager with game mode ===
-task_manager = TaskManager(WIDTH, HEIGHT, rows=5, cols=10)
-
-
-# === Start Gaze Listener ===
-start_gaze_listener(start_script)
-
-# === Main Loop ===
-running = True
-while running:
-    screen.fill(BG_COLOR)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_m:
-                method_index = (method_index + 1) % len(METHODS)
-                selection_method = METHODS[method_index]
-                
-            elif event.key == pygame.K_n:
-                game_mode_index = (game_mode_index + 1) % len(GAME_MODES)
-                game_mode = GAME_MODES[game_mode_index]
-            elif event.key == pygame.K_SPACE:
-                logger.change_log()
-                logger.save()
-               
-
-    # === Gaze Processing ===
-    gaze = get_latest_gaze()
-    blink = get_latest_blink()
-    pupil = get_latest_pupil()
-
-
-    if gaze: 
-        (gx_norm, gy_norm), timestamp = gaze
-        raw_x = int(gx_norm * WIDTH)
-        raw_y = int((1 - gy_norm) * HEIGHT)
-        smooth = one_euro_filter.update(raw_x, raw_y, timestamp)
-        gx, gy = smooth
-        
-        row = int(gy // task_manager.cell_height)
-        col = int(gx // task_manager.cell_width)
-        current_cell = (row, col)
-        in_bounds = (
-            1 <= row < task_manager.rows - 1 and 
-            3 <= col < task_manager.cols - 4
-        )
-        # check if gaze is in bounds so nothing is highlighted when out of bounds
-        if selection_method != "head_turn":
-            if not in_bounds:
-                if dwell_off_start is None:
-                    dwell_off_start = time.time()
-                elif time.time() - dwell_off_start >= dwell_time:
-                    candidate_cell = None
-                    higligted_cell = None
-                    dwell_start = None
-            else:
-                dwell_off_start = None
-
-        if prev_gaze_pos is not None:
-            gaze_movement = np.linalg.norm(np.array((gx, gy)) - np.array(prev_gaze_pos))
-            acc_gaze_movement += gaze_movement
-
-        prev_gaze_pos = (gx, gy)
-        if selection_method == "head_turn":
-            dwell_time = 0.4
+STARTUP_BEGIN = time.perf_counter()
+import os
+import argparse
+
+from config import WIDTH, HEIGHT, BG_COLOR, METHODS, GAME_MODES, NUMBER_OF_SELECTIONS_PR_METHOD, NUMBER_OF_METHODS_PR_TASK, PUPIL_HOST, PUPIL_REMOTE_PORT, LOGIC_RATE
+from scheduler import Scheduler, StateTimings, StartupTimeline
+
+INTER_TRIAL_PAUSE = 1.0  # seconds of tracker time the confirmed cell stays on screen
+REPLAY_GRACE = 1.0  # seconds a finished replay waits for frames the listener has not received yet
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gaze selection method evaluation")
+    parser.add_argument("participant", help="participant id used in the log file names")
+    parser.add_argument("start_script", nargs="?", default=None, help="'r' to also start a Pupil Capture recording")
+    parser.add_argument("--capture", action="store_true",
+                        help="record every raw gaze, pupil, blink and fixation sample to a .gazecap file next to the logs")
+    parser.add_argument("--pupil-port", type=int, default=PUPIL_REMOTE_PORT, help="Pupil Remote port")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="replay a pupil_replay.py recording instead of connecting to Pupil Capture, quits when it ends")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--headless", action="store_true", help="render with SDL's dummy video driver (no window)")
+    parser.add_argument("--renderer", choices=["layered", "legacy"], default="layered",
+                        help="layered: cached layers and dirty rects, legacy: redraw and flip the whole frame")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate cap, 0 = unlimited")
+    parser.add_argument("--latency-overlay", action="store_true",
+                        help="show p50 / p99 sample latency per pipeline stage on screen")
+    parser.add_argument("--stats-overlay", action="store_true",
+                        help="show hit rate, task times and the Fitts fit of the current method and game mode on screen")
+    parser.add_argument("--ingest", choices=["thread", "process"], default="thread",
+                        help="thread: gaze listener thread in this process, process: listener and filter in a child process")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every phase of every frame, writes a Chrome trace and prints percentiles per phase at the end")
+    parser.add_argument("--fixation", choices=["none", "velocity", "dispersion"], default="velocity",
+                        help="fixation detection before dwell: velocity (I-VT), dispersion (I-DT) or none (raw samples)")
+    return parser.parse_args(argv)
+
+
+class App:
+    """
+    The evaluation session. Creating it has no side effects; startup() connects to the
+    tracker, opens the window and loads the images, run() does that and then runs the
+    main loop until the window is closed.
+
+    pygame, numpy, zmq and the modules built on them are imported in startup(), so this
+    module can be imported without them. The Pupil Remote handshake runs on the listener
+    thread and the images are decoded on worker threads while the window is created.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.timeline = StartupTimeline(STARTUP_BEGIN)
+        self.frames_rendered = 0
+        self.gaze_samples_used = 0
+        self.selection_counter = 0
+
+    def startup(self):
+        args = self.args
+        timeline = self.timeline
+        if args.headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+        # === Start Gaze Listener ===
+        # first, so the handshake overlaps with everything below
+        from logger import Logger
+        from raw_capture import RawCaptureWriter
+        from gaze_listener import start_gaze_listener, gaze_buffer, pupil_buffer, blink_buffer
+        timeline.mark("listener modules imported")
+
+        self.logger = Logger(participant_name=args.participant)
+        capture_filename = os.path.splitext(self.logger.filename)[0] + ".gazecap" if args.capture else None
+
+        self.replay_server = None
+        pupil_port = args.pupil_port
+        if args.replay:
+            from pupil_replay import ReplayServer
+            self.replay_server = ReplayServer(args.replay, port=0, speed=args.replay_speed).start()
+            pupil_port = self.replay_server.port
+            self.replay_received = (0, time.perf_counter())  # frames received, and since when
+
+        self.capture = None
+        self.ingest = None
+        if args.ingest == "process":
+            # gaze arrives already One Euro filtered, in screen pixels
+            from ingest_process import IngestProcess
+            self.ingest = IngestProcess(args.start_script, capture_filename, PUPIL_HOST, pupil_port).start()
+            buffers = self.ingest.gaze_buffer, self.ingest.pupil_buffer, self.ingest.blink_buffer
         else:
-            dwell_time = 0.2
-
-        if confirmed_cell is None and in_bounds:
-            if current_cell == last_candidate:
-                if dwell_start is None:
-                    dwell_start = time.time()
-                elif time.time() - dwell_start >= dwell_time:
-                    if candidate_cell != current_cell:
-                        candidate_cell = current_cell
-            else:
-                dwell_start = time.time()
-                last_candidate = current_cell
-        elif confirmed_cell:
-            candidate_cell = None
-
-        if selection_method == "hotcorner":
-            new_confirmed, action = hotcorner_selector.process_selection((gx, gy), current_cell, candidate_cell, confirmed_cell)
-
-            if action == "selected":
-                confirmed_cell = new_confirmed
-                selection_time = time.time()
-                print(f"[HotCorner] Confirmed {confirmed_cell}")
-                candidate_cell = None
-
-
-        elif selection_method == "blink":
-            
-            if blink:
-                triggered = blink_selector.blink_detection_update(blink)
-                
-                if triggered == (False, None):
-                    initial_ts = blink.get("timestamp")
-                    new_blink = None
-                    
-                    while True:
-                        new_blink = get_latest_blink()
-                        if new_blink.get("timestamp") != initial_ts and new_blink.get("type") == "offset":
-                            break
-
-                    if new_blink.get("type") == "offset":
-                        blink_final_res = blink_selector.blink_detection_update(new_blink)
-
-                        if blink_final_res == True and confirmed_cell is None:
-                            confirmed_cell = candidate_cell
-                            selection_time = time.time()
-                            
-                            print(f"[Blink] Confirmed {confirmed_cell}")
-                            candidate_cell = None  # reset candidate cell
-
-        elif selection_method == "head_turn":
-            action = head_turn_selector.update(pupil['norm_pos'], candidate_cell)
-            if action is not None:
-                confirmed_cell = action
-                selection_time = time.time()
-                
-                print(f"[Head Turn] Confirmed {confirmed_cell}")
-
-        # === Drawing ===
-        task_manager.draw(screen, font, highlight=confirmed_cell,game_mode=GAME_MODES[game_mode_index])
-
-        if timer_started is None:
-            timer_started = time.time()
-
-        if candidate_cell and not confirmed_cell:
-            crow, ccol = candidate_cell
-            # Make the red highlight fit within the cell by adding a margin
-            margin = 6  # Adjust margin as needed
-            rect = pygame.Rect(
-                ccol * task_manager.cell_width + margin,
-                crow * task_manager.cell_height + margin,
-                task_manager.cell_width - 2 * margin,
-                task_manager.cell_height - 2 * margin
-            )
-            if game_mode == "chase":
-                pygame.draw.rect(screen, (255, 0, 0), rect, 3)
-            else: 
-                rect = pygame.Rect(
-                    ccol * task_manager.cell_width,
-                    crow * task_manager.cell_height,
-                    task_manager.cell_width,
-                    task_manager.cell_height
-                )
-                pygame.draw.rect(screen, (255, 0, 0), rect, 5)
-            
-            # highlight timer started
-            if candidate_cell != higligted_cell or highlight_start_time is None:
-                highlight_start_time = time.time()
-                higligted_cell = candidate_cell
-                logger.log_event("highlighted_cell", 
-                         None, 
-                         (task_manager.current_target(game_mode,)),
-                         higligted_cell,
-                         None,
-                         None, 
-                         acc_gaze_movement, 
-                         selection_method,
-                         game_mode)
-                logger.save()
-
-        if confirmed_cell:
-            srow, scol = confirmed_cell
-            color = (255, 255, 0)
-
-            rect = pygame.Rect(
-                scol * task_manager.cell_width,
-                srow * task_manager.cell_height,
-                task_manager.cell_width,
-                task_manager.cell_height
-            )
-            pygame.draw.rect(screen, color, rect, 5)
-
-        # draw UI for hotcorners when in use 
-        if selection_method == "hotcorner":
-            hotcorner_selector.draw(screen, font, gaze_pos=(gx, gy))
-
-    # === Draw AprilTags ===
-    screen.blit(apriltags[0], (0, 0))
-    screen.blit(apriltags[1], (WIDTH - apriltag_size, 0))
-    screen.blit(apriltags[2], (0, HEIGHT - apriltag_size))
-    screen.blit(apriltags[3], (WIDTH - apriltag_size, HEIGHT - apriltag_size))
-
-    screen.blit(font.render(f"Selection_counter: {selection_counter}", True, (255, 255, 255)), (10, 300))
-
-    screen.blit(font.render(f"Method: {selection_method}", True, (255, 255, 255)), (10, 350))
-
-    screen.blit(font.render(f"Game Mode: {game_mode}", True, (255, 255, 255)), (10, 400))
-    screen.blit(font.render(f"Participant: {participant}", True, (255, 255, 255)), (10, 450))
-    screen.blit(font.render(f"higligted time: {highlight_start_time}, highligted cell {higligted_cell}", True, (255, 255, 255)), (10, 500))
-
-    
-    if game_mode == "memory":
-        screen.blit(font.render(f"Find this image among the other images!", True, (255, 0, 0)), (1770,860))
-
-
-    pygame.display.flip()
-    clock.tick(60)
-
-    # === keyboard shortcuts ===
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_ESCAPE]:
-        running = False
-
-    # == auto state control ==
-    
-    if confirmed_cell:
-        if highlight_start_time is not None and higligted_cell == confirmed_cell:
-            elapsed_time = time.time() - highlight_start_time
-            f_h_t_s = elapsed_time
-            highlight_start_time = None
-
-        selection_counter += 1
-        task_time = time.time() - timer_started
-        logger.log_event("TaskCompleted", 
-                         confirmed_cell, 
-                         (task_manager.current_target(game_mode,)), 
-                         higligted_cell,
-                         task_time,f_h_t_s, 
-                         acc_gaze_movement, 
-                         selection_method,
-                         game_mode)
-        logger.save()
-
-        target_center = task_manager.current_target(game_mode)
-        target_center_px = (
-            target_center[0] * task_manager.cell_width + task_manager.cell_width / 2,
-            target_center[1] * task_manager.cell_height + task_manager.cell_height / 2
-        )
-        
-        if confirmed_cell == target_center:
-            logger.log_fitts(dist_to_target, task_time, selection_method, game_mode)
-        
-        dist_to_target = np.linalg.norm(np.array((gx, gy)) - np.array(target_center_px))
-        task_manager.check_match(confirmed_cell)
-        
-        time.sleep(1)
-        task_manager.next_task()
-        timer_started = time.time()
-        # fitts law distance from target center to gaze position
-
-        confirmed_cell = None
+            if capture_filename:
+                self.capture = RawCaptureWriter(capture_filename)
+            start_gaze_listener(args.start_script, self.capture, PUPIL_HOST, pupil_port)
+            buffers = gaze_buffer, pupil_buffer, blink_buffer
+        self.gaze_reader, self.pupil_reader, self.blink_reader = (buffer.reader() for buffer in buffers)
+        timeline.mark(f"gaze {args.ingest} started")
+
+        # === Clock Sync ===
+        # selections are timed on the samples' Pupil timestamps, this maps them to local time
+        # and back; a replay not served in real time has no usable clock to sync to
+        from clock_sync import ClockSync
+        self.clock_sync = ClockSync(PUPIL_HOST, pupil_port)
+        self.realtime = not args.replay or args.replay_speed == 1
+        if self.realtime:
+            self.clock_sync.start()
+
+        # === Start loading images ===
+        # decoded (or read back from .asset_cache) on worker threads while the window opens
+        import pygame
+        from asset_cache import AssetCache, asset_path
+        from task_manager import TaskManager
+
+        apriltag_size = int(min(WIDTH, HEIGHT) * 0.2)
+        apriltag_requests = [(asset_path(f"tag_{i}.jpg"), (apriltag_size, apriltag_size)) for i in range(1, 5)]
+        self.asset_cache = AssetCache()
+        self.asset_cache.prefetch(apriltag_requests + TaskManager.asset_requests(WIDTH, HEIGHT, rows=5, cols=10))
+        timeline.mark("asset loading started")
+
+        # === Init Pygame ===
+        from text_cache import TextCache
+        pygame.init()
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Gaze Selection Method Evaluation")
+        # every font.render goes through one shared cache, only changed strings are rasterized
+        self.text_cache = TextCache()
+        self.font = self.text_cache.font(pygame.font.SysFont("Arial", 24))
+        self.big_font = self.text_cache.font(pygame.font.SysFont("Arial", 48))
+        self.clock = pygame.time.Clock()
+        timeline.mark("window created")
+
+        # === Load AprilTags ===
+        # converted to the display format now that the mode is set
+        self.apriltags = [self.asset_cache.get(path, size) for path, size in apriltag_requests]
+
+        # === Init Task Manager with game mode ===
+        self.task_manager = TaskManager(WIDTH, HEIGHT, rows=5, cols=10, assets=self.asset_cache)
+        self.asset_cache.close()
+        timeline.mark("assets ready")
+
+        # === Init Modules ===
+        from renderer import FrameRenderer, LayeredRenderer
+        from selection.hot_corners import HotCornerSelector
+        from selection.blink_selection import BlinkSelection
+        from selection.head_turn_selection import Head_Turn_Selector
+        from selection.fixation import DwellEngine, fixation_detector
+        from filters.one_euro_filter import BatchOneEuroFilter
+
+        self.one_euro_filter = BatchOneEuroFilter()
+
+        # check her efter merge
+        self.hotcorner_selector = HotCornerSelector(WIDTH, HEIGHT)
+        self.blink_selector = BlinkSelection(blink_duration_selection='long')
+        self.head_turn_selector = Head_Turn_Selector()
+
+        # === Hit-test layout ===
+        # task cells and hot corner zones in one label map, gaze -> target is a single index
+        from layout import LabelMap, add_task_grid
+        self.layout = LabelMap(WIDTH, HEIGHT)
+        add_task_grid(self.layout, self.task_manager.grid_cells, self.task_manager.cell_width, self.task_manager.cell_height)
+        self.hotcorner_selector.add_zones(self.layout)
+
+        # === Selection Logic ===
+        # dwell events from fixations on the task cells, selectors in fixed steps of tracker time
+        from selection_logic import SelectionLogic
+        self.dwell_engine = DwellEngine(self.layout, detector=fixation_detector(args.fixation, keep=False),
+                                        targets=self.task_manager.grid_cells)
+        # faster than real time nothing is skipped, so a replay decides as it would in real time
+        self.selection_logic = SelectionLogic(self.dwell_engine, self.hotcorner_selector, self.blink_selector,
+                                              self.head_turn_selector, rate=LOGIC_RATE,
+                                              max_steps=50 if self.realtime else None)
+
+        # === Init Renderer ===
+        from profiler import FrameProfiler, NullProfiler
+        self.profiler = FrameProfiler() if args.profile else NullProfiler()
+        renderer_class = LayeredRenderer if args.renderer == "layered" else FrameRenderer
+        self.renderer = renderer_class(self.screen, self.font, self.task_manager, self.hotcorner_selector, self.apriltags,
+                                       self.profiler)
+        self.state_timings = StateTimings(fps=args.fps or 60)
+        from latency import LatencyTracer
+        clock_sync = self.clock_sync
+        # tracker -> receive latency only means something against a real sync
+        self.latency_tracer = LatencyTracer(lambda ts: clock_sync.to_local(ts) if clock_sync.synced else None)
+        timeline.mark("modules ready")
+
+    def tracker_connected_at(self):
+        if self.ingest is not None:
+            return self.ingest.connected_at
+        from gaze_listener import listener_stats
+        return listener_stats["connected_at"]
+
+    def listener_frames(self):
+        if self.ingest is not None:
+            return self.ingest.frames
+        from gaze_listener import get_listener_frames
+        return get_listener_frames()
+
+    def replay_consumed(self):
+        """
+        True once the replay has published every frame, the listener received them all and
+        every sample was drained. Frames the sockets dropped never arrive, so after
+        REPLAY_GRACE seconds without a new frame the rest counts as received.
+        """
+        if not self.replay_server.finished.is_set():
+            return False
+        received, since = self.replay_received
+        now = time.perf_counter()
+        if self.listener_frames() != received:
+            self.replay_received = (self.listener_frames(), now)
+            return False
+        if received < self.replay_server.published and now - since < REPLAY_GRACE:
+            return False
+        return all(reader.ring.count == reader.cursor for reader in (self.gaze_reader, self.pupil_reader, self.blink_reader))
+
+    def print_startup_timeline(self):
+        connected_at = self.tracker_connected_at()
+        if connected_at is not None:
+            self.timeline.mark("tracker connected", at=connected_at)
+        print(f"[main] startup timeline ({self.asset_cache.summary()}):")
+        for line in self.timeline.summary():
+            print(f"[main] {line}")
+        if connected_at is None:
+            print("[main] tracker not connected yet")
+
+    def run(self):
+        self.startup()
+        try:
+            self.main_loop()
+        finally:
+            # also on errors and Ctrl+C, so the ingest process and the log files are closed
+            self.shutdown()
+
+    def main_loop(self):
+        import pygame
+        import numpy as np
+        from selection_logic import MAX_SAMPLE_DELAY
+
+        args = self.args
+        participant = args.participant
+        logger = self.logger
+        screen, font, big_font = self.screen, self.font, self.big_font
+        task_manager = self.task_manager
+        renderer = self.renderer
+        one_euro_filter = self.one_euro_filter
+        logic = self.selection_logic
+        gaze_reader, pupil_reader, blink_reader = self.gaze_reader, self.pupil_reader, self.blink_reader
+        tracer = self.latency_tracer
+        clock_sync = self.clock_sync
+        # phase marks, no-ops unless --profile
+        begin_frame, profile = self.profiler.begin_frame, self.profiler.mark
+        received_column = gaze_reader.ring.field_index("received")
+        latency_lines = []
+        latency_lines_at = 0.0
+        stats_lines, stats_key = [], None
+
+        # === App State ===
+        selection_method = METHODS[0]
+        method_index = 0
+        game_mode = GAME_MODES[0]
+        game_mode_index = 0
         candidate_cell = None
-        last_candidate = None
+        confirmed_cell = None
+        selection_time = None
+
+        # === Task State ===
+        # all task times are Pupil time, like the samples the selections are decided on
+        timer_started = None
+        highlight_start_time = None
+        selection_counter = 0
+        f_h_t_s = None
         higligted_cell = None
-    
-        
-    
-    if selection_counter == NUMBER_OF_SELECTIONS_PR_METHOD:
-        time_for_new_task += 1
+        time_for_new_task = 0
         acc_gaze_movement = 0
-        # Transition screen loop
-        while True:
-            screen.fill(BG_COLOR)
-            
-            # Display transition text
-            text = big_font.render(f"Next method: {METHODS[(method_index + 1) % len(METHODS)]}", True, (255, 255, 255))
-            subtext = font.render("Press RIGHT ARROW to continue...", True, (200, 200, 200))
-            screen.blit(text, ((WIDTH - text.get_width()) // 2, HEIGHT // 2 - 50))
-            screen.blit(subtext, ((WIDTH - subtext.get_width()) // 2, HEIGHT // 2 + 10))
-            
-            if time_for_new_task == NUMBER_OF_METHODS_PR_TASK:
-                text = big_font.render(f"End of task, beginning new task", True, (255, 255, 255))
-                subtext = font.render(f"next gamemode: {GAME_MODES[(game_mode_index + 1) % len(GAME_MODES)]}", True, (200, 200, 200))
-                screen.blit(text, ((WIDTH - text.get_width()) // 2, HEIGHT // 2 - 100))
-                screen.blit(subtext, ((WIDTH - subtext.get_width()) // 2, HEIGHT // 2 + 30))
-            pygame.display.flip()
-            clock.tick(60)
-
-            # Check for events to break the loop
+        prev_gaze_pos = None
+        dist_to_target = None
+
+        # filtered gaze position in screen pixels, kept between frames without new samples
+        gx = gy = None
+
+        # === Tracker Time ===
+        # how far the tracker clock has got: the newest sample drained, with a synced clock at
+        # least the current Pupil time less the time samples may be in transit, so a pause
+        # also ends while no samples arrive. Unsynced (a replay faster than real time) it only
+        # moves with the samples, and the replay decides exactly as in real time.
+        latest_sample = -math.inf
+
+        def tracker_now():
+            if clock_sync.synced:
+                return max(latest_sample, clock_sync.pupil_now() - MAX_SAMPLE_DELAY)
+            return latest_sample
+
+        # === Main Loop ===
+        # "task": selecting, "pause": showing the result between trials, "transition": waiting for RIGHT ARROW
+        state = "task"
+        # scheduled on tracker time, like the selections
+        scheduler = Scheduler(clock=tracker_now)
+        pause_end = None
+        state_timings = self.state_timings
+        frames_rendered = 0
+        gaze_samples_used = 0
+
+        running = True
+        while running:
+            state_timings.frame(state)
+            begin_frame()
+
+            # == scheduled state transitions ==
+            for due in scheduler.pop_due():
+                if due == "end_pause":
+                    task_manager.check_match(confirmed_cell)
+                    task_manager.next_task()
+                    timer_started = pause_end
+
+                    confirmed_cell = None
+                    candidate_cell = None
+                    higligted_cell = None
+                    # the samples after the pause already queued start the next trial
+                    logic.reset(pause_end)
+
+                    if selection_counter == NUMBER_OF_SELECTIONS_PR_METHOD:
+                        time_for_new_task += 1
+                        acc_gaze_movement = 0
+                        state = "transition"
+                    else:
+                        state = "task"
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN and event.key == pygame.K_RIGHT:
-                    selection_counter = 0
-                    method_index = (method_index + 1) % len(METHODS)
-                    selection_method = METHODS[method_index]
-                    if time_for_new_task == NUMBER_OF_METHODS_PR_TASK:
-                        time_for_new_task = 0
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_m:
+                        method_index = (method_index + 1) % len(METHODS)
+                        selection_method = METHODS[method_index]
+
+                    elif event.key == pygame.K_n:
                         game_mode_index = (game_mode_index + 1) % len(GAME_MODES)
                         game_mode = GAME_MODES[game_mode_index]
-                    break
+                    elif event.key == pygame.K_SPACE:
+                        profile("events")
+                        logger.change_log()
+                        logger.save()
+                        profile("log")
+                    elif event.key == pygame.K_RIGHT and state == "transition":
+                        selection_counter = 0
+                        method_index = (method_index + 1) % len(METHODS)
+                        selection_method = METHODS[method_index]
+                        if time_for_new_task == NUMBER_OF_METHODS_PR_TASK:
+                            time_for_new_task = 0
+                            game_mode_index = (game_mode_index + 1) % len(GAME_MODES)
+                            game_mode = GAME_MODES[game_mode_index]
+                        timer_started = clock_sync.pupil_now()
+                        logic.reset()
+                        state = "task"
+            profile("events")
+
+            # === Gaze Processing ===
+            # every sample that arrived since the previous frame
+            gaze_ts, gaze_samples = gaze_reader.drain()
+            pupil_ts, pupil_samples = pupil_reader.drain()
+            blink_ts, blink_samples = blink_reader.drain()
+            received = gaze_samples[:, received_column]
+            for timestamps in (gaze_ts, pupil_ts, blink_ts):
+                if len(timestamps):
+                    latest_sample = max(latest_sample, float(timestamps[-1]))
+            clock_sync.observe(gaze_ts, received)
+            tracer.begin(received, selection_method, gaze_ts)
+            tracer.mark("frame")
+            profile("gaze")
+
+            gaze_samples_used += len(gaze_ts)
+            if len(gaze_ts):
+                if self.ingest is not None:
+                    smooth = gaze_samples[:, :2]
+                else:
+                    raw = np.empty((len(gaze_ts), 2))
+                    raw[:, 0] = gaze_samples[:, 0] * WIDTH
+                    raw[:, 1] = (1 - gaze_samples[:, 1]) * HEIGHT
+                    smooth = one_euro_filter.filter(raw, gaze_ts)
+
+                path = smooth if prev_gaze_pos is None else np.vstack((prev_gaze_pos, smooth))
+                acc_gaze_movement += np.hypot(*np.diff(path, axis=0).T).sum()
+                prev_gaze_pos = smooth[-1].copy()  # smooth may be the reader's scratch space
+                gx, gy = smooth[-1]
+                tracer.mark("filter")
+                profile("filter")
+
+            if state == "transition":
+                screen.fill(BG_COLOR)
+                # Display transition text
+                text = big_font.render(f"Next method: {METHODS[(method_index + 1) % len(METHODS)]}", True, (255, 255, 255))
+                subtext = font.render("Press RIGHT ARROW to continue...", True, (200, 200, 200))
+                screen.blit(text, ((WIDTH - text.get_width()) // 2, HEIGHT // 2 - 50))
+                screen.blit(subtext, ((WIDTH - subtext.get_width()) // 2, HEIGHT // 2 + 10))
+
+                if time_for_new_task == NUMBER_OF_METHODS_PR_TASK:
+                    text = big_font.render(f"End of task, beginning new task", True, (255, 255, 255))
+                    subtext = font.render(f"next gamemode: {GAME_MODES[(game_mode_index + 1) % len(GAME_MODES)]}", True, (200, 200, 200))
+                    screen.blit(text, ((WIDTH - text.get_width()) // 2, HEIGHT // 2 - 100))
+                    screen.blit(subtext, ((WIDTH - subtext.get_width()) // 2, HEIGHT // 2 + 30))
+
             else:
-                continue
-            break
-        timer_started = time.time()
-pygame.quit()
+                # selection logic is paused while the result of the last trial is shown, the
+                # samples are still queued so the ones after the pause go to the next trial;
+                # blinks drained before the first gaze sample are queued as well
+                logic.feed(gaze_ts, smooth if len(gaze_ts) else None, pupil_ts, pupil_samples, blink_ts, blink_samples)
+                if state == "task" and gx is not None:
+                    logic.set_method(selection_method)
+                    logic.advance(clock_sync.pupil_now() if clock_sync.synced else None)
+                    tracer.mark("logic")
+                    profile("logic")
+
+                    candidate_cell, confirmed_cell = logic.candidate_cell, logic.confirmed_cell
+                    if confirmed_cell is not None:
+                        selection_time = logic.selection_time
+                        print(f"[{selection_method}] Confirmed {confirmed_cell}")
+                    higligted_cell, highlight_start_time = logic.highlighted_cell, logic.highlight_start
+                    for highlighted, _ in logic.take_highlights():
+                        logger.log_event("highlighted_cell",
+                                 None,
+                                 (task_manager.current_target(game_mode,)),
+                                 highlighted,
+                                 None,
+                                 None,
+                                 acc_gaze_movement,
+                                 selection_method,
+                                 game_mode)
+                        profile("log")
+
+                # the first task starts with the first gaze sample
+                if timer_started is None and len(gaze_ts):
+                    timer_started = float(gaze_ts[0])
+
+            # === Drawing ===
+            if state == "transition":
+                profile("draw")
+                pygame.display.flip()
+                profile("flip")
+                renderer.invalidate()
+                presented = True
+            else:
+                hud_lines = [
+                    (f"Selection_counter: {selection_counter}", (10, 300), (255, 255, 255)),
+                    (f"Method: {selection_method}", (10, 350), (255, 255, 255)),
+                    (f"Game Mode: {game_mode}", (10, 400), (255, 255, 255)),
+                    (f"Participant: {participant}", (10, 450), (255, 255, 255)),
+                    (f"higligted time: {highlight_start_time}, highligted cell {higligted_cell}", (10, 500), (255, 255, 255)),
+                ]
+                if game_mode == "memory":
+                    hud_lines.append(("Find this image among the other images!", (1770, 860), (255, 0, 0)))
+                if args.latency_overlay:
+                    # refreshed twice a second so the text cache is not flooded
+                    if time.perf_counter() - latency_lines_at > 0.5:
+                        latency_lines = tracer.overlay_lines(selection_method)
+                        latency_lines_at = time.perf_counter()
+                    hud_lines += [(line, (10, 600 + 30 * i), (0, 255, 255)) for i, line in enumerate(latency_lines)]
+                if args.stats_overlay:
+                    # rebuilt only when something was logged or the method changed
+                    key = (logger.stats_version, selection_method, game_mode)
+                    if key != stats_key:
+                        stats_lines, stats_key = logger.overlay_lines(selection_method, game_mode), key
+                    hud_lines += [(line, (10, 800 + 30 * i), (255, 255, 0)) for i, line in enumerate(stats_lines)]
+                profile("hud")
+                # between the last two logic steps while selecting, so the ring moves at display rate
+                gaze_pos = logic.render_gaze() if state == "task" else None
+                if gaze_pos is None and gx is not None:
+                    gaze_pos = (gx, gy)
+                presented = renderer.render(game_mode, selection_method, candidate_cell, confirmed_cell, gaze_pos, hud_lines)
+            # frames that left the screen as it was present nothing, they get no display latency
+            if presented:
+                tracer.mark("display")
+            tracer.end()
+
+            if frames_rendered == 0:
+                self.timeline.mark("first frame")
+                self.print_startup_timeline()
+            self.clock.tick(args.fps)
+            profile("tick")
+            frames_rendered += 1
+
+            # === keyboard shortcuts ===
+            keys = pygame.key.get_pressed()
+            if keys[pygame.K_ESCAPE]:
+                running = False
+
+            # == auto state control ==
+
+            if state == "task" and confirmed_cell:
+                if highlight_start_time is not None and higligted_cell == confirmed_cell:
+                    elapsed_time = selection_time - highlight_start_time
+                    f_h_t_s = elapsed_time
+                    highlight_start_time = None
+
+                selection_counter += 1
+                task_time = selection_time - timer_started
+                logger.log_event("TaskCompleted",
+                                 confirmed_cell,
+                                 (task_manager.current_target(game_mode,)),
+                                 higligted_cell,
+                                 task_time,f_h_t_s,
+                                 acc_gaze_movement,
+                                 selection_method,
+                                 game_mode)
+
+                target_center = task_manager.current_target(game_mode)
+                target_center_px = (
+                    target_center[0] * task_manager.cell_width + task_manager.cell_width / 2,
+                    target_center[1] * task_manager.cell_height + task_manager.cell_height / 2
+                )
+
+                if confirmed_cell == target_center:
+                    logger.log_fitts(dist_to_target, task_time, selection_method, game_mode)
+
+                # fitts law distance from target center to gaze position
+                dist_to_target = np.linalg.norm(np.array((gx, gy)) - np.array(target_center_px))
+
+                # keep rendering and reading gaze while the selection is shown, the trial ends on "end_pause"
+                state = "pause"
+                pause_end = selection_time + INTER_TRIAL_PAUSE
+                scheduler.schedule_at(pause_end, "end_pause")
+            profile("log")
+
+            # a replay ends the session once every frame was received and consumed, and no
+            # pause is over that would start another trial on samples already queued
+            if self.replay_server is not None and not scheduler.due() and self.replay_consumed():
+                running = False
+
+        self.frames_rendered = frames_rendered
+        self.gaze_samples_used = gaze_samples_used
+        self.selection_counter = selection_counter
+
+    def shutdown(self):
+        import pygame
+        from gaze_listener import stop_gaze_listener, get_listener_cpu_time
+
+        self.logger.close()
+        self.clock_sync.stop()
+        if self.ingest is not None:
+            self.ingest.stop()
+            listener_cpu_time = self.ingest.cpu_time
+        else:
+            stop_gaze_listener()
+            listener_cpu_time = get_listener_cpu_time()
+        if self.replay_server is not None:
+            self.replay_server.stop()
+        if self.capture is not None:
+            self.capture.close()
+        session_time = time.time() - self.logger.start_time
+        print(f"[main] gaze listener CPU time: {listener_cpu_time:.2f}s over {session_time:.2f}s session")
+        print(f"[main] {self.frames_rendered} frames, {self.gaze_samples_used} gaze samples "
+              f"({self.gaze_samples_used / session_time:.0f} samples/s), {self.selection_counter} selections in the current method")
+        for line in self.state_timings.summary():
+            print(f"[main] {line}")
+        print(f"[main] {self.renderer.summary()}")
+        print(f"[main] {self.text_cache.summary()}")
+        print(f"[main] {self.clock_sync.summary()}")
+        # per-method, per-stage latency percentiles next to the event log
+        log_dir, log_name = os.path.split(self.logger.filename)
+        latency_filename = os.path.join(log_dir, f"latency_{log_name}")
+        self.latency_tracer.export(latency_filename)
+        print(f"[main] {self.latency_tracer.summary()}, written to {latency_filename}")
+        # running per-method statistics, the same numbers analysis.py computes from the logs
+        stats_filename = os.path.join(log_dir, f"stats_{log_name}")
+        self.logger.export_stats(stats_filename)
+        for line in self.logger.stats_summary():
+            print(f"[main] {line}")
+        print(f"[main] session statistics written to {stats_filename}")
+        if self.profiler.enabled:
+            trace_filename = os.path.join(log_dir, f"profile_{os.path.splitext(log_name)[0]}.json")
+            self.profiler.export_trace(trace_filename)
+            for line in self.profiler.summary():
+                print(f"[main] {line}")
+            print(f"[main] Chrome trace written to {trace_filename}")
+        pygame.quit()
+
+
+def main(argv=None):
+    App(parse_args(argv)).run()
+
+
+if __name__ == "__main__":
+    main()
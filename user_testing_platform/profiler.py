@@ -0,0 +1,114 @@
+"""
+Per-frame phase profiler for the main loop.
+
+The loop calls begin_frame() at the top of every frame and mark(phase) whenever a phase
+has finished; a phase lasts from the previous mark (or the frame start) to its own mark,
+so phases need no explicit start and code without a mark of its own counts towards the
+next phase that is marked. Marks go into flat arrays and nothing is aggregated while
+the session runs. At the end export_trace() writes a Chrome trace (open it in
+chrome://tracing or ui.perfetto.dev) and summary() gives p50 / p95 / p99 of the time
+per frame spent in every phase.
+
+NullProfiler has the same methods and does nothing, so the loop calls it unconditionally
+when profiling is off.
+"""
+import json
+import time
+from array import array
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+# main loop phases in loop order, the summary lists them in this order
+PHASES = ("events", "gaze", "filter", "logic", "hud", "draw", "flip", "tick", "log")
+
+
+class NullProfiler:
+    enabled = False
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+
+class FrameProfiler:
+    enabled = True
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phase_names = []
+        self.phase_ids = {}
+        self.frame = -1
+        self.last = None
+        # one entry per mark
+        self.frames = array("l")
+        self.phases = array("H")
+        self.starts = array("d")
+        self.ends = array("d")
+        self.frame_starts = array("d")
+
+    def begin_frame(self):
+        self.frame += 1
+        self.last = self.clock()
+        self.frame_starts.append(self.last)
+
+    def mark(self, phase):
+        now = self.clock()
+        phase_id = self.phase_ids.get(phase)
+        if phase_id is None:
+            phase_id = self.phase_ids[phase] = len(self.phase_names)
+            self.phase_names.append(phase)
+        self.frames.append(self.frame)
+        self.phases.append(phase_id)
+        self.starts.append(self.last)
+        self.ends.append(now)
+        self.last = now
+
+    def per_frame(self):
+        """(frames x phases) seconds spent in each phase per frame, phases in first-seen order."""
+        frames = np.asarray(self.frames, dtype=np.int64)
+        phases = np.asarray(self.phases, dtype=np.int64)
+        durations = np.asarray(self.ends) - np.asarray(self.starts)
+        width = len(self.phase_names)
+        totals = np.bincount(frames * width + phases, weights=durations, minlength=(self.frame + 1) * width)
+        return totals.reshape(self.frame + 1, width)
+
+    def summary(self):
+        """One line per phase (and the whole frame) with p50 / p95 / p99 / max per frame in ms."""
+        if not len(self.frames):
+            return ["profile: no frames"]
+        totals = self.per_frame()
+        lines = [f"profile over {len(totals)} frames (ms per frame, " + " / ".join(f"p{p}" for p in PERCENTILES) + " / max):"]
+        order = sorted(range(len(self.phase_names)),
+                       key=lambda i: PHASES.index(self.phase_names[i]) if self.phase_names[i] in PHASES else len(PHASES) + i)
+        columns = [(self.phase_names[i], totals[:, i]) for i in order] + [("frame", totals.sum(axis=1))]
+        for name, column in columns:
+            values = np.percentile(column, PERCENTILES) * 1000
+            lines.append(f"  {name:>8}: " + " / ".join(f"{v:.2f}" for v in values) + f" / {column.max() * 1000:.2f}")
+        return lines
+
+    def export_trace(self, filename):
+        """Writes every frame and phase as Chrome trace complete events, times in microseconds."""
+        origin = self.frame_starts[0] if self.frame_starts else 0.0
+        frame_ends = {}
+        for frame, end in zip(self.frames, self.ends):
+            frame_ends[frame] = end
+
+        def event(name, start, end, args=None):
+            e = {"name": name, "ph": "X", "pid": 1, "tid": 1,
+                 "ts": round((start - origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+            if args:
+                e["args"] = args
+            return json.dumps(e)
+
+        with open(filename, "w") as f:
+            f.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+            f.write(json.dumps({"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "main loop"}}))
+            for frame, start in enumerate(self.frame_starts):
+                if frame in frame_ends:
+                    f.write(",\n" + event("frame", start, frame_ends[frame], {"frame": frame}))
+            for phase, start, end in zip(self.phases, self.starts, self.ends):
+                f.write(",\n" + event(self.phase_names[phase], start, end))
+            f.write("\n]}\n")
@@ -0,0 +1,186 @@
+"""
+Record the raw Pupil ZMQ stream and replay it through a fake Pupil Remote.
+
+    python pupil_replay.py record <file.pupilrec> [--duration S]
+    python pupil_replay.py serve <file.pupilrec> [--port 50020] [--speed 1]
+
+A recording is a msgpack stream of [arrival_time, topic, payload] frames, the payload
+is kept exactly as Pupil sent it. The replay server answers the same REQ commands
+the gaze listener uses ("SUB_PORT", "R", "t") and republishes the frames at `speed`
+times real time, or as fast as possible with speed 0.
+"""
+import argparse
+import threading
+import time
+
+import msgpack
+import zmq
+
+from config import PUPIL_HOST, PUPIL_REMOTE_PORT
+
+TOPICS = ("surface", "blinks", "pupil.0.2d")
+
+# Subscribers connect after asking for SUB_PORT; give them this long before publishing
+SUBSCRIBER_SETTLE_TIME = 0.5
+
+
+def record(filename, duration=None, host=PUPIL_HOST, port=PUPIL_REMOTE_PORT, topics=TOPICS):
+    context = zmq.Context()
+    req = context.socket(zmq.REQ)
+    req.connect(f"tcp://{host}:{port}")
+    req.send_string("SUB_PORT")
+    sub_port = req.recv_string()
+
+    sub = context.socket(zmq.SUB)
+    sub.connect(f"tcp://{host}:{sub_port}")
+    for topic in topics:
+        sub.setsockopt_string(zmq.SUBSCRIBE, topic)
+
+    print(f"[pupil_replay] Recording {', '.join(topics)} to {filename}, Ctrl+C to stop")
+    start = time.monotonic()
+    frames = 0
+    with open(filename, "wb") as f:
+        packer = msgpack.Packer()
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                if not sub.poll(100):
+                    continue
+                parts = sub.recv_multipart()
+                f.write(packer.pack([time.monotonic() - start, parts[0].decode(), parts[1]]))
+                frames += 1
+        except KeyboardInterrupt:
+            pass
+    context.destroy(linger=0)
+    print(f"[pupil_replay] Recorded {frames} frames in {time.monotonic() - start:.1f}s")
+
+
+def load_recording(filename):
+    """Returns a list of (arrival_time, topic, payload) tuples."""
+    with open(filename, "rb") as f:
+        return [tuple(frame) for frame in msgpack.Unpacker(f, raw=False)]
+
+
+def _first_pupil_time(frames):
+    for _, _, payload in frames:
+        timestamp = msgpack.loads(payload).get("timestamp")
+        if timestamp is not None:
+            return timestamp
+    return 0.0
+
+
+class ReplayServer:
+    """
+    Fake Pupil Remote publishing a recording.
+    `finished` is set once every frame has been published, `published` counts the frames sent.
+    """
+    def __init__(self, filename, port=PUPIL_REMOTE_PORT, speed=1.0, loop=False):
+        self.frames = load_recording(filename)
+        self.speed = speed
+        self.loop = loop
+        self.published = 0
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self.pupil_time_base = _first_pupil_time(self.frames)
+
+        self.context = zmq.Context()
+        self.rep = self.context.socket(zmq.REP)
+        if port:
+            self.rep.bind(f"tcp://*:{port}")
+            self.port = port
+        else:
+            self.port = self.rep.bind_to_random_port("tcp://*")
+        self.pub = self.context.socket(zmq.PUB)
+        self.pub.setsockopt(zmq.SNDHWM, 0)
+        self.pub_port = self.pub.bind_to_random_port("tcp://*")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join(1.0)
+
+    def _handle_request(self, start):
+        request = self.rep.recv_string()
+        if request == "SUB_PORT":
+            self.rep.send_string(str(self.pub_port))
+            return True
+        elif request == "t":
+            elapsed = 0.0 if start is None else (time.monotonic() - start) * (self.speed or 1.0)
+            self.rep.send_string(repr(self.pupil_time_base + elapsed))
+        else:
+            # "R" and any other notification is acknowledged and ignored
+            self.rep.send_string("OK")
+        return False
+
+    def _run(self):
+        print(f"[pupil_replay] Serving {len(self.frames)} frames on port {self.port} at speed {self.speed or 'max'}")
+        start = None  # set once the first subscriber asked for the SUB port
+        index = 0
+        while not self._stop.is_set():
+            if start is None:
+                wait = 100
+            elif self.speed and index < len(self.frames):
+                due = start + self.frames[index][0] / self.speed
+                wait = max(0, int((due - time.monotonic()) * 1000))
+            else:
+                wait = 0
+
+            if self.rep.poll(wait):
+                if self._handle_request(start) and start is None:
+                    time.sleep(SUBSCRIBER_SETTLE_TIME)
+                    start = time.monotonic()
+                continue
+            if start is None:
+                continue
+
+            # Publish every frame that is due
+            now = time.monotonic()
+            while index < len(self.frames) and (not self.speed or start + self.frames[index][0] / self.speed <= now):
+                _, topic, payload = self.frames[index]
+                self.pub.send_multipart([topic.encode(), payload])
+                self.published += 1
+                index += 1
+                if not self.speed and index % 100 == 0:
+                    break  # still answer requests when replaying flat out
+
+            if index == len(self.frames):
+                if not self.loop:
+                    break
+                index = 0
+                start = time.monotonic()
+
+        self.finished.set()
+        print(f"[pupil_replay] Published {self.published} frames")
+        # Keep answering requests until stopped so late clients do not hang
+        while not self._stop.is_set():
+            if self.rep.poll(100):
+                self._handle_request(start)
+        self.context.destroy(linger=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay the Pupil ZMQ stream")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record", help="record surface, blink and pupil frames from Pupil Capture")
+    rec.add_argument("file")
+    rec.add_argument("--duration", type=float, default=None, help="seconds to record, default until Ctrl+C")
+    serve = commands.add_parser("serve", help="publish a recording as a fake Pupil Remote")
+    serve.add_argument("file")
+    serve.add_argument("--port", type=int, default=PUPIL_REMOTE_PORT)
+    serve.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    serve.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.file, args.duration)
+    else:
+        server = ReplayServer(args.file, args.port, args.speed, args.loop).start()
+        try:
+            while not server.finished.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            pass
+        server.stop()
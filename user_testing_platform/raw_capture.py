@@ -0,0 +1,124 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# Stream ids stored in the "stream" column
+GAZE = 0
+PUPIL = 1
+BLINK = 2
+FIXATION = 3
+STREAM_NAMES = {GAZE: "gaze", PUPIL: "pupil", BLINK: "blink", FIXATION: "fixation"}
+
+# One 32 byte record per sample, whatever the stream.
+#   gaze:     x, y = surface norm_pos, flag = on_surf
+#   pupil:    x, y = norm_pos, value = diameter
+#   blink:    flag = 1 for onset / 0 for offset
+#   fixation: x, y = surface norm_pos, value = duration (ms), flag = on_surf
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("confidence", "<f4"),
+    ("value", "<f4"),
+    ("stream", "u1"),
+    ("flag", "u1"),
+    ("_pad", "V6"),
+])
+
+MAGIC = b"GAZECAP1"
+HEADER = struct.Struct("<8sIQ")  # magic, record size, record count
+HEADER_SIZE = 64
+
+
+class RawCaptureWriter:
+    """
+    Appends fixed-size records to a memory-mapped file.
+    The file is preallocated in chunks of `chunk_records` and grown by remapping when
+    full. The record count in the header is updated on every append, so a file left
+    behind by a crash can still be loaded. Not thread safe: only the listener writes.
+    """
+    def __init__(self, filename, chunk_records=200 * 60 * 5):
+        self.filename = filename
+        self.chunk_records = chunk_records
+        self.count = 0
+        self.capacity = 0
+        self.file = open(filename, "w+b")
+        self.mm = None
+        self.records = None
+        self._grow()
+        print(f"[raw_capture] Writing raw samples to {filename}")
+
+    def _grow(self):
+        if self.mm is not None:
+            # numpy keeps an export of the map alive, release it before remapping
+            self.records = None
+            self.mm.close()
+        self.capacity += self.chunk_records
+        self.file.truncate(HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self.mm, offset=HEADER_SIZE)
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, RECORD_DTYPE.itemsize, self.count)
+
+    def append(self, stream, timestamp, x=0.0, y=0.0, confidence=0.0, value=0.0, flag=0):
+        if self.count == self.capacity:
+            self._grow()
+        rec = self.records[self.count]
+        rec["timestamp"] = timestamp
+        rec["x"] = x
+        rec["y"] = y
+        rec["confidence"] = confidence
+        rec["value"] = value
+        rec["stream"] = stream
+        rec["flag"] = flag
+        self.count += 1
+        self._write_header()
+
+    def add_surface(self, surface):
+        """Records all gaze and fixations of one decoded surface message."""
+        for gaze in surface.get("gaze_on_surfaces", []):
+            x, y = gaze["norm_pos"]
+            self.append(GAZE, gaze["timestamp"], x, y, gaze.get("confidence", 0), flag=gaze.get("on_surf", False))
+        for fixation in surface.get("fixations_on_surfaces", []):
+            x, y = fixation["norm_pos"]
+            self.append(FIXATION, fixation["timestamp"], x, y, fixation.get("confidence", 0),
+                        fixation.get("duration", 0), fixation.get("on_surf", False))
+
+    def add_pupil(self, pupil):
+        x, y = pupil["norm_pos"]
+        self.append(PUPIL, pupil["timestamp"], x, y, pupil.get("confidence", 0), pupil.get("diameter", 0))
+
+    def add_blink(self, blink):
+        self.append(BLINK, blink["timestamp"], confidence=blink.get("confidence", 0),
+                    flag=blink.get("type") == "onset")
+
+    def close(self):
+        if self.mm is None:
+            return
+        self.mm.flush()
+        self.records = None
+        self.mm.close()
+        self.mm = None
+        # Drop the unused part of the last chunk
+        self.file.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        self.file.close()
+        print(f"[raw_capture] Saved {self.count} samples to {self.filename}")
+
+
+def load_capture(filename):
+    """
+    Returns a dict of stream name -> structured array (fields of RECORD_DTYPE) for a capture file.
+    The records are memory-mapped, so nothing is parsed or copied until a stream is sliced out.
+    """
+    with open(filename, "rb") as f:
+        magic, record_size, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{filename} is not a raw gaze capture file")
+
+    records = np.memmap(filename, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+    streams = records["stream"]
+    return {name: records[streams == stream] for stream, name in STREAM_NAMES.items()}
@@ -0,0 +1,178 @@
+import time
+
+import pygame
+
+from config import WIDTH, HEIGHT, BG_COLOR
+from profiler import NullProfiler
+
+CANDIDATE_COLOR = (255, 0, 0)
+CONFIRMED_COLOR = (255, 255, 0)
+
+
+class FrameRenderer:
+    """
+    Draws the task screen from scratch every frame and flips the whole display.
+    This is how main.py has always rendered; LayeredRenderer is the cached version.
+    Both keep the time spent per frame in `render_times` for comparison, and mark the
+    "draw", "hud" and "flip" phases on `profiler`.
+    """
+    name = "legacy"
+
+    def __init__(self, screen, font, task_manager, hotcorner_selector, apriltags, profiler=None):
+        self.screen = screen
+        self.font = font
+        self.task_manager = task_manager
+        self.hotcorner_selector = hotcorner_selector
+        self.apriltags = apriltags
+        self.render_times = []
+        self.profiler = profiler or NullProfiler()
+
+    def invalidate(self):
+        """Forces a full redraw on the next frame, e.g. after another screen was shown."""
+        pass
+
+    def render(self, game_mode, selection_method, candidate_cell, confirmed_cell, gaze_pos, hud_lines):
+        """Draws a frame, returns whether the display was updated."""
+        start = time.perf_counter()
+        presented = self.draw(game_mode, selection_method, candidate_cell, confirmed_cell, gaze_pos, hud_lines)
+        self.render_times.append(time.perf_counter() - start)
+        return presented
+
+    def draw(self, game_mode, selection_method, candidate_cell, confirmed_cell, gaze_pos, hud_lines):
+        screen = self.screen
+        screen.fill(BG_COLOR)
+
+        if gaze_pos is not None:
+            self.task_manager.draw(screen, self.font, highlight=confirmed_cell, game_mode=game_mode)
+            self.draw_selection(candidate_cell, confirmed_cell, game_mode)
+            # draw UI for hotcorners when in use
+            if selection_method == "hotcorner":
+                self.hotcorner_selector.draw(screen, self.font, gaze_pos=gaze_pos)
+
+        self.draw_apriltags(screen)
+        self.profiler.mark("draw")
+        self.draw_hud(hud_lines)
+        self.profiler.mark("hud")
+        pygame.display.flip()
+        self.profiler.mark("flip")
+        return True
+
+    def draw_apriltags(self, surface):
+        size = self.apriltags[0].get_width()
+        surface.blit(self.apriltags[0], (0, 0))
+        surface.blit(self.apriltags[1], (WIDTH - size, 0))
+        surface.blit(self.apriltags[2], (0, HEIGHT - size))
+        surface.blit(self.apriltags[3], (WIDTH - size, HEIGHT - size))
+
+    def draw_hud(self, hud_lines):
+        rects = []
+        for text, pos, color in hud_lines:
+            rects.append(self.screen.blit(self.font.render(text, True, color), pos))
+        return rects
+
+    def draw_selection(self, candidate_cell, confirmed_cell, game_mode):
+        """Draws the red candidate and yellow confirmed outlines, returns the touched rects."""
+        tm = self.task_manager
+        rects = []
+        if candidate_cell and not confirmed_cell:
+            crow, ccol = candidate_cell
+            if game_mode == "chase":
+                # Make the red highlight fit within the cell by adding a margin
+                margin = 6
+                rect = pygame.Rect(ccol * tm.cell_width + margin, crow * tm.cell_height + margin,
+                                   tm.cell_width - 2 * margin, tm.cell_height - 2 * margin)
+                rects.append(pygame.draw.rect(self.screen, CANDIDATE_COLOR, rect, 3))
+            else:
+                rect = pygame.Rect(ccol * tm.cell_width, crow * tm.cell_height, tm.cell_width, tm.cell_height)
+                rects.append(pygame.draw.rect(self.screen, CANDIDATE_COLOR, rect, 5))
+
+        if confirmed_cell:
+            srow, scol = confirmed_cell
+            rect = pygame.Rect(scol * tm.cell_width, srow * tm.cell_height, tm.cell_width, tm.cell_height)
+            rects.append(pygame.draw.rect(self.screen, CONFIRMED_COLOR, rect, 5))
+        return rects
+
+    def summary(self):
+        if not self.render_times:
+            return f"render ({self.name}): no frames"
+        times = sorted(self.render_times)
+        mean = sum(times) / len(times)
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        return f"render ({self.name}): {len(times)} frames, mean {mean * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+
+
+class LayeredRenderer(FrameRenderer):
+    """
+    Renders from cached layers and only pushes the changed parts of the screen.
+
+    The background with the AprilTags is composed once. The board (grid, memory images,
+    match image and hot-corner disc) is composed on top of it into a second cached
+    surface that is rebuilt only when the game mode, method or task layout changes.
+    Per frame only the overlays (candidate/confirmed outlines, hot-corner ring, HUD) are
+    drawn; the board is blitted back under the previous overlays and only those rects
+    are passed to display.update. A frame whose overlays did not change costs nothing.
+    """
+    name = "layered"
+
+    def __init__(self, screen, font, task_manager, hotcorner_selector, apriltags, profiler=None):
+        super().__init__(screen, font, task_manager, hotcorner_selector, apriltags, profiler)
+        self.static_layer = pygame.Surface(screen.get_size()).convert()
+        self.static_layer.fill(BG_COLOR)
+        self.draw_apriltags(self.static_layer)
+        self.board_layer = pygame.Surface(screen.get_size()).convert()
+        self.board_key = None
+        self.overlay_key = None
+        self.overlay_rects = []
+
+    def invalidate(self):
+        self.board_key = None
+
+    def _build_board(self, game_mode, selection_method, board_visible):
+        board = self.board_layer
+        board.blit(self.static_layer, (0, 0))
+        if board_visible:
+            self.task_manager.draw(board, self.font, highlight=None, game_mode=game_mode)
+            if selection_method == "hotcorner":
+                self.hotcorner_selector.draw_static(board, self.font)
+
+    def draw(self, game_mode, selection_method, candidate_cell, confirmed_cell, gaze_pos, hud_lines):
+        board_visible = gaze_pos is not None
+        board_key = (game_mode, selection_method, board_visible, self.task_manager.version)
+        gaze_ring = ()
+        if board_visible and selection_method == "hotcorner":
+            gaze_ring = self.hotcorner_selector.gaze_near(gaze_pos)
+        overlay_key = (candidate_cell, confirmed_cell, gaze_ring, tuple(hud_lines)) if board_visible else tuple(hud_lines)
+
+        if board_key != self.board_key:
+            self._build_board(game_mode, selection_method, board_visible)
+            self.board_key = board_key
+            self.screen.blit(self.board_layer, (0, 0))
+            self.overlay_rects = self._draw_overlays(board_visible, candidate_cell, confirmed_cell, game_mode, gaze_ring, hud_lines)
+            self.overlay_key = overlay_key
+            pygame.display.flip()
+            self.profiler.mark("flip")
+            return True
+
+        if overlay_key == self.overlay_key:
+            return False
+
+        # restore the board under the previous overlays, then draw the new ones
+        for rect in self.overlay_rects:
+            self.screen.blit(self.board_layer, rect, rect)
+        new_rects = self._draw_overlays(board_visible, candidate_cell, confirmed_cell, game_mode, gaze_ring, hud_lines)
+        pygame.display.update(self.overlay_rects + new_rects)
+        self.profiler.mark("flip")
+        self.overlay_rects = new_rects
+        self.overlay_key = overlay_key
+        return True
+
+    def _draw_overlays(self, board_visible, candidate_cell, confirmed_cell, game_mode, gaze_ring, hud_lines):
+        rects = []
+        if board_visible:
+            rects += self.draw_selection(candidate_cell, confirmed_cell, game_mode)
+            if gaze_ring:
+                rects += self.hotcorner_selector.draw_gaze_ring(self.screen, gaze_ring)
+        self.profiler.mark("draw")
+        rects += self.draw_hud(hud_lines)
+        self.profiler.mark("hud")
+        return rects
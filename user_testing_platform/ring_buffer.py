@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class SampleRingBuffer:
+    """
+    Preallocated, array-backed ring buffer of timestamped samples for one stream.
+
+    There is exactly one writer (the gaze listener thread) and any number of readers.
+    The writer stores a row first and only then publishes the new write count, so a
+    reader never needs a lock: it snapshots the count, copies the rows it is missing
+    and drops any rows the writer lapped while it was copying.
+    """
+    def __init__(self, fields, capacity=4096):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.fields)), dtype=np.float64)
+        self.count = 0  # total number of samples ever written
+
+    def field_index(self, name):
+        return self.fields.index(name)
+
+    def append(self, timestamp, *values):
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.values[i] = values
+        self.count += 1
+
+    def latest(self):
+        """Returns (timestamp, values) of the newest sample or None."""
+        end = self.count
+        if end == 0:
+            return None
+        i = (end - 1) % self.capacity
+        return self.timestamps[i], self.values[i].copy()
+
+    def drain_since(self, cursor, out_timestamps=None, out_values=None):
+        """
+        Copies every sample written after `cursor`.
+        Returns (timestamps, values, new_cursor). If out arrays are given the rows are
+        copied into them and views of the filled part are returned, so steady-state
+        reads allocate nothing.
+        """
+        end = self.count
+        start = max(cursor, end - self.capacity)
+        n = end - start
+
+        if out_timestamps is None or len(out_timestamps) < n:
+            out_timestamps = np.empty(n, dtype=np.float64)
+            out_values = np.empty((n, len(self.fields)), dtype=np.float64)
+
+        first = start % self.capacity
+        head = min(n, self.capacity - first)
+        out_timestamps[:head] = self.timestamps[first:first + head]
+        out_values[:head] = self.values[first:first + head]
+        out_timestamps[head:n] = self.timestamps[:n - head]
+        out_values[head:n] = self.values[:n - head]
+
+        # Rows the writer overwrote while we were copying are no longer valid
+        lapped = max(0, (self.count - self.capacity) - start)
+        lapped = min(lapped, n)
+        return out_timestamps[lapped:n], out_values[lapped:n], end
+
+    def reader(self, from_start=False):
+        return RingReader(self, from_start)
+
+
+class RingReader:
+    """A consumer's cursor into a SampleRingBuffer with its own reusable output arrays."""
+    def __init__(self, ring, from_start=False):
+        self.ring = ring
+        self.cursor = 0 if from_start else ring.count
+        self._timestamps = np.empty(ring.capacity, dtype=np.float64)
+        self._values = np.empty((ring.capacity, len(ring.fields)), dtype=np.float64)
+
+    def drain(self):
+        """
+        Returns (timestamps, values) of all samples since the previous drain.
+        The arrays are views into this reader's scratch space and are overwritten by the next drain.
+        """
+        timestamps, values, self.cursor = self.ring.drain_since(self.cursor, self._timestamps, self._values)
+        return timestamps, values
+
+
+class SharedSampleRingBuffer(SampleRingBuffer):
+    """
+    SampleRingBuffer whose arrays live in multiprocessing.shared_memory, so the writer can
+    be another process. The write count is stored in the shared block too and published
+    after the row, as in the in-process buffer. The creating process owns the block and
+    unlinks it on close(); other processes attach() with the spec() of the owner.
+    """
+    def __init__(self, fields, capacity=4096, name=None):
+        from multiprocessing.shared_memory import SharedMemory
+
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.owner = name is None
+        n_fields = len(self.fields)
+        size = 8 + capacity * 8 + capacity * n_fields * 8
+        self.shm = SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        buf = self.shm.buf
+        self._count = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self.timestamps = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=8)
+        self.values = np.ndarray((capacity, n_fields), dtype=np.float64, buffer=buf, offset=8 + capacity * 8)
+        if self.owner:
+            self._count[0] = 0
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    @count.setter
+    def count(self, value):
+        self._count[0] = value
+
+    def spec(self):
+        """Picklable description to attach() to this buffer from another process."""
+        return self.fields, self.capacity, self.shm.name
+
+    @classmethod
+    def attach(cls, spec):
+        fields, capacity, name = spec
+        return cls(fields, capacity, name=name)
+
+    def close(self):
+        # the array views must go before the mapping can be closed
+        self._count = self.timestamps = self.values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
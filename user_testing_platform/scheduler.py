@@ -0,0 +1,93 @@
+import heapq
+import time
+
+
+class Scheduler:
+    """
+    Timer queue polled once per frame by the main loop.
+    Instead of sleeping, the loop schedules a named event and keeps rendering and
+    draining gaze data until pop_due() hands the event back.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.events = []
+        self.counter = 0  # keeps events with equal due times in scheduling order
+
+    def schedule(self, delay, name):
+        self.schedule_at(self.clock() + delay, name)
+
+    def schedule_at(self, when, name):
+        """Schedules `name` at time `when` of the scheduler's clock."""
+        heapq.heappush(self.events, (when, self.counter, name))
+        self.counter += 1
+
+    def cancel(self, name):
+        self.events = [e for e in self.events if e[2] != name]
+        heapq.heapify(self.events)
+
+    def pending(self, name):
+        return any(e[2] == name for e in self.events)
+
+    def due(self):
+        """True if an event's time has come, without taking it."""
+        return bool(self.events) and self.events[0][0] <= self.clock()
+
+    def pop_due(self):
+        """Returns the names of all events whose time has come, in due order."""
+        now = self.clock()
+        due = []
+        while self.events and self.events[0][0] <= now:
+            due.append(heapq.heappop(self.events)[2])
+        return due
+
+
+class StateTimings:
+    """
+    Frame time statistics per main loop state.
+    A frame counts as a stall when it took longer than `stall_factor` frame budgets.
+    """
+    def __init__(self, fps=60, stall_factor=1.5, clock=time.perf_counter):
+        self.clock = clock
+        self.budget = 1.0 / fps
+        self.stall_limit = self.budget * stall_factor
+        self.stats = {}
+        self.last_frame = None
+
+    def frame(self, state):
+        """Call once per frame, attributes the time since the previous call to `state`."""
+        now = self.clock()
+        if self.last_frame is not None:
+            dt = now - self.last_frame
+            s = self.stats.setdefault(state, {"frames": 0, "total": 0.0, "max": 0.0, "stalls": 0})
+            s["frames"] += 1
+            s["total"] += dt
+            s["max"] = max(s["max"], dt)
+            if dt > self.stall_limit:
+                s["stalls"] += 1
+        self.last_frame = now
+
+    def summary(self):
+        lines = []
+        for state, s in self.stats.items():
+            mean = s["total"] / s["frames"]
+            lines.append(f"{state}: {s['frames']} frames, mean {mean * 1000:.1f} ms, "
+                         f"max {s['max'] * 1000:.1f} ms, {s['stalls']} stalls")
+        return lines
+
+
+class StartupTimeline:
+    """
+    Milestones of application startup, as offsets from the moment the process started
+    (`start`, a time.perf_counter() value taken before the heavy imports).
+    """
+    def __init__(self, start, clock=time.perf_counter):
+        self.start = start
+        self.clock = clock
+        self.marks = []
+
+    def mark(self, name, at=None):
+        """Records `name` as reached now, or at the perf_counter() value `at`."""
+        self.marks.append((name, (self.clock() if at is None else at) - self.start))
+
+    def summary(self):
+        return [f"{offset * 1000:7.1f} ms  {name}" for name, offset in sorted(self.marks, key=lambda m: m[1])]
@@ -10,7 +10,10 @@ class BlinkSelection:
     This class detects blinks and determines if the blink duration is long or short.
     Blink_duration_selection can be set to either long or short. depending on the duration of blink you want to select. Default is long.
     
-    Blkink detection is based on the time between blink onset and offset events.
+    Blkink detection is based on the time between blink onset and offset events, measured with the
+    Pupil timestamps of the events. The selector is a small state machine fed with the blink stream
+    (feed or blink_detection_update); a finished blink of the right length raises a confirmation
+    that the frame loop picks up with poll_confirmation, so nothing ever waits for an offset.
     '''
     def __init__(self, long_blink_threshold=0.4, 
                        short_blink_threshold=0.2,
@@ -21,6 +24,9 @@ class BlinkSelection:
         self.start_time = None
         self.end_time = None
         self.blink_in_progress = False
+        self.confirmed = False
+        self.confirmed_at = None  # Pupil timestamp of the offset that confirmed the last selection
+        self.last_blink_duration = None
 
         
         # blink duration selection either long or short else default to long 
@@ -30,40 +36,59 @@ class BlinkSelection:
             self.blink_duration_selection = "short"
         else:
             print("Invalid blink duration selection. Defaulting to long blink duration.")
-            self.blink_duration_selection = False
+            self.blink_duration_selection = "long"
+
+    def feed(self, timestamps, values):
+        '''Feeds a batch from gaze_listener.blink_buffer (values[:, 0] is 1 for onset, 0 for offset).'''
+        for timestamp, (onset, _) in zip(timestamps, values):
+            self.on_blink_event(onset == 1.0, timestamp)
 
     def blink_detection_update(self, blink_data):
-        if blink_data is not None and blink_data['type'] == 'onset' and not self.blink_in_progress:
-            self.start_time = time.time()
+        '''Feeds a single blink message as received from Pupil. Returns True if it confirmed a selection.'''
+        if blink_data is None:
+            return False
+        return self.on_blink_event(blink_data['type'] == 'onset', blink_data['timestamp'])
+
+    def on_blink_event(self, onset, timestamp):
+        if onset and not self.blink_in_progress:
+            self.start_time = timestamp
             self.blink_in_progress = True
             print("Blink Onset Detected")
-            return False, None 
-        
-        elif blink_data is not None and blink_data['type'] == 'offset' and self.blink_in_progress:
+            return False
+
+        elif not onset and self.blink_in_progress:
             print("Blink Offset detected")
-            self.end_time = time.time()
-            self.blink_in_progress = False
-            if self.start_time is not None and self.end_time is not None:
-                blink_duration = self.end_time - self.start_time
-                if blink_duration > self.long_blink_threshold and self.blink_duration_selection == "long":
-                    print(f"Long Blink Duration: {blink_duration:.4f} seconds")
-                    self.reset_state()
-                    return True
-                
-                elif blink_duration < self.short_blink_threshold and self.blink_duration_selection == "short":
-                    print(f"Short Blink Duration: {blink_duration:.4f} seconds")
-                    self.reset_state()
-                    return True
-                
-                #use this case for testing, to figure out a good duration for a blink blink
-                else:
-                    print(f"Medium Blink Duration: {blink_duration:.4f} seconds")
-                    self.reset_state()
-                    return False
+            self.end_time = timestamp
+            blink_duration = self.end_time - self.start_time
+            self.last_blink_duration = blink_duration
+            self.reset_state()
+
+            if blink_duration > self.long_blink_threshold and self.blink_duration_selection == "long":
+                print(f"Long Blink Duration: {blink_duration:.4f} seconds")
+                self.confirmed = True
+                self.confirmed_at = timestamp
+                return True
+
+            elif blink_duration < self.short_blink_threshold and self.blink_duration_selection == "short":
+                print(f"Short Blink Duration: {blink_duration:.4f} seconds")
+                self.confirmed = True
+                self.confirmed_at = timestamp
+                return True
+
+            #use this case for testing, to figure out a good duration for a blink blink
+            else:
+                print(f"Medium Blink Duration: {blink_duration:.4f} seconds")
+                return False
 
         return False
-        
+
+    def poll_confirmation(self):
+        '''Returns True once for every confirmed blink since the last poll.'''
+        confirmed = self.confirmed
+        self.confirmed = False
+        return confirmed
+
     def reset_state(self):
         self.start_time = None
         self.end_time = None
-        self.blink_in_progress = False
\ No newline at end of file
+        self.blink_in_progress = False
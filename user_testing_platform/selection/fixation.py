@@ -0,0 +1,297 @@
+"""
+Streaming fixation detection and dwell events per target.
+
+Both fixation detectors take one gaze sample at a time (Pupil timestamp, screen pixels)
+in O(1), amortized for I-DT, and report whether the sample belongs to a fixation and
+where that fixation is:
+- VelocityFixationDetector (I-VT): a sample is part of a fixation while the gaze moved
+  slower than `threshold` pixels per second since the previous sample.
+- DispersionFixationDetector (I-DT): a fixation is a run of samples lasting at least
+  `min_duration` whose dispersion, (max x - min x) + (max y - min y), stays within
+  `threshold` pixels. The extremes come from monotonic deques, so growing and sliding
+  the window never rescans it.
+
+DwellEngine maps the fixation centre (or, without a detector, the sample itself) to the
+target under it in a layout.LabelMap and turns the stream into events per target:
+"enter" when the gaze lands on it, "dwell" once it has stayed dwell_time, "leave" once it
+has been away leave_time, and "idle" once no target has been looked at for leave_time.
+Samples in a saccade belong to no target, so cells crossed on the way do not collect
+dwell time. tick() runs the leave and idle timeouts while time passes without samples.
+With keep=True the finished fixations are kept, for compare_fixations() against the ones
+Pupil sends in fixations_on_surfaces; a live session passes keep=False, so the list does
+not grow for as long as the session runs.
+"""
+from collections import deque
+
+import numpy as np
+
+
+class VelocityFixationDetector:
+    def __init__(self, threshold=6000.0, keep=True):
+        """
+        threshold: pixels per second between consecutive samples. Sample to sample noise of
+        the filtered gaze reaches a few thousand px/s at 120 Hz, saccades tens of thousands.
+        """
+        self.threshold = threshold
+        self.keep = keep
+        self.fixations = []  # (start, end, x, y) of every finished fixation
+        self.index = 0  # number of fixations started so far
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self.start = None  # start of the current fixation, None in a saccade
+        self.end = None
+        self.n = 0
+        self.sum_x = self.sum_y = 0.0
+
+    def update(self, t, x, y):
+        """Feeds one sample, returns the centre of the fixation it belongs to or None."""
+        last, self.last = self.last, (t, x, y)
+        if last is None:
+            return None
+        dt = t - last[0]
+        if dt <= 0:
+            return self.centre()
+        dx, dy = x - last[1], y - last[2]
+        if dx * dx + dy * dy > (self.threshold * dt) ** 2:
+            self._finish()
+            return None
+        if self.start is None:
+            self.start = last[0]
+            self.index += 1
+            self.n, self.sum_x, self.sum_y = 1, last[1], last[2]
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.end = t
+        return self.sum_x / self.n, self.sum_y / self.n
+
+    def centre(self):
+        return None if self.start is None else (self.sum_x / self.n, self.sum_y / self.n)
+
+    def flush(self):
+        """Ends the current fixation, e.g. at the end of a recording."""
+        self._finish()
+
+    def _finish(self):
+        if self.start is not None and self.keep:
+            self.fixations.append((self.start, self.end, self.sum_x / self.n, self.sum_y / self.n))
+        self.start = None
+
+
+class DispersionFixationDetector:
+    def __init__(self, threshold=120.0, min_duration=0.1, keep=True):
+        """
+        threshold: dispersion in pixels. The window holds the whole fixation, so its spread
+        grows with the filtered gaze noise the longer it lasts; at 80 px long fixations split.
+        min_duration: seconds a run must last to count as a fixation.
+        """
+        self.threshold = threshold
+        self.min_duration = min_duration
+        self.keep = keep
+        self.fixations = []
+        self.index = 0
+        self.reset()
+
+    def reset(self):
+        self.window = deque()  # (t, x, y) of the current run
+        self.max_x, self.min_x, self.max_y, self.min_y = deque(), deque(), deque(), deque()
+        self.sum_x = self.sum_y = 0.0
+        self.start = None  # start of the current fixation, None while the run is shorter than min_duration
+
+    def _dispersion(self):
+        return (self.max_x[0] - self.min_x[0]) + (self.max_y[0] - self.min_y[0])
+
+    def _push(self, t, x, y):
+        self.window.append((t, x, y))
+        self.sum_x += x
+        self.sum_y += y
+        for extremes, value, keep_larger in ((self.max_x, x, True), (self.min_x, x, False),
+                                             (self.max_y, y, True), (self.min_y, y, False)):
+            while extremes and (extremes[-1] <= value if keep_larger else extremes[-1] >= value):
+                extremes.pop()
+            extremes.append(value)
+
+    def _pop(self):
+        t, x, y = self.window.popleft()
+        self.sum_x -= x
+        self.sum_y -= y
+        for extremes, value in ((self.max_x, x), (self.min_x, x), (self.max_y, y), (self.min_y, y)):
+            if extremes[0] == value:
+                extremes.popleft()
+
+    def update(self, t, x, y):
+        """Feeds one sample, returns the centre of the fixation it belongs to or None."""
+        self._push(t, x, y)
+        if self._dispersion() > self.threshold:
+            if self.start is not None:
+                # the fixation ended with the previous sample, the new one starts the next run
+                self._pop_last()
+                self._finish()
+                self.reset()
+                self._push(t, x, y)
+                return None
+            while len(self.window) > 1 and self._dispersion() > self.threshold:
+                self._pop()
+
+        if self.start is None and t - self.window[0][0] >= self.min_duration:
+            self.start = self.window[0][0]
+            self.index += 1
+        return self.centre()
+
+    def _pop_last(self):
+        # only used right before reset(), so the deques of extremes need not be kept exact
+        t, x, y = self.window.pop()
+        self.sum_x -= x
+        self.sum_y -= y
+
+    def centre(self):
+        if self.start is None:
+            return None
+        n = len(self.window)
+        return self.sum_x / n, self.sum_y / n
+
+    def flush(self):
+        """Ends the current fixation, e.g. at the end of a recording."""
+        if self.start is not None:
+            self._finish()
+        self.reset()
+
+    def _finish(self):
+        if self.keep:
+            n = len(self.window)
+            self.fixations.append((self.start, self.window[-1][0], self.sum_x / n, self.sum_y / n))
+        self.start = None
+
+
+def fixation_detector(mode, keep=True):
+    """
+    A new detector for mode "velocity" (I-VT) or "dispersion" (I-DT), None for "none" (raw
+    samples). keep=False does not collect the finished fixations, for a live session.
+    """
+    detectors = {"none": None, "velocity": VelocityFixationDetector, "dispersion": DispersionFixationDetector}
+    return detectors[mode](keep=keep) if detectors[mode] is not None else None
+
+
+class DwellEngine:
+    """
+    Enter / dwell / leave / idle events per target, from one gaze sample at a time.
+
+    update() returns the events the sample caused as (kind, target, Pupil time) tuples; an
+    "enter" carries the time the gaze landed on the target (the fixation start with a
+    detector), the others the time of the sample that caused them. `targets` limits the
+    events to those layout keys, all targets by default.
+    """
+    def __init__(self, layout, dwell_time=0.2, leave_time=0.2, detector=None, targets=None):
+        self.layout = layout
+        self.dwell_time = dwell_time
+        self.leave_time = leave_time
+        self.detector = detector
+        self.targets = None if targets is None else frozenset(targets)
+        self.reset()
+
+    def reset(self):
+        self.active = {}  # target -> [entered at, last on, dwelled]
+        self.current = None  # target under the latest sample
+        self.last_on_target = None  # time of the latest sample on any target
+        self.idle = True
+        self._fixation_index = None
+        if self.detector is not None:
+            self.detector.reset()
+
+    def update(self, t, x, y):
+        events = []
+        entered = t
+        if self.detector is None:
+            target = self.layout.lookup(x, y)
+        else:
+            centre = self.detector.update(t, x, y)
+            target = None if centre is None else self.layout.lookup(*centre)
+            # the first target of a fixation was looked at since the fixation started
+            if centre is not None and self.detector.index != self._fixation_index:
+                self._fixation_index = self.detector.index
+                entered = self.detector.start
+        if target is not None and self.targets is not None and target not in self.targets:
+            target = None
+        self.current = target
+
+        if target is not None:
+            self.last_on_target = t
+            self.idle = False
+            state = self.active.get(target)
+            if state is None:
+                state = self.active[target] = [entered, t, False]
+                events.append(("enter", target, entered))
+            state[1] = t
+            if not state[2] and t - state[0] >= self.dwell_time:
+                state[2] = True
+                events.append(("dwell", target, t))
+
+        return events + self._expire(t, target)
+
+    def tick(self, t):
+        """
+        Runs the leave and idle timeouts up to time `t` without a gaze sample, e.g. for a
+        logic step in which none arrived. Missing samples (blinks, lost tracking) are not
+        looking away: the target looked at last stays entered, even if the samples right
+        before the gap were between fixations, and the others leave as usual. The fixation
+        detector is not touched.
+        """
+        last = next((k for k, state in self.active.items() if state[1] == self.last_on_target), None)
+        return self._expire(t, last)
+
+    def _expire(self, t, target):
+        """Leaves every target other than `target` not looked at for leave_time, and goes idle."""
+        events = []
+        if len(self.active) > (target is not None):
+            for other in [k for k, state in self.active.items() if k != target and t - state[1] >= self.leave_time]:
+                del self.active[other]
+                events.append(("leave", other, t))
+        if not self.idle and target is None and t - self.last_on_target >= self.leave_time:
+            self.idle = True
+            events.append(("idle", None, t))
+        return events
+
+
+def compare_fixations(detected, reference, max_gap=0.1):
+    """
+    Matches reference fixations (start, end, x, y), e.g. Pupil's, to detected ones by time
+    overlap. Returns a dict with recall (share of reference fixations overlapped by a
+    detected one), precision (the other way round), the mean absolute onset difference in
+    seconds and the mean centre distance of the matched pairs, in the units of x and y.
+    Fixations count as overlapping when their intervals are less than `max_gap` apart.
+    """
+    detected = np.asarray(detected, dtype=np.float64).reshape(-1, 4)
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1, 4)
+    result = {"detected": len(detected), "reference": len(reference), "recall": float("nan"),
+              "precision": float("nan"), "onset_diff": float("nan"), "centre_distance": float("nan")}
+    if not len(detected) or not len(reference):
+        return result
+
+    detected = detected[np.argsort(detected[:, 0])]
+    # candidates for every reference fixation: detected ones starting before it ends (+ gap)
+    last = np.searchsorted(detected[:, 0], reference[:, 1] + max_gap, side="right")
+    matched_detected = np.zeros(len(detected), dtype=bool)
+    onsets, distances = [], []
+    for (start, end, x, y), stop in zip(reference, last):
+        best, best_overlap = None, -np.inf
+        # detected fixations do not overlap each other, so their ends are sorted as well
+        for i in range(stop - 1, -1, -1):
+            d_start, d_end = detected[i, 0], detected[i, 1]
+            if d_end < start - max_gap:
+                break
+            overlap = min(end, d_end) - max(start, d_start)
+            if overlap > best_overlap:
+                best, best_overlap = i, overlap
+        if best is not None:
+            matched_detected[best] = True
+            onsets.append(abs(detected[best, 0] - start))
+            distances.append(np.hypot(detected[best, 2] - x, detected[best, 3] - y))
+
+    result["recall"] = len(onsets) / len(reference)
+    result["precision"] = float(matched_detected.mean())
+    if onsets:
+        result["onset_diff"] = float(np.mean(onsets))
+        result["centre_distance"] = float(np.mean(distances))
+    return result
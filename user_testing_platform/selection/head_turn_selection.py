@@ -1,63 +1,139 @@
+import math
 import time
 import numpy as np
 
 class Head_Turn_Selector:
-    def __init__(self, angle_threshold=30, duration=0.3, min_angle=5):
-        self.prev_pos = None
-        self.prev_vector = None
-        self.start_time = None
+    """
+    Detects a head turn from the pupil position: while the head turns the eyes counter-rotate
+    to keep the gaze on the target, so the pupil drifts steadily in one direction.
+
+    The pupil samples of the last `duration` seconds (at most `window` of them) are kept in a
+    preallocated ring, together with running sums that are updated in O(1) per sample:
+    - the unit vectors of the steps between consecutive samples. The length of their mean is
+      1 when every step points the same way and close to 0 for jitter, so it tests the
+      direction over the whole window instead of the angle between the last two steps, and
+      a single noisy or dropped sample no longer restarts the detection.
+    - time and position sums for a least-squares fit of the drift velocity.
+    A turn is confirmed while the window spans `duration` seconds, the mean step direction is
+    within `angle_threshold` degrees (mean length at least its cosine) and the fitted speed is
+    at least `min_speed` (normalized pupil position per second).
+    """
+    def __init__(self, angle_threshold=30, duration=0.3, window=256, min_speed=0.05):
         self.duration = duration
         self.angle_threshold = angle_threshold  # degrees
+        self.min_consistency = math.cos(math.radians(angle_threshold))
+        self.min_speed = min_speed
+        self.window = window
+        # (t relative to t0, x, y, unit step vector from the previous sample) per sample
+        self.ring = [None] * window
+        self.reset()
+
+    def reset(self):
+        """Empties the window and its running sums, e.g. between trials, so no fit spans the pause."""
+        self.confirmed_at = None  # timestamp of the sample that last returned a candidate
+        self.head = 0  # index of the oldest sample
+        self.count = 0
+        self.evictions = 0
+        self.t0 = None
+        self.prev_pos = None
+        self.sum_t = self.sum_tt = self.sum_x = self.sum_tx = self.sum_y = self.sum_ty = 0.0
+        self.sum_ux = self.sum_uy = 0.0
         self.smooth_tracking = False
-        self.min_angle = min_angle  # degrees
-
-    def _angle_between(self, v1, v2):
-        """Returns angle in degrees between two vectors."""
-        unit_v1 = v1 / np.linalg.norm(v1)
-        unit_v2 = v2 / np.linalg.norm(v2)
-        dot = np.clip(np.dot(unit_v1, unit_v2), -1.0, 1.0)
-        return np.degrees(np.arccos(dot))
-
-    def update(self, center_pos, candidate_cell):
-        new_pos = np.array(center_pos, dtype=np.float32)
-        current_time = time.time()
-
-        if self.prev_pos is None:
-            self.prev_pos = new_pos
-            return None
-
-        movement_vector = new_pos - self.prev_pos
-        
-        if np.linalg.norm(movement_vector) < 1e-6:
-            # Eye barely moved
-            self.prev_vector = None
-            self.start_time = None
-            self.smooth_tracking = False
-            return None
-
-        if self.prev_vector is not None:
-            angle = self._angle_between(movement_vector, self.prev_vector)
-            #print(f"Angle between vectors: {angle:.2f} degrees")
-            if angle < self.angle_threshold:
-                if self.start_time is None:
-                    self.start_time = current_time
-                    #print(f"Started directional tracking: angle {angle:.2f}")
-                elif current_time - self.start_time >= self.duration:
-                    if not self.smooth_tracking:
-                        print(f"Smooth movement confirmed (angle {angle:.2f})")
-                    self.smooth_tracking = True
-            else:
-                print(f"Direction changed too much: angle {angle:.2f}")
-                self.start_time = None
-                self.smooth_tracking = False
-        else:
-            self.start_time = current_time
-
-        self.prev_pos = new_pos
-        self.prev_vector = movement_vector
-
-        # If smooth movement confirmed, return the candidate
-        if self.smooth_tracking:
+        self.velocity = (0.0, 0.0)
+        self.consistency = 0.0
+
+    # === window ===
+    def _add(self, t, x, y, ux, uy):
+        self.ring[(self.head + self.count) % self.window] = (t, x, y, ux, uy)
+        self.count += 1
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_x += x
+        self.sum_tx += t * x
+        self.sum_y += y
+        self.sum_ty += t * y
+        self.sum_ux += ux
+        self.sum_uy += uy
+
+    def _evict(self):
+        t, x, y, ux, uy = self.ring[self.head]
+        self.head = (self.head + 1) % self.window
+        self.count -= 1
+        self.sum_t -= t
+        self.sum_tt -= t * t
+        self.sum_x -= x
+        self.sum_tx -= t * x
+        self.sum_y -= y
+        self.sum_ty -= t * y
+        self.sum_ux -= ux
+        self.sum_uy -= uy
+        self.evictions += 1
+        if self.evictions >= self.window:
+            self._rebase()
+
+    def _rebase(self):
+        """Recomputes the sums relative to the oldest sample, so rounding errors of the running updates do not pile up."""
+        rows = [self.ring[(self.head + i) % self.window] for i in range(self.count)]
+        shift = rows[0][0]
+        self.t0 += shift
+        self.head = self.count = self.evictions = 0
+        self.sum_t = self.sum_tt = self.sum_x = self.sum_tx = self.sum_y = self.sum_ty = 0.0
+        self.sum_ux = self.sum_uy = 0.0
+        for t, x, y, ux, uy in rows:
+            self._add(t - shift, x, y, ux, uy)
+
+    def _oldest_time(self, offset=0):
+        return self.ring[(self.head + offset) % self.window][0]
+
+    # === detection ===
+    def update(self, center_pos, candidate_cell, now=None):
+        """Feeds one pupil position at Pupil time `now`, returns candidate_cell while a head turn is detected."""
+        x, y = float(center_pos[0]), float(center_pos[1])
+        if now is None:
+            now = time.time()
+        if self.t0 is None:
+            self.t0 = now
+
+        ux = uy = 0.0
+        if self.prev_pos is not None:
+            dx, dy = x - self.prev_pos[0], y - self.prev_pos[1]
+            length = math.hypot(dx, dy)
+            if length > 1e-9:
+                ux, uy = dx / length, dy / length
+        self.prev_pos = (x, y)
+        if self.count == self.window:
+            self._evict()
+        self._add(now - self.t0, x, y, ux, uy)
+
+        # keep exactly one sample at or before the start of the window (evicting may rebase t0)
+        while self.count > 2 and self._oldest_time(1) <= now - self.t0 - self.duration:
+            self._evict()
+
+        self.smooth_tracking = self._detect(now - self.t0)
+        if self.smooth_tracking and candidate_cell is not None:
+            self.confirmed_at = now
             return candidate_cell
+        return None
+
+    def _detect(self, t):
+        n = self.count
+        if n < 3 or t - self._oldest_time() < self.duration:
+            self.consistency = 0.0
+            return False
+        self.consistency = math.hypot(self.sum_ux, self.sum_uy) / n
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return False
+        self.velocity = ((n * self.sum_tx - self.sum_t * self.sum_x) / denominator,
+                         (n * self.sum_ty - self.sum_t * self.sum_y) / denominator)
+        return self.consistency >= self.min_consistency and math.hypot(*self.velocity) >= self.min_speed
 
-        return None
\ No newline at end of file
+    def update_batch(self, positions, candidate_cell, timestamps=None):
+        """Feeds every pupil position since the last call, returns the first confirmation."""
+        positions = np.asarray(positions, dtype=np.float64)[:, :2].tolist()
+        timestamps = [None] * len(positions) if timestamps is None else np.asarray(timestamps, dtype=np.float64).tolist()
+        for pos, timestamp in zip(positions, timestamps):
+            action = self.update(pos, candidate_cell, timestamp)
+            if action is not None:
+                return action
+        return None
@@ -1,80 +1,135 @@
 import time
 import pygame
 
+from selection.zones import ZoneEngine
+
+
 class HotCornerSelector:
-    def __init__(self, width, height, radius=150, trigger_radius=200, trigger_delay=0.2, timeout=1.5):
+    """
+    Activation discs ("corners") on screen, hit-tested and timed by a selection.zones.ZoneEngine.
+
+    `corners` maps a name to a dict with "pos", "label", "color" and "action", and optionally
+    "trigger_radius", "dwell" and "timeout" to override the defaults per corner. A "select"
+    corner confirms the candidate cell on entry and is only live while a candidate exists
+    (and at most `timeout` seconds after it was last seen); a "cancel" corner, or one with
+    any other action, fires after the gaze stayed `trigger_delay` seconds in it.
+    """
+    def __init__(self, width, height, radius=150, trigger_radius=200, trigger_delay=0.3, timeout=1.5, corners=None):
         self.WIDTH = width
         self.HEIGHT = height
         self.radius = radius
         self.trigger_radius = trigger_radius
         self.trigger_delay = trigger_delay
         self.timeout = timeout
-        self.last_gaze_time = 0
-        self.trigger_delay = 0.3
 
-        self.hot_corners = {
-
-            "top_right": {
-                "pos": (self.WIDTH * 0.75, self.HEIGHT * 0.2),
-                "label": "Select",
-                "color": (255, 255, 0),
-                "action": "select"
+        if corners is None:
+            corners = {
+                "top_right": {
+                    "pos": (self.WIDTH * 0.75, self.HEIGHT * 0.2),
+                    "label": "Select",
+                    "color": (255, 255, 0),
+                    "action": "select"
+                }
             }
-        }
+        self.hot_corners = corners
+
+        self.zones = ZoneEngine(width, height, bucket_size=trigger_radius)
+        for name, corner in self.hot_corners.items():
+            select = corner["action"] == "select"
+            self.zones.add_zone(name, corner["pos"], corner.get("trigger_radius", trigger_radius), corner["action"],
+                                dwell=corner.get("dwell", 0.0 if select else trigger_delay),
+                                timeout=corner.get("timeout", timeout if select else None))
+        self.select_names = [name for name, corner in self.hot_corners.items() if corner["action"] == "select"]
 
         self.last_candidate_time = None
         self.last_candidate_cell = None
 
+    def add_zones(self, label_map):
+        """Adds the trigger disc of every corner to a layout.LabelMap, so targets under a corner are not hit."""
+        with label_map.changes():
+            for name, corner in self.hot_corners.items():
+                label_map.add_circle(name, corner["pos"], corner.get("trigger_radius", self.trigger_radius))
+
+    def corners_at(self, gaze_pos):
+        """Names of the corners whose trigger radius contains the gaze."""
+        return self.zones.zones_at(gaze_pos[0], gaze_pos[1])
+
     def draw(self, screen, font, gaze_pos=None):
-        for corner in self.hot_corners.values():
-            x, y = corner["pos"]
+        # Ring if gaze near
+        if gaze_pos:
+            self.draw_gaze_ring(screen, self.gaze_near(gaze_pos))
+        self.draw_static(screen, font)
 
-            # Ring if gaze near
-            if gaze_pos:
-                dx, dy = gaze_pos[0] - x, gaze_pos[1] - y
-                if (dx**2 + dy**2)**0.5 < self.trigger_radius:
-                    pygame.draw.circle(screen, (0, 255, 255), (int(x), int(y)), self.trigger_radius, 3)
+    def gaze_near(self, gaze_pos):
+        """Names of the corners whose trigger ring is drawn around the gaze."""
+        return self.corners_at(gaze_pos)
+
+    def draw_gaze_ring(self, screen, corner_names):
+        """Draws the trigger ring around the given corners, returns the touched rects."""
+        rects = []
+        for name in corner_names:
+            corner = self.hot_corners[name]
+            x, y = corner["pos"]
+            radius = corner.get("trigger_radius", self.trigger_radius)
+            rects.append(pygame.draw.circle(screen, (0, 255, 255), (int(x), int(y)), radius, 3))
+        return rects
 
+    def draw_static(self, screen, font):
+        """Draws the corner discs and their labels."""
+        for corner in self.hot_corners.values():
+            x, y = corner["pos"]
             pygame.draw.circle(screen, corner["color"], (int(x), int(y)), self.radius)
             label_surface = font.render(corner["label"], True, (0, 0, 0))
             rect = label_surface.get_rect(center=(int(x), int(y)))
             screen.blit(label_surface, rect)
-    
-    
-    def process_selection(self, gaze_pos, current_cell, candidate_cell, confirmed_cell):
+
+
+    def process_selection(self, gaze_pos, current_cell, candidate_cell, confirmed_cell, now=None):
         """
-        Handles selection and cancellation logic internally.
-        Returns updated confirmed_cell and action (e.g., "cancel" or None).
+        Feeds one gaze sample. Returns the updated confirmed_cell and the action that fired:
+        "selected", "cancel", the action of another corner, or None.
+        `now` defaults to time.time(), pass sample timestamps to run on another clock.
         """
-        now = time.time()
+        if now is None:
+            now = time.time()
+        self._arm(candidate_cell, confirmed_cell, now)
+        return self._result(self.zones.update(now, gaze_pos[0], gaze_pos[1]), candidate_cell, confirmed_cell)
 
-        # Handle selection
+    def process_batch(self, timestamps, positions, candidate_cell, confirmed_cell=None):
+        """
+        Feeds a batch of gaze samples with the same candidate, hit-tested in one go.
+        Returns (confirmed_cell, action, timestamp) of the first corner that fired, or None.
+        """
+        if not len(timestamps):
+            return None
+        self._arm(candidate_cell, confirmed_cell, float(timestamps[0]))
+        for zone, t in self.zones.update_batch(timestamps, positions):
+            confirmed, action = self._result(zone, candidate_cell, confirmed_cell)
+            if action is not None:
+                return confirmed, action, t
+        return None
+
+    def _arm(self, candidate_cell, confirmed_cell, now):
+        # select corners are live while there is a candidate to select
         if candidate_cell and confirmed_cell is None:
-            if candidate_cell: #!= self.last_candidate_cell: her er det jeg ændrede
-                self.last_candidate_cell = candidate_cell
-                self.last_candidate_time = now
-
-            if self.last_candidate_time and (now - self.last_candidate_time <= self.timeout):
-                for corner in self.hot_corners.values():
-                    cx, cy = corner["pos"]
-                    dx = gaze_pos[0] - cx
-                    dy = gaze_pos[1] - cy
-                    dist = (dx**2 + dy**2)**0.5
-                    if dist < self.trigger_radius and corner["action"] == "select":
-                        self.last_candidate_cell = None
-                        self.last_candidate_time = None
-                        return candidate_cell, "selected"
-        
-        # Handle cancel
-        if now - self.last_gaze_time >= self.trigger_delay:
-            self.last_gaze_time = now
-            for corner in self.hot_corners.values():
-                if corner["action"] == "cancel":
-                    cx, cy = corner["pos"]
-                    dx = gaze_pos[0] - cx
-                    dy = gaze_pos[1] - cy
-                    dist = (dx**2 + dy**2)**0.5
-                    if dist < self.trigger_radius:
-                        return None, "cancel"
-
-        return confirmed_cell, None
+            self.last_candidate_cell = candidate_cell
+            self.last_candidate_time = now
+            self.zones.arm(self.select_names, now)
+        else:
+            self.zones.disarm(self.select_names)
+
+    def _result(self, zone, candidate_cell, confirmed_cell):
+        if zone is None:
+            return confirmed_cell, None
+        if zone.action == "select":
+            self.last_candidate_cell = None
+            self.last_candidate_time = None
+            return candidate_cell, "selected"
+        if zone.action == "cancel":
+            return None, "cancel"
+        return confirmed_cell, zone.action
+
+    def reset(self):
+        self.zones.reset()
+        self.last_candidate_cell = None
+        self.last_candidate_time = None
@@ -0,0 +1,193 @@
+"""
+Activation zones: discs on screen that fire an action when the gaze rests in them.
+
+ZoneEngine keeps the zones in a grid of square buckets. Every zone is listed in the
+buckets its disc overlaps, so a gaze point is only tested against the few zones of its
+own bucket, with squared distances, however many zones there are. hits() tests a whole
+batch of points at once, vectorized over the (point, zone) pairs their buckets give.
+
+Each zone has its own state:
+- dwell: seconds the gaze has to stay inside before the zone fires, 0 fires on entry.
+  A zone fires once per visit; the gaze has to leave and come back to fire it again.
+- timeout: None for zones that are always live, otherwise arm() makes the zone live for
+  `timeout` seconds (e.g. a select zone only while there is a fresh candidate).
+If zones overlap, the one added last wins, as in layout.LabelMap.
+"""
+import math
+
+import numpy as np
+
+NO_ZONE = -1
+
+
+class Zone:
+    def __init__(self, name, center, radius, action, dwell=0.0, timeout=None):
+        self.name = name
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = float(radius)
+        self.action = action
+        self.dwell = dwell
+        self.timeout = timeout
+        self.armed_at = None  # start of the live period of a zone with a timeout
+
+    def live(self, t):
+        if self.timeout is None:
+            return True
+        return self.armed_at is not None and 0 <= t - self.armed_at <= self.timeout
+
+
+class ZoneEngine:
+    def __init__(self, width, height, bucket_size=128):
+        """bucket_size: side of a bucket in pixels, about the zone radius is a good choice."""
+        self.width = width
+        self.height = height
+        self.bucket_size = bucket_size
+        self.cols = max(1, math.ceil(width / bucket_size))
+        self.rows = max(1, math.ceil(height / bucket_size))
+        self.zones = []  # in insertion order, the index is the zone id
+        self.ids = {}    # name -> index
+        self._rebuild()
+        self.reset()
+
+    def reset(self):
+        """Forgets the current visit and disarms every zone."""
+        self.current = NO_ZONE  # zone under the latest sample
+        self.entered_at = None
+        self.fired = False
+        for zone in self.zones:
+            zone.armed_at = None
+
+    # === zones ===
+    def add_zone(self, name, center, radius, action, dwell=0.0, timeout=None):
+        """Adds (or replaces) the zone `name`, returns it."""
+        zone = Zone(name, center, radius, action, dwell, timeout)
+        if name in self.ids:
+            self.zones[self.ids[name]] = zone
+        else:
+            self.ids[name] = len(self.zones)
+            self.zones.append(zone)
+        self._rebuild()
+        return zone
+
+    def remove_zone(self, name):
+        index = self.ids.pop(name, None)
+        if index is None:
+            return
+        del self.zones[index]
+        self.ids = {zone.name: i for i, zone in enumerate(self.zones)}
+        self.current = NO_ZONE
+        self._rebuild()
+
+    def _rebuild(self):
+        """Lists every zone in the buckets its bounding box overlaps, as flat CSR arrays."""
+        self.cx = np.array([z.center[0] for z in self.zones], dtype=np.float64)
+        self.cy = np.array([z.center[1] for z in self.zones], dtype=np.float64)
+        self.r2 = np.array([z.radius * z.radius for z in self.zones], dtype=np.float64)
+
+        buckets = [[] for _ in range(self.rows * self.cols)]
+        s = self.bucket_size
+        for index, zone in enumerate(self.zones):
+            (x, y), r = zone.center, zone.radius
+            c0, c1 = max(0, int((x - r) // s)), min(self.cols - 1, int((x + r) // s))
+            r0, r1 = max(0, int((y - r) // s)), min(self.rows - 1, int((y + r) // s))
+            for row in range(r0, r1 + 1):
+                for col in range(c0, c1 + 1):
+                    buckets[row * self.cols + col].append(index)
+        # zones in a bucket in descending order, so the first hit is the one added last
+        buckets = [sorted(b, reverse=True) for b in buckets]
+        self.bucket_start = np.zeros(len(buckets) + 1, dtype=np.intp)
+        self.bucket_start[1:] = np.cumsum([len(b) for b in buckets])
+        self.bucket_zones = np.array([i for b in buckets for i in b], dtype=np.intp)
+        # the same as plain tuples for single points, where NumPy scalars would only be slower
+        self.bucket_lists = [[(i, self.zones[i].center[0], self.zones[i].center[1], self.zones[i].radius ** 2) for i in b]
+                             for b in buckets]
+
+    # === hit testing ===
+    def _bucket(self, x, y):
+        col, row = int(x // self.bucket_size), int(y // self.bucket_size)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return None
+
+    def hit(self, x, y):
+        """Index of the zone containing (x, y), NO_ZONE if none."""
+        bucket = self._bucket(x, y)
+        if bucket is None:
+            return NO_ZONE
+        for index, cx, cy, r2 in self.bucket_lists[bucket]:
+            dx, dy = x - cx, y - cy
+            if dx * dx + dy * dy < r2:
+                return index
+        return NO_ZONE
+
+    def hits(self, points):
+        """Zone index per point of an (N, 2) array, NO_ZONE where there is none."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(points), NO_ZONE, dtype=np.intp)
+        if not len(points) or not self.zones:
+            return result
+        cols = np.floor(points[:, 0] / self.bucket_size).astype(np.intp)
+        rows = np.floor(points[:, 1] / self.bucket_size).astype(np.intp)
+        inside = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+        point_ids = np.flatnonzero(inside)
+        buckets = rows[inside] * self.cols + cols[inside]
+        starts = self.bucket_start[buckets]
+        counts = self.bucket_start[buckets + 1] - starts
+        if not counts.sum():
+            return result
+
+        # one row per (point, zone listed in its bucket)
+        pair_point = np.repeat(point_ids, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_zone = self.bucket_zones[np.repeat(starts, counts) + offsets]
+        dx = points[pair_point, 0] - self.cx[pair_zone]
+        dy = points[pair_point, 1] - self.cy[pair_zone]
+        hit = dx * dx + dy * dy < self.r2[pair_zone]
+        np.maximum.at(result, pair_point[hit], pair_zone[hit])
+        return result
+
+    def zones_at(self, x, y):
+        """Names of every zone containing (x, y), last added first."""
+        bucket = self._bucket(x, y)
+        if bucket is None:
+            return ()
+        return tuple(self.zones[i].name for i, cx, cy, r2 in self.bucket_lists[bucket]
+                     if (x - cx) ** 2 + (y - cy) ** 2 < r2)
+
+    # === activation ===
+    def arm(self, names, now):
+        """Makes the zones with a timeout live from `now` for their timeout."""
+        for name in names:
+            self.zones[self.ids[name]].armed_at = now
+
+    def disarm(self, names):
+        for name in names:
+            self.zones[self.ids[name]].armed_at = None
+
+    def _visit(self, index, t):
+        """Advances the visit state by one sample in zone `index`, returns the zone if it fires."""
+        if index != self.current:
+            self.current = index
+            self.entered_at = t
+            self.fired = False
+        if index == NO_ZONE or self.fired:
+            return None
+        zone = self.zones[index]
+        if t - self.entered_at >= zone.dwell and zone.live(t):
+            self.fired = True
+            return zone
+        return None
+
+    def update(self, t, x, y):
+        """Feeds one gaze sample, returns the zone that fired or None."""
+        return self._visit(self.hit(x, y), t)
+
+    def update_batch(self, timestamps, points):
+        """Feeds a batch of gaze samples, returns (zone, time) for every zone that fired, in order."""
+        fired = []
+        visit = self._visit
+        for index, t in zip(self.hits(points).tolist(), np.asarray(timestamps, dtype=np.float64).tolist()):
+            zone = visit(index, t)
+            if zone is not None:
+                fired.append((zone, t))
+        return fired
@@ -0,0 +1,165 @@
+"""
+End-to-end selection benchmark on synthetic data, no glasses or window needed.
+
+    python selection_benchmark.py [--trials 36] [--idle 60] [--fps 60] [--fixation velocity] [--methods blink hotcorner head_turn]
+
+For every method a synthetic participant performs scripted trials on the task grid and
+then looks around for --idle seconds without confirming anything. The samples go through
+the same filter and selection logic as main.py, one simulated frame at a time, and the
+decisions are scored against the script: hits, misses, wrong cells, false activations and
+latency from the start of the confirming gesture.
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+import numpy as np
+
+from config import WIDTH, HEIGHT, LOGIC_RATE
+from filters.one_euro_filter import BatchOneEuroFilter
+from layout import LabelMap, add_task_grid
+from selection.blink_selection import BlinkSelection
+from selection.fixation import DwellEngine, fixation_detector
+from selection.head_turn_selection import Head_Turn_Selector
+from selection.hot_corners import HotCornerSelector
+from selection_logic import SelectionLogic
+from synthetic import SyntheticGazeSource
+
+ROWS, COLS = 5, 10
+CELLS = [(r, c) for r in range(1, ROWS - 1) for c in range(3, COLS - 4)]
+INTER_TRIAL_PAUSE = 1.0
+
+
+def build_script(method, trials, idle, seed):
+    source = SyntheticGazeSource(WIDTH, HEIGHT, ROWS, COLS, seed=seed)
+    rng = random.Random(seed)
+    for _ in range(trials):
+        source.add_trial(rng.choice(CELLS), method)
+    source.add_idle(idle, CELLS)
+    return source
+
+
+def _arrays(stream, width):
+    timestamps = np.array([t for t, _ in stream], dtype=np.float64)
+    values = np.array([v for _, v in stream], dtype=np.float64).reshape(-1, width)
+    return timestamps, values
+
+
+def run_pipeline(method, source, fps, fixation="none"):
+    """Runs main.py's filter and selection logic over the script, returns (decisions, samples, seconds)."""
+    gaze_ts, gaze = _arrays(source.gaze, 3)
+    blink_ts, blinks = _arrays(source.blinks, 2)
+    pupil_ts, pupil = _arrays(source.pupil, 4)
+
+    cell_width, cell_height = WIDTH // COLS, HEIGHT // ROWS
+    one_euro_filter = BatchOneEuroFilter()
+    hotcorner_selector = HotCornerSelector(WIDTH, HEIGHT)
+    layout = LabelMap(WIDTH, HEIGHT)
+    add_task_grid(layout, CELLS, cell_width, cell_height)
+    hotcorner_selector.add_zones(layout)
+    dwell_engine = DwellEngine(layout, detector=fixation_detector(fixation, keep=False), targets=CELLS)
+    logic = SelectionLogic(dwell_engine, hotcorner_selector, BlinkSelection(blink_duration_selection="long"),
+                           Head_Turn_Selector(), rate=LOGIC_RATE)
+    logic.set_method(method)
+
+    decisions = []
+    paused_until = None
+    gi = bi = pi = 0
+
+    frame_times = np.arange(source.start_time, source.t + 0.5, 1.0 / fps)
+    started = time.perf_counter()
+    for now in frame_times:
+        # every sample up to this frame, like draining the ring buffers
+        gj = np.searchsorted(gaze_ts, now, side="right")
+        bj = np.searchsorted(blink_ts, now, side="right")
+        pj = np.searchsorted(pupil_ts, now, side="right")
+        frame_gaze, frame_gaze_ts = gaze[gi:gj], gaze_ts[gi:gj]
+        frame_blinks, frame_blink_ts = blinks[bi:bj], blink_ts[bi:bj]
+        frame_pupil, frame_pupil_ts = pupil[pi:pj], pupil_ts[pi:pj]
+        gi, bi, pi = gj, bj, pj
+
+        smooth = None
+        if len(frame_gaze_ts):
+            raw = np.empty((len(frame_gaze_ts), 2))
+            raw[:, 0] = frame_gaze[:, 0] * WIDTH
+            raw[:, 1] = (1 - frame_gaze[:, 1]) * HEIGHT
+            smooth = one_euro_filter.filter(raw, frame_gaze_ts)
+
+        if paused_until is not None:
+            if now < paused_until:
+                continue
+            paused_until = None
+            logic.reset()
+
+        # the simulated clock is the tracker clock
+        logic.feed(frame_gaze_ts, smooth, frame_pupil_ts, frame_pupil, frame_blink_ts, frame_blinks)
+        logic.advance(now)
+        if logic.confirmed_cell is not None:
+            decisions.append((logic.selection_time, logic.confirmed_cell))
+            paused_until = now + INTER_TRIAL_PAUSE
+
+    elapsed = time.perf_counter() - started
+    return decisions, len(gaze_ts) + len(blink_ts) + len(pupil_ts), elapsed
+
+
+def score(source, decisions, idle):
+    """Matches decisions to trials whose gesture window contains them."""
+    hits, wrong, false_activations = 0, 0, 0
+    latencies = []
+    matched = set()
+    for when, cell in decisions:
+        trial_index = next((i for i, trial in enumerate(source.trials)
+                            if trial["gesture_start"] - 0.1 <= when <= trial["gesture_end"] + INTER_TRIAL_PAUSE), None)
+        if trial_index is None or trial_index in matched:
+            false_activations += 1
+            continue
+        matched.add(trial_index)
+        trial = source.trials[trial_index]
+        if cell == trial["cell"]:
+            hits += 1
+            latencies.append(when - trial["gesture_start"])
+        else:
+            wrong += 1
+
+    trials = len(source.trials)
+    minutes = (source.t - source.start_time) / 60
+    return {
+        "trials": trials,
+        "hits": hits,
+        "wrong_cell": wrong,
+        "misses": trials - len(matched),
+        "false_activations": false_activations,
+        "false_per_min": false_activations / minutes,
+        "latency_mean": float(np.mean(latencies)) if latencies else float("nan"),
+        "latency_p95": float(np.percentile(latencies, 95)) if latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the selection methods on synthetic gaze data")
+    parser.add_argument("--trials", type=int, default=36)
+    parser.add_argument("--idle", type=float, default=60.0, help="seconds of looking around without confirming")
+    parser.add_argument("--fps", type=int, default=60, help="simulated frame rate of the main loop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--methods", nargs="+", default=["blink", "hotcorner", "head_turn"])
+    parser.add_argument("--fixation", choices=["none", "velocity", "dispersion"], default="velocity",
+                        help="fixation detector in front of dwell, as main.py --fixation")
+    args = parser.parse_args()
+
+    for method in args.methods:
+        source = build_script(method, args.trials, args.idle, args.seed)
+        # the selectors print every event, keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            decisions, samples, elapsed = run_pipeline(method, source, args.fps, args.fixation)
+        result = score(source, decisions, args.idle)
+        print(f"[{method}] {result['hits']}/{result['trials']} hits, {result['wrong_cell']} wrong cell, "
+              f"{result['misses']} missed, {result['false_activations']} false activations "
+              f"({result['false_per_min']:.2f}/min)")
+        print(f"[{method}] latency from gesture start: mean {result['latency_mean'] * 1000:.0f} ms, "
+              f"p95 {result['latency_p95'] * 1000:.0f} ms; {samples / elapsed:,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
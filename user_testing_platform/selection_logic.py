@@ -0,0 +1,214 @@
+"""
+Selection logic of a trial, run in fixed steps of tracker time.
+
+SelectionLogic takes the filtered gaze, pupil and blink samples as the main loop drains
+them and advances in steps of 1/rate seconds of Pupil time, independent of the frame
+rate. Each step consumes the samples stamped up to its end: dwell and hot corners decide
+on every gaze sample, blinks and head turns on their own events, all at the samples'
+timestamps. Dwell is a consumer of selection.fixation.DwellEngine events: a "dwell" on a
+cell makes it the candidate, "idle" (no cell looked at for a while) clears it. A step
+without a gaze sample is a time-only tick: no position is made up, the dwell engine only
+runs its leave and idle timeouts up to the step's end (DwellEngine.tick), and the fixation
+detector and hot corners see measured samples only.
+
+Steps run up to the newest sample, or, while none arrive, up to the current Pupil time
+minus MAX_SAMPLE_DELAY. The renderer draws render_gaze(), the gaze position interpolated
+between the last two steps.
+"""
+import numpy as np
+
+# How long samples may be in transit before steps run on without them (seconds)
+MAX_SAMPLE_DELAY = 0.05
+
+
+class SelectionLogic:
+    """
+    candidate_cell, confirmed_cell and selection_time (Pupil time) are the state of the
+    current trial; highlighted_cell and highlight_start the cell shown as candidate and
+    since when. reset() starts the next trial, reset(start) at Pupil time `start`: samples
+    stamped after it that were already fed (e.g. while the result of the last trial was
+    shown) are kept, older ones are dropped, also if they are fed later.
+    """
+    def __init__(self, dwell_engine, hotcorner_selector, blink_selector, head_turn_selector, rate=200, max_steps=50):
+        """
+        rate: logic steps per second of tracker time.
+        max_steps: steps per advance(); further behind the logic skips ahead and the first
+                   step takes everything pending. None never skips, for a replay faster
+                   than real time that should decide as it would in real time.
+        """
+        self.dwell_engine = dwell_engine
+        self.hotcorner_selector = hotcorner_selector
+        self.blink_selector = blink_selector
+        self.head_turn_selector = head_turn_selector
+        self.dt = 1.0 / rate
+        self.max_steps = max_steps
+        self.method = None
+        self.steps = 0
+        self.latest = None  # newest sample timestamp fed
+        self.alpha = 0.0  # how far the last advance() got into the next step
+        self.gaze = self.prev_gaze = None  # gaze position at the end of the last two steps
+        self.reset()
+
+    def set_method(self, method):
+        if method == self.method:
+            return
+        self.method = method
+        self.dwell_engine.dwell_time = self.dwell_engine.leave_time = 0.4 if method == "head_turn" else 0.2
+        # head turns move the eyes, the candidate stays until another cell is dwelled on
+        self.clear_when_idle = method != "head_turn"
+
+    def reset(self, start=None):
+        """
+        Starts a new trial: no candidate, no confirmation, no pending samples up to `start`,
+        and the dwell engine and every selector without state from the last trial.
+        """
+        self.candidate_cell = None
+        self.candidate_since = None
+        self.confirmed_cell = None
+        self.selection_time = None
+        self.highlighted_cell = None
+        self.highlight_start = None
+        self.highlights = []  # (cell, Pupil time) of every new highlight, see take_highlights()
+        self.dwell_engine.reset()
+        self.hotcorner_selector.reset()
+        self.blink_selector.reset_state()
+        self.head_turn_selector.reset()
+        self.start = start  # samples up to here belong to earlier trials
+        self.time = start  # Pupil time at the end of the last step
+        if start is None:
+            self._gaze_ts, self._gaze = np.empty(0), np.empty((0, 2))
+            self._pupil_ts, self._pupil = np.empty(0), np.empty((0, 2))
+            self._blink_ts, self._blinks = np.empty(0), np.empty((0, 2))
+        else:
+            self._gaze_ts, self._gaze = self._after_start(self._gaze_ts, self._gaze)
+            self._pupil_ts, self._pupil = self._after_start(self._pupil_ts, self._pupil)
+            self._blink_ts, self._blinks = self._after_start(self._blink_ts, self._blinks)
+
+    def _after_start(self, timestamps, values):
+        if self.start is None or not len(timestamps):
+            return timestamps, values
+        keep = timestamps > self.start
+        return timestamps[keep], values[keep]
+
+    def feed(self, gaze_ts, gaze, pupil_ts=(), pupil=None, blink_ts=(), blinks=None):
+        """
+        Queues drained samples: gaze positions in screen pixels, pupil positions
+        (pupil[:, :2]) and blink events as in gaze_listener.blink_buffer. Copies them, so
+        reader scratch space can be passed.
+        """
+        if len(gaze_ts):
+            self._saw(gaze_ts[-1])
+            gaze_ts, gaze = self._after_start(gaze_ts, gaze)
+            self._gaze_ts = np.concatenate((self._gaze_ts, gaze_ts))
+            self._gaze = np.concatenate((self._gaze, gaze[:, :2]))
+        if len(pupil_ts):
+            self._saw(pupil_ts[-1])
+            pupil_ts, pupil = self._after_start(pupil_ts, pupil)
+            self._pupil_ts = np.concatenate((self._pupil_ts, pupil_ts))
+            self._pupil = np.concatenate((self._pupil, pupil[:, :2]))
+        if len(blink_ts):
+            self._saw(blink_ts[-1])
+            blink_ts, blinks = self._after_start(blink_ts, blinks)
+            self._blink_ts = np.concatenate((self._blink_ts, blink_ts))
+            self._blinks = np.concatenate((self._blinks, blinks[:, :2]))
+
+    def _saw(self, timestamp):
+        if self.latest is None or timestamp > self.latest:
+            self.latest = float(timestamp)
+
+    def advance(self, now=None):
+        """Runs every whole step up to the newest sample (or `now`, Pupil time, minus MAX_SAMPLE_DELAY), returns the number run."""
+        horizon = self.latest
+        if now is not None and (horizon is None or now - MAX_SAMPLE_DELAY > horizon):
+            horizon = now - MAX_SAMPLE_DELAY
+        if horizon is None:
+            return 0
+        if self.time is None:
+            # the first step ends at the oldest sample queued, however many arrived at once
+            queued = [timestamps[0] for timestamps in (self._gaze_ts, self._pupil_ts, self._blink_ts) if len(timestamps)]
+            self.time = min(queued, default=horizon) - self.dt
+        behind = int((horizon - self.time) / self.dt)
+        if self.max_steps is not None and behind > self.max_steps:
+            self.time += (behind - self.max_steps) * self.dt
+            behind = self.max_steps
+
+        steps = 0
+        gi = pi = bi = 0
+        while steps < behind and self.confirmed_cell is None:
+            self.time += self.dt
+            gi, pi, bi = self._step(self.time, gi, pi, bi)
+            steps += 1
+        self.steps += steps
+        self.alpha = min(1.0, max(0.0, (horizon - self.time) / self.dt))
+
+        self._gaze_ts, self._gaze = self._gaze_ts[gi:], self._gaze[gi:]
+        self._pupil_ts, self._pupil = self._pupil_ts[pi:], self._pupil[pi:]
+        self._blink_ts, self._blinks = self._blink_ts[bi:], self._blinks[bi:]
+        return steps
+
+    def _step(self, end, gi, pi, bi):
+        """One step: every sample stamped up to `end`, returns the new read positions."""
+        gj = gi + int(np.searchsorted(self._gaze_ts[gi:], end, side="right"))
+        pj = pi + int(np.searchsorted(self._pupil_ts[pi:], end, side="right"))
+        bj = bi + int(np.searchsorted(self._blink_ts[bi:], end, side="right"))
+
+        timestamps, positions = self._gaze_ts[gi:gj], self._gaze[gi:gj]
+        self.prev_gaze = self.gaze
+        if not len(timestamps):
+            self._dwell_events(self.dwell_engine.tick(end))
+            self._highlight()
+        for i in range(len(timestamps)):
+            self.gaze = positions[i].copy()
+            x, y = self.gaze
+            self._dwell_events(self.dwell_engine.update(timestamps[i], x, y))
+
+            if self.method == "hotcorner":
+                new_confirmed, action = self.hotcorner_selector.process_selection(
+                    positions[i], self.dwell_engine.current, self.candidate_cell, None, timestamps[i])
+                if action == "selected":
+                    self._confirm(new_confirmed, timestamps[i])
+                    return gj, pj, bj
+            self._highlight()
+
+        if self.method == "blink":
+            self.blink_selector.feed(self._blink_ts[bi:bj], self._blinks[bi:bj])
+            if self.blink_selector.poll_confirmation() and self.candidate_cell is not None:
+                self._confirm(self.candidate_cell, self.blink_selector.confirmed_at)
+
+        elif self.method == "head_turn":
+            action = self.head_turn_selector.update_batch(self._pupil[pi:pj], self.candidate_cell, self._pupil_ts[pi:pj])
+            if action is not None:
+                # the turn may have started before the candidate appeared
+                self._confirm(action, max(self.head_turn_selector.confirmed_at, self.candidate_since))
+        return gj, pj, bj
+
+    def _dwell_events(self, events):
+        for kind, cell, at in events:
+            if kind == "dwell" and cell != self.candidate_cell:
+                self.candidate_cell, self.candidate_since = cell, at
+            elif kind == "idle" and self.clear_when_idle and self.candidate_cell is not None:
+                self.candidate_cell = self.highlighted_cell = None
+
+    def _highlight(self):
+        if self.candidate_cell is not None and (self.candidate_cell != self.highlighted_cell or self.highlight_start is None):
+            self.highlighted_cell = self.candidate_cell
+            self.highlight_start = self.candidate_since
+            self.highlights.append((self.highlighted_cell, self.highlight_start))
+
+    def _confirm(self, cell, at):
+        self.confirmed_cell = cell
+        self.selection_time = float(at)
+        self.candidate_cell = None
+
+    def take_highlights(self):
+        """The (cell, Pupil time) highlights since the last call."""
+        highlights, self.highlights = self.highlights, []
+        return highlights
+
+    def render_gaze(self):
+        """Gaze position to draw: between the last two steps, by how far the logic got into the next one."""
+        if self.gaze is None:
+            return None
+        if self.prev_gaze is None:
+            return tuple(self.gaze)
+        return tuple(self.prev_gaze + (self.gaze - self.prev_gaze) * self.alpha)
@@ -0,0 +1,275 @@
+"""
+Synthetic participant producing gaze, blink and pupil streams without the glasses.
+
+The source is scripted trial by trial: look at a cell of the task grid, dwell on it and
+confirm it with the gesture of a selection method (a long blink, a glance at the hot
+corner disc or a smooth head turn). Gaze gets pixel noise and random low-confidence
+samples, natural short blinks are sprinkled over fixations. Every trial is kept as
+ground truth so a benchmark can score what the selectors decided.
+"""
+import bisect
+import math
+import random
+import threading
+import time
+
+from config import WIDTH, HEIGHT
+from ring_buffer import SampleRingBuffer
+
+
+class SyntheticGazeSource:
+    def __init__(self, width=WIDTH, height=HEIGHT, rows=5, cols=10, rate=120,
+                 noise_px=10.0, confidence=0.95, low_confidence_rate=0.03,
+                 natural_blink_rate=0.25, pupil_noise=0.0002, start_time=1000.0, seed=0):
+        """
+        rate: samples per second for gaze and pupil.
+        noise_px: standard deviation of the gaze noise in pixels.
+        confidence / low_confidence_rate: confidence of normal samples and the share of
+            samples that fall below the listener's threshold and are dropped.
+        natural_blink_rate: involuntary short blinks per second during fixations.
+        start_time: Pupil timestamp of the first sample.
+        """
+        self.width = width
+        self.height = height
+        self.cell_width = width // cols
+        self.cell_height = height // rows
+        self.dt = 1.0 / rate
+        self.noise_px = noise_px
+        self.confidence = confidence
+        self.low_confidence_rate = low_confidence_rate
+        self.natural_blink_rate = natural_blink_rate
+        self.pupil_noise = pupil_noise
+        self.random = random.Random(seed)
+
+        self.t = start_time
+        self.start_time = start_time
+        self.pos = (width / 2, height / 2)
+        self.pupil_pos = (0.5, 0.5)
+
+        # (timestamp, values) per stream, in time order
+        self.gaze = []
+        self.blinks = []
+        self.pupil = []
+        self.trials = []
+        self.fixations = []  # (start, end, x, y) in pixels, what Pupil's fixation detector should find
+
+    # === geometry ===
+    def cell_center(self, cell):
+        row, col = cell
+        return (col + 0.5) * self.cell_width, (row + 0.5) * self.cell_height
+
+    # === sample emission ===
+    def _emit(self, duration, gaze_at, pupil_at, eyes_closed=False):
+        """Emits samples for `duration` seconds; gaze_at/pupil_at map progress 0..1 to a position."""
+        steps = max(1, int(round(duration / self.dt)))
+        for i in range(steps):
+            self.t += self.dt
+            progress = (i + 1) / steps
+            gx, gy = gaze_at(progress)
+            px, py = pupil_at(progress)
+            self.pos = (gx, gy)
+            self.pupil_pos = (px, py)
+
+            self.pupil.append((self.t, (px + self.random.gauss(0, self.pupil_noise),
+                                        py + self.random.gauss(0, self.pupil_noise),
+                                        0.2 if eyes_closed else self.confidence, 3.0)))
+            if eyes_closed or self.random.random() < self.low_confidence_rate:
+                continue  # the listener drops these
+            nx = (gx + self.random.gauss(0, self.noise_px)) / self.width
+            ny = 1 - (gy + self.random.gauss(0, self.noise_px)) / self.height
+            self.gaze.append((self.t, (nx, ny, self.confidence)))
+
+    def _still(self):
+        pos, pupil = self.pos, self.pupil_pos
+        return (lambda _: pos), (lambda _: pupil)
+
+    def _hold(self, start):
+        """Records the gaze held still since `start`; blinks in between do not end a fixation."""
+        if self.fixations and self.fixations[-1][2:] == self.pos:
+            start = self.fixations.pop()[0]
+        self.fixations.append((start, self.t) + self.pos)
+
+    def fixate(self, duration, natural_blinks=True):
+        """Holds the gaze on the current position, with involuntary blinks."""
+        start = self.t
+        end = self.t + duration
+        while self.t < end:
+            gaze_at, pupil_at = self._still()
+            if natural_blinks and self.natural_blink_rate > 0:
+                gap = self.random.expovariate(self.natural_blink_rate)
+                if self.t + gap < end:
+                    self._emit(gap, gaze_at, pupil_at)
+                    self.blink(self.random.uniform(0.08, 0.15))
+                    continue
+            self._emit(end - self.t, gaze_at, pupil_at)
+        self._hold(start)
+
+    def saccade(self, target, duration=0.045):
+        start = self.pos
+        pupil = self.pupil_pos
+        ease = lambda p: 0.5 - 0.5 * math.cos(math.pi * p)
+        self._emit(duration,
+                   lambda p: (start[0] + (target[0] - start[0]) * ease(p), start[1] + (target[1] - start[1]) * ease(p)),
+                   lambda _: pupil)
+
+    def blink(self, duration):
+        self.blinks.append((self.t, (1.0, 0.8)))
+        gaze_at, pupil_at = self._still()
+        self._emit(duration, gaze_at, pupil_at, eyes_closed=True)
+        self.blinks.append((self.t, (0.0, 0.8)))
+
+    def head_turn(self, duration, direction=(1.0, 0.0), distance=0.15):
+        """Smooth pupil drift in one direction while the gaze stays on target (vestibulo-ocular reflex)."""
+        pos = self.pos
+        start = self.pupil_pos
+        started = self.t
+        dx, dy = direction
+        self._emit(duration, lambda _: pos,
+                   lambda p: (start[0] + dx * distance * p, start[1] + dy * distance * p))
+        # drift back slowly so the next turn starts from the centre again
+        back = self.pupil_pos
+        self._emit(0.5, lambda _: pos,
+                   lambda p: (back[0] + (start[0] - back[0]) * p, back[1] + (start[1] - back[1]) * p))
+        self._hold(started)
+
+    # === scripted trials ===
+    def add_trial(self, cell, method, dwell=0.6, rest=1.3, hot_corner=None):
+        """
+        Looks at `cell`, dwells and confirms it with `method`. The ground truth records when
+        the confirming gesture started and ended. `hot_corner` is the disc centre in pixels,
+        by default where HotCornerSelector puts its select disc.
+        """
+        if hot_corner is None:
+            hot_corner = (self.width * 0.75, self.height * 0.2)
+        trial = {"cell": cell, "method": method, "start": self.t}
+        self.saccade(self.cell_center(cell))
+        self.fixate(dwell)
+
+        trial["gesture_start"] = self.t
+        if method == "blink":
+            self.blink(self.random.uniform(0.5, 0.7))
+        elif method == "hotcorner":
+            back = self.pos
+            self.saccade(hot_corner)
+            self.fixate(0.3, natural_blinks=False)
+            self.saccade(back)
+        elif method == "head_turn":
+            self.head_turn(0.6, direction=self.random.choice(((1, 0), (-1, 0), (0, 1), (0, -1))))
+        trial["gesture_end"] = self.t
+
+        self.fixate(rest)
+        self.trials.append(trial)
+        return trial
+
+    def add_idle(self, duration, cells):
+        """Looks around the grid without confirming anything, for false activation rates."""
+        end = self.t + duration
+        while self.t < end:
+            self.saccade(self.cell_center(self.random.choice(cells)))
+            self.fixate(self.random.uniform(0.3, 1.2))
+
+    # === consumers ===
+    def to_buffers(self):
+        """Returns (gaze, blink, pupil) SampleRingBuffers holding the whole script."""
+        buffers = []
+        for stream, fields in ((self.gaze, ("x", "y", "confidence", "received")),
+                               (self.blinks, ("onset", "confidence")),
+                               (self.pupil, ("x", "y", "confidence", "diameter"))):
+            ring = SampleRingBuffer(fields, capacity=max(1, len(stream)))
+            for timestamp, values in stream:
+                if stream is self.gaze:
+                    values = values + (math.nan,)  # never went through a listener
+                ring.append(timestamp, *values)
+            buffers.append(ring)
+        return tuple(buffers)
+
+    def play(self, gaze_buffer, blink_buffer, pupil_buffer, speed=1.0):
+        """
+        Appends the samples to live buffers (e.g. the ones in gaze_listener) at their scripted
+        times from a background thread, so the source can stand in for the listener.
+        """
+        events = sorted([(t, 0, v) for t, v in self.gaze] + [(t, 1, v) for t, v in self.blinks] +
+                        [(t, 2, v) for t, v in self.pupil], key=lambda e: (e[0], e[1]))
+        targets = (gaze_buffer, blink_buffer, pupil_buffer)
+
+        def run():
+            wall_start = time.monotonic()
+            for t, stream, values in events:
+                delay = (t - self.start_time) / speed - (time.monotonic() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+                if stream == 0:
+                    values = values + (time.perf_counter(),)
+                targets[stream].append(t, *values)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def to_recording(self, filename, surface_rate=30, surface_name="monitor_overlay"):
+        """
+        Writes the script as a pupil_replay.py recording. Gaze is bundled into surface
+        messages at `surface_rate` per second, like Pupil's surface tracker does per world
+        frame; every fixation goes into the first surface message after it ended. Blink and
+        pupil messages are sent as they happen.
+        """
+        import msgpack
+
+        frames = []
+        period = 1.0 / surface_rate
+        bundle, bundle_end = [], None
+        for t, (x, y, confidence) in self.gaze:
+            if bundle_end is not None and t > bundle_end:
+                frames.append((bundle_end, "surface", {"name": surface_name, "timestamp": bundle_end,
+                                                       "gaze_on_surfaces": bundle, "fixations_on_surfaces": []}))
+                bundle = []
+            if not bundle:
+                bundle_end = t + period
+            bundle.append({"norm_pos": (x, y), "timestamp": t, "confidence": confidence, "on_surf": True})
+        if bundle:
+            frames.append((bundle_end, "surface", {"name": surface_name, "timestamp": bundle_end,
+                                                   "gaze_on_surfaces": bundle, "fixations_on_surfaces": []}))
+        frame_ends = [t for t, _, _ in frames]
+        for index, (start, end, x, y) in enumerate(self.fixations):
+            i = bisect.bisect_left(frame_ends, end)
+            if i < len(frames):
+                frames[i][2]["fixations_on_surfaces"].append({
+                    "id": index, "norm_pos": (x / self.width, 1 - y / self.height), "timestamp": start,
+                    "duration": (end - start) * 1000, "confidence": self.confidence, "on_surf": True})
+        for t, (onset, confidence) in self.blinks:
+            frames.append((t, "blinks", {"type": "onset" if onset else "offset", "timestamp": t, "confidence": confidence}))
+        for t, (x, y, confidence, diameter) in self.pupil:
+            frames.append((t, "pupil.0.2d", {"norm_pos": (x, y), "timestamp": t, "confidence": confidence, "diameter": diameter}))
+
+        frames.sort(key=lambda frame: frame[0])
+        packer = msgpack.Packer()
+        with open(filename, "wb") as f:
+            for t, topic, payload in frames:
+                f.write(packer.pack([t - self.start_time, topic, msgpack.dumps(payload)]))
+        return len(frames)
+
+    # Same return format as gaze_listener.get_latest_*, at scripted time `timestamp`
+    def _latest(self, stream, timestamp):
+        i = bisect.bisect_right(stream, (timestamp, (math.inf,)))
+        return stream[i - 1] if i else None
+
+    def get_latest_gaze(self, timestamp):
+        latest = self._latest(self.gaze, timestamp)
+        if latest is None:
+            return None
+        t, (x, y, _) = latest
+        return (x, y), t
+
+    def get_latest_blink(self, timestamp):
+        latest = self._latest(self.blinks, timestamp)
+        if latest is None:
+            return None
+        t, (onset, confidence) = latest
+        return {"type": "onset" if onset else "offset", "timestamp": t, "confidence": confidence}
+
+    def get_latest_pupil(self, timestamp):
+        latest = self._latest(self.pupil, timestamp)
+        if latest is None:
+            return None
+        t, (x, y, confidence, diameter) = latest
+        return {"norm_pos": (x, y), "timestamp": t, "confidence": confidence, "diameter": diameter}
@@ -1,37 +1,49 @@
 import pygame
 import random
-import os
+from collections import deque
+
+from asset_cache import AssetCache, asset_path
 
 class TaskManager:
 
-    def __init__(self, width, height, rows=5, cols=10):
+    @staticmethod
+    def asset_requests(width, height, rows=5, cols=10):
+        """(path, size) of every image the task manager loads, so they can be prefetched."""
+        size = (width // cols, height // rows)
+        return [(asset_path("better_waves", f"Crop-Ocean-{i}.png"), size) for i in range(0, 9)]
+
+    def __init__(self, width, height, rows=5, cols=10, assets=None):
         self.width = width
         self.height = height
         self.rows = rows
         self.cols = cols
         self.cell_width = width // cols
         self.cell_height = height // rows
-        self.targets = [
+        # cells of the task grid, the same area for both game modes
+        self.grid_cells = [
             (r, c) for r in range(1, rows - 1) for c in range(3, cols - 4)
         ]
+        self.targets = list(self.grid_cells)
         random.shuffle(self.targets)
         print(f"[Chase order]: {self.targets}")
         self.index = 0
+        # bumped whenever what draw() shows changes, so renderers can cache the board
+        self.version = 0
 
-        # images for memeory game
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        PROJECT_ROOT = os.path.dirname(BASE_DIR)
-
-        self.images = [pygame.transform.scale(pygame.image.load(os.path.join(PROJECT_ROOT ,"assets", "better_waves", f"Crop-Ocean-{i}.png")),
-                                (self.cell_width, self.cell_height))
-            for i in range(0, 9)]
+        # images for memeory game, pre-scaled and cached on disk by the asset cache
+        if assets is None:
+            assets = AssetCache()
+        self.images = [assets.get(path, size) for path, size in self.asset_requests(width, height, rows, cols)]
         print(f"len of images: {len(self.images)}")
+        # cell -> image index and image index -> cell, rebuilt by shuffle_grid_pos_memory_game
         self.images_pos_index = dict()
-        
-        # target queue for memory game
-        self.image_target_queue = list(range(len(self.images))) 
-        random.shuffle(self.image_target_queue) 
-        print(f"image_target_queue: {self.image_target_queue}")
+        self.image_cells = dict()
+
+        # target queue for memory game, the current target is at the front
+        image_order = list(range(len(self.images)))
+        random.shuffle(image_order)
+        self.image_target_queue = deque(image_order)
+        print(f"image_target_queue: {list(self.image_target_queue)}")
         self.grid_pos_memory_game = []
         self.shuffle_grid_pos_memory_game()
     
@@ -41,31 +53,31 @@ class TaskManager:
             return self.targets[self.index % len(self.targets)] 
         
         elif game_mode == "memory":
-            current_target_idnex = self.image_target_queue[0]
-            for pos, index in self.images_pos_index.items():
-                
-                if index == current_target_idnex:
-                    return pos
+            return self.image_cells.get(self.image_target_queue[0])
         return None
 
+    def image_at(self, cell):
+        """Index of the memory game image shown in `cell`, or None."""
+        return self.images_pos_index.get(cell)
+
     def next_task(self):
         self.index += 1
+        self.version += 1
 
     def draw(self, screen, font,game_mode, highlight):
         if game_mode == "chase":
-            for r in range(1, 4):  # Center rows (1 to 3)
-                for c in range(3, 6):  # Center columns (3 to 5)
-                    rect = pygame.Rect(c * self.cell_width, r * self.cell_height,
-                                    self.cell_width, self.cell_height)
+            for r, c in self.grid_cells:
+                rect = pygame.Rect(c * self.cell_width, r * self.cell_height,
+                                self.cell_width, self.cell_height)
 
-                    pygame.draw.rect(screen, (100, 100, 100), rect, 1)
+                pygame.draw.rect(screen, (100, 100, 100), rect, 1)
 
-                    # Highlight target
-                    if (r, c) == self.current_target(game_mode):
-                        pygame.draw.rect(screen, (0, 255, 0), rect, 3)
+                # Highlight target
+                if (r, c) == self.current_target(game_mode):
+                    pygame.draw.rect(screen, (0, 255, 0), rect, 3)
 
-                    elif highlight and (r, c) == highlight:
-                        pygame.draw.rect(screen, (255, 0, 0), rect, 3)
+                elif highlight and (r, c) == highlight:
+                    pygame.draw.rect(screen, (255, 0, 0), rect, 3)
 
         elif game_mode == "memory":
             grid_start_x = (self.width - self.cols * self.cell_width) // 2
@@ -80,7 +92,6 @@ class TaskManager:
                     self.cell_height
                 )
                 if idx < len(self.images):
-                    self.images_pos_index[(r, c)] = idx
                     screen.blit(self.images[idx], rect.topleft)
                 else:
                     pygame.draw.rect(screen, (0, 0, 0), rect)  # Black fill for other cells
@@ -89,32 +100,38 @@ class TaskManager:
             self.show_to_match(screen)
                 
 
+    def match_cell(self):
+        """Cell of the image to match: beside the grid, one empty column to its right, level with its middle row."""
+        rows = [r for r, _ in self.grid_cells]
+        last_col = max(c for _, c in self.grid_cells)
+        return (min(rows) + max(rows)) // 2, last_col + 2
+
     def show_to_match(self, screen):
         index = self.image_target_queue[0]
-        rect = pygame.Rect(7 * self.cell_width, 2 * self.cell_height, self.cell_width, self.cell_height)
+        row, col = self.match_cell()
+        rect = pygame.Rect(col * self.cell_width, row * self.cell_height, self.cell_width, self.cell_height)
         screen.blit(self.images[index], rect.topleft)
 
-    def check_match(self, random_index, confirmed_cell):
+    def check_match(self, confirmed_cell):
         # Check if the confirmed cell matches the random index
         target_index = self.image_target_queue[0]
-        if self.images_pos_index.get(confirmed_cell) == target_index:
-            self.image_target_queue.append(self.image_target_queue.pop(0))
-            print(f"image_target_queue updated: {self.image_target_queue}")
+        matched = self.image_at(confirmed_cell) == target_index
+        self.image_target_queue.rotate(-1)
+        print(f"image_target_queue updated: {list(self.image_target_queue)}")
+        if matched:
             print(f"[match] confirmed_cell: {confirmed_cell}, target_index: {target_index}")
-            self.reset_memory_game()
-            return True
         else:
-            self.image_target_queue.append(self.image_target_queue.pop(0))
-            print(f"image_target_queue updated: {self.image_target_queue}")
             print(f"[not match] confirmed_cell: {confirmed_cell}, target_index: {target_index}")
-            self.reset_memory_game()
-            return False
-   
+        self.reset_memory_game()
+        return matched
+
     def reset_memory_game(self):
-        self.images_pos_index.clear()
         self.shuffle_grid_pos_memory_game()
 
     def shuffle_grid_pos_memory_game(self):
-        self.grid_pos_memory_game = [(r, c) for r in range(1, 4) for c in range(3, 6)]
+        self.grid_pos_memory_game = list(self.grid_cells)
         random.shuffle(self.grid_pos_memory_game)
-        
+        # the first len(images) shuffled cells get an image, the rest stay empty
+        self.images_pos_index = dict(zip(self.grid_pos_memory_game, range(len(self.images))))
+        self.image_cells = {index: cell for cell, index in self.images_pos_index.items()}
+        self.version += 1
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+
+class TextCache:
+    """
+    LRU cache of rendered text surfaces shared by every font wrapped with font().
+    A string is only rasterized again when its text, font, colour or antialiasing
+    changed, or when it was evicted after `max_entries` newer strings.
+    Returned surfaces are shared: blit them, never draw on them.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color, background=None):
+        key = (font, text, antialias, tuple(color), None if background is None else tuple(background))
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color, background)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def font(self, font):
+        """Wraps a pygame font so its render() goes through this cache."""
+        return CachedFont(font, self)
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"text cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), {len(self.entries)} entries"
+
+
+class CachedFont:
+    """Drop-in for pygame.font.Font whose render() is served from a TextCache."""
+    def __init__(self, font, cache):
+        self.font = font
+        self.cache = cache
+
+    def render(self, text, antialias, color, background=None):
+        return self.cache.render(self.font, text, antialias, color, background)
+
+    def __getattr__(self, name):
+        # size(), get_linesize() etc. go straight to the wrapped font
+        return getattr(self.font, name)
@@ -0,0 +1,82 @@
+"""
+Hit-testing cost of activation zones as the number of zones grows.
+
+    python zone_benchmark.py [--zones 1 10 50 100 200 500] [--samples 20000]
+
+For every zone count, discs are laid out in a grid over the screen and random gaze points
+are tested against them three ways: the brute force loop over every zone (as
+HotCornerSelector used to do), ZoneEngine.hit() per point and ZoneEngine.hits() per batch.
+update_batch() adds the per-zone dwell and timeout state on top of the batch. All
+three hit tests must agree.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from config import WIDTH, HEIGHT
+from selection.zones import NO_ZONE, ZoneEngine
+
+
+def build_engine(count, bucket_size):
+    cols = math.ceil(math.sqrt(count * WIDTH / HEIGHT))
+    rows = math.ceil(count / cols)
+    spacing = min(WIDTH / cols, HEIGHT / rows)
+    engine = ZoneEngine(WIDTH, HEIGHT, bucket_size=bucket_size or max(16, int(spacing)))
+    for i in range(count):
+        row, col = divmod(i, cols)
+        center = ((col + 0.5) * WIDTH / cols, (row + 0.5) * HEIGHT / rows)
+        engine.add_zone(i, center, spacing * 0.45, "select" if i % 2 else "cancel", dwell=0.1)
+    return engine
+
+
+def brute_force(engine, points):
+    zones = [(z.center[0], z.center[1], z.radius * z.radius) for z in engine.zones]
+    result = []
+    for x, y in points:
+        hit = NO_ZONE
+        for index, (cx, cy, r2) in enumerate(zones):
+            dx, dy = x - cx, y - cy
+            if dx * dx + dy * dy < r2:
+                hit = index
+        result.append(hit)
+    return np.array(result)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark zone hit-testing for growing zone counts")
+    parser.add_argument("--zones", type=int, nargs="+", default=[1, 10, 50, 100, 200, 500])
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--bucket-size", type=int, default=0, help="bucket side in pixels, 0 = the zone spacing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    points = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(args.samples, 2))
+    timestamps = np.arange(args.samples) / 120.0
+    point_list = points.tolist()
+
+    print(f"{args.samples} gaze points, microseconds per point")
+    print(f"{'zones':>6} {'brute force':>12} {'hit()':>8} {'hits()':>8} {'update_batch()':>15}")
+    for count in args.zones:
+        engine = build_engine(count, args.bucket_size)
+        expected, brute = timed(brute_force, engine, point_list)
+        single, one_by_one = timed(lambda: np.array([engine.hit(x, y) for x, y in point_list]))
+        batch, batched = timed(engine.hits, points)
+        if not (np.array_equal(expected, single) and np.array_equal(expected, batch)):
+            raise AssertionError(f"hit tests disagree with {count} zones")
+        engine.reset()
+        _, updated = timed(engine.update_batch, timestamps, points)
+        per_point = [seconds / args.samples * 1e6 for seconds in (brute, one_by_one, batched, updated)]
+        print(f"{count:>6} {per_point[0]:>12.2f} {per_point[1]:>8.2f} {per_point[2]:>8.3f} {per_point[3]:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()